@@ -102,12 +102,38 @@ if opcion == "🏭 Fábrica de Quesos":
     except Exception as e:
         st.warning(f"⚠️ El Backend parece estar apagado. Inicia 'uvicorn main:app' primero.")
 
-# --- VISTA 2: ALERTAS (Placeholder) ---
+# --- VISTA 2: ALERTAS ---
 elif opcion == "🚨 Alertas IoT":
     st.header("🔥 Centro de Alertas")
-    st.info("Aquí conectaremos los logs de temperatura crítica.")
-    # Simulación visual
-    st.error("🚨 12/02/2026 17:45 - TEMPERATURA CRÍTICA: 15.2°C (Cámara 1)")
+    # Solo se piden los eventos nuevos desde el último id visto (no el historial completo en cada rerun)
+    if "eventos" not in st.session_state:
+        st.session_state.eventos, st.session_state.ultimo_evento = [], 0
+    try:
+        res = requests.get(
+            f"{API_URL}/events/",
+            params={"since": st.session_state.ultimo_evento, "topic": ["alertas_iot", "saneamiento"]},
+        )
+        if res.status_code == 200:
+            delta = res.json()
+            if not delta["completo"]:
+                st.session_state.eventos = [] # El servidor se reinició o el buffer rotó: se recarga
+            st.session_state.eventos = (st.session_state.eventos + delta["eventos"])[-200:]
+            st.session_state.ultimo_evento = delta["ultimo_id"]
+    except Exception as e:
+        st.warning("⚠️ El Backend parece estar apagado. Inicia 'uvicorn main:app' primero.")
+
+    if st.button("🔄 Actualizar"):
+        st.rerun()
+
+    if not st.session_state.eventos:
+        st.success("✅ Sin alertas recientes.")
+    for ev in reversed(st.session_state.eventos):
+        fecha = pd.to_datetime(ev["ts"]).strftime('%d/%m/%Y %H:%M')
+        data = ev["data"]
+        if ev["topic"] == "alertas_iot":
+            st.error(f"🚨 {fecha} - {data['tipo_alerta']}: {data['valor']} ({data['sensor_id']}) — {data['mensaje']}")
+        else:
+            st.warning(f"🧼 {fecha} - {data['alerta']}")
 
 # --- VISTA 3: INVERNADERO FVH ---
 elif opcion == "🌱 Invernadero FVH":
@@ -125,15 +151,48 @@ elif opcion == "🌱 Invernadero FVH":
                 
     with col2:
         st.subheader("Estado Ambiental")
-        # Aquí conectarás los datos de telemetría de InfluxDB
-        st.metric("Humedad Relativa", "85%", "+2%")
-        st.metric("Temperatura Invernadero", "22°C", "-1°C")
+        # Últimos valores y tendencia de la última hora desde el almacén de telemetría (/telemetry)
+        sensores_fvh = {"invernadero.humedad": ("Humedad Relativa", "%"), "invernadero.temperatura": ("Temperatura Invernadero", "°C")}
+        try:
+            res = requests.get(f"{API_URL}/telemetry/latest", params={"sensor": list(sensores_fvh)})
+            ultimos = {s["sensor"]: s for s in res.json()} if res.status_code == 200 else {}
+            for nombre, (etiqueta, unidad) in sensores_fvh.items():
+                actual = ultimos.get(nombre)
+                if not actual:
+                    st.metric(etiqueta, "Sin datos")
+                    continue
+                delta = None
+                res_h = requests.get(f"{API_URL}/telemetry/{nombre}/aggregate", params={"resolucion": "1m"})
+                if res_h.status_code == 200:
+                    puntos = res_h.json()["puntos"]
+                    hace_una_hora = [p for p in puntos if pd.Timestamp(p["ts"]) >= pd.Timestamp.now(tz="UTC") - pd.Timedelta(hours=1)]
+                    if hace_una_hora:
+                        delta = f"{actual['valor'] - hace_una_hora[0]['media']:+.1f}{unidad}"
+                        st.line_chart(pd.DataFrame(hace_una_hora).set_index("ts")["media"], height=120)
+                st.metric(etiqueta, f"{actual['valor']:.1f}{unidad}", delta)
+        except requests.exceptions.RequestException:
+            st.warning("No se pudo conectar con el servicio de telemetría.")
+
+    # Plan de siembras según la demanda de los lotes (/greenhouse/plan)
+    st.subheader("📅 Plan de Siembras")
+    try:
+        res = requests.get(f"{API_URL}/greenhouse/plan", params={"horizonte_dias": 30})
+        if res.status_code == 200:
+            plan = res.json()
+            c1, c2, c3 = st.columns(3)
+            c1.metric("Demanda FVH", f"{plan['demanda_kg_dia']:,.0f} kg/día")
+            c2.metric("Semilla próximos 30 días", f"{plan['kg_semilla_total']:,.1f} kg")
+            c3.metric("Déficit hasta 1ª cosecha", f"{plan['deficit_antes_primera_cosecha_kg']:,.0f} kg")
+            if plan["siembras"]:
+                st.dataframe(pd.DataFrame(plan["siembras"]), use_container_width=True)
+    except requests.exceptions.RequestException:
+        st.warning("No se pudo obtener el plan de siembras.")
 
 # --- VISTA 4: CALIDAD Y SSOP (Nueva pestaña) ---
 elif opcion == "🛡️ Calidad y SSOP":
     st.header("🛡️ Control de Calidad y Bioseguridad")
     
-    tabs = st.tabs(["Limpieza y Desinfección", "Control de Agua"])
+    tabs = st.tabs(["Limpieza y Desinfección", "Control de Agua", "Exportar para Auditoría"])
     
     with tabs[0]:
         st.subheader("Registro de Limpieza y Desinfección")
@@ -163,6 +222,16 @@ elif opcion == "🛡️ Calidad y SSOP":
         if cloro < 0.3 or cloro > 1.5:
             st.warning("⚠️ El nivel de cloro está fuera del rango recomendado (0.3 - 1.5 ppm).")
 
+    with tabs[2]:
+        st.subheader("Exportación de Registros (MGAP)")
+        # El archivo lo genera la API en streaming: el dashboard solo arma el link de descarga
+        col1, col2, col3 = st.columns(3)
+        registro = col1.selectbox("Registro", ["saneamiento", "control-agua", "control-plagas"])
+        desde = col2.date_input("Desde", value=pd.Timestamp.now().date() - pd.Timedelta(days=365))
+        hasta = col3.date_input("Hasta", value=pd.Timestamp.now().date() + pd.Timedelta(days=1))
+        formato = st.radio("Formato", ["csv", "ndjson"], horizontal=True)
+        st.markdown(f"[⬇️ Descargar {registro}.{formato}]({API_URL}/quality/export/{registro}?formato={formato}&desde={desde}&hasta={hasta})")
+
 # --- VISTA 5: FINANZAS ---
 elif opcion == "💰 Finanzas":
     st.header("💰 Gestión Financiera")
@@ -196,6 +265,17 @@ elif opcion == "💰 Finanzas":
             # Barra de progreso
             st.progress(min(progreso / 100, 1.0))
             st.caption(f"Has ahorrado un {progreso}% de la meta de ${target:,.2f}")
+
+            # Pronóstico Monte Carlo (probabilidad de llegar a la fecha límite)
+            try:
+                res_fc = requests.get(f"{API_URL}/finance/goals/{meta['id']}/forecast")
+                if res_fc.status_code == 200:
+                    fc = res_fc.json()
+                    c1, c2 = st.columns(2)
+                    c1.metric("Probabilidad de lograrla", f"{fc['probabilidad'] * 100:.0f}%")
+                    c2.metric("Saldo esperado al límite (mediana)", f"${fc['saldo_final_p50']:,.2f}")
+            except requests.exceptions.RequestException:
+                pass
             
             # Gráfico de Torta Simple (Ahorrado vs Falta)
             ahorrado = summary.get('balance_total', 0)
@@ -230,4 +310,25 @@ elif opcion == "💰 Finanzas":
                 if res.status_code == 200:
                     st.success("Movimiento registrado!")
                     time.sleep(1)
-                    st.rerun()
\ No newline at end of file
+                    st.rerun()
+    # 5. Importación de extractos bancarios (CSV)
+    with st.expander("🏦 Importar Extracto Bancario (CSV)"):
+        st.caption("Columnas: fecha, monto, descripcion (opcional: categoria, tipo). Reimportar un extracto no duplica movimientos.")
+        archivo = st.file_uploader("Extracto", type=["csv"])
+        i_cat = st.text_input("Categoría por defecto", "Extracto bancario")
+        i_sep = st.selectbox("Separador", [",", ";"])
+        if archivo and st.button("Importar"):
+            res = requests.post(
+                f"{API_URL}/finance/transactions/import",
+                params={"categoria": i_cat, "separador": i_sep},
+                data=archivo.getvalue(),
+                headers={"Content-Type": "text/csv"},
+            )
+            if res.status_code == 200:
+                r = res.json()
+                st.success(f"{r['importadas']} movimientos importados, {r['duplicadas']} ya existentes.")
+                if r["cantidad_errores"]:
+                    st.warning(f"{r['cantidad_errores']} filas con errores")
+                    st.dataframe(pd.DataFrame(r["errores"]))
+            else:
+                st.error(f"Error al importar: {res.text}")
@@ -1,17 +1,22 @@
-from fastapi import APIRouter, Depends
-from sqlmodel import Session, select
-from typing import List
+from fastapi import APIRouter, Depends, Query, Response
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import List, Optional
 
-from src.shared.database import get_session
+from src.shared.database import get_async_session, get_async_read_session
+from src.shared.pagination import keyset, legacy_limit, page, MAX_PAGE_SIZE
 from src.cheese_factory.models import LoteQueso, LoteQuesoCreate
+from src.core.events import publish_on_commit
 
 router = APIRouter(prefix="/cheese-factory", tags=["CheeseFactory"])
 
+publish_on_commit(LoteQueso, "lotes_queso")
+
 from src.finance.models import Transaccion, TipoTransaccion
-from src.shared.database import get_session
+from src.finance import ledger # Registra el listener que suma el GASTO automático a los saldos
 
 @router.post("/batches/", response_model=LoteQueso)
-def create_lote_queso(lote_queso_data: LoteQuesoCreate, session: Session = Depends(get_session)):
+async def create_lote_queso(lote_queso_data: LoteQuesoCreate, session: AsyncSession = Depends(get_async_session)):
     # 1. Crear el Lote
     lote_queso = LoteQueso.model_validate(lote_queso_data)
     session.add(lote_queso)
@@ -29,11 +34,18 @@ def create_lote_queso(lote_queso_data: LoteQuesoCreate, session: Session = Depen
         )
         session.add(gasto)
 
-    session.commit()
-    session.refresh(lote_queso)
+    await session.commit()
+    await session.refresh(lote_queso)
     return lote_queso
 
 @router.get("/batches/", response_model=List[LoteQueso])
-def read_lotes_queso(skip: int = 0, limit: int = 100, session: Session = Depends(get_session)):
-    lotes = session.exec(select(LoteQueso).offset(skip).limit(limit)).all()
-    return lotes
+async def read_lotes_queso(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, description=f"Máximo {MAX_PAGE_SIZE} por página"),
+    skip: int = Query(0, ge=0, deprecated=True, description="Deprecado: usar cursor"),
+    session: AsyncSession = Depends(get_async_read_session),
+):
+    limit = legacy_limit(limit, skip, response)
+    lotes = (await session.exec(keyset(select(LoteQueso), LoteQueso.id, cursor, limit, skip=skip))).all()
+    return page(lotes, response, limit)
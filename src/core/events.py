@@ -0,0 +1,207 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import delete, event, func, insert, select
+from sqlalchemy.orm import Session
+
+from src.shared.database import async_read_engine, engine
+from src.core.models import Evento
+
+# --- Canal de eventos en vivo (pub/sub entre procesos, vía SQLite) ---
+# Los módulos publican eventos por tópico (alertas IoT, vencimientos de saneamiento,
+# lotes de queso, transacciones) y el bus los reparte a los suscriptores del stream SSE
+# (core/router.py). Cada evento es una fila de Evento, escrita en la misma transacción
+# que los datos que lo originan cuando es posible: el id lo asigna la base, así es el
+# mismo en todos los workers de uvicorn. Cada worker lee la tabla (id > último leído)
+# cada POLL_SECONDS, o enseguida si el evento se publicó en él, y lo reparte a sus
+# suscriptores: un evento del scheduler (que corre solo en el líder) llega a los
+# clientes conectados a cualquier worker. Un cliente que se reconecta con Last-Event-ID
+# (o pide /events/?since=N) recibe lo que se perdió leyendo la tabla, sin importar a
+# qué worker llegue. Los eventos se purgan después de RETENTION_DAYS (job del líder).
+# Los tópicos internos (fuera de TOPICS, ej. invalidaciones de cachés de proceso) no se
+# exponen a los clientes: cada worker los entrega a los callbacks registrados con listen().
+
+TOPICS = {"alertas_iot", "saneamiento", "lotes_queso", "transacciones"}
+SUBSCRIBER_QUEUE_SIZE = 500
+POLL_SECONDS = float(os.getenv("EVENTS_POLL_SECONDS", "1"))
+TAIL_BATCH = 1_000
+SINCE_LIMIT = 1_000 # Eventos por respuesta de /events/?since=
+RETENTION_DAYS = int(os.getenv("EVENTS_RETENTION_DAYS", "7"))
+
+def event_rows(topic: str, datos: Iterable) -> List[dict]:
+    """
+    Filas de Evento para insertar en la transacción de quien los genera:
+    `conn.execute(insert(Evento.__table__), event_rows(...))`. Después del commit hay
+    que llamar a event_bus.notify().
+    """
+    ts = datetime.utcnow()
+    return [{"topic": topic, "ts": ts, "data": jsonable_encoder(data)} for data in datos]
+
+def _as_dict(row) -> dict:
+    return {"id": row.id, "topic": row.topic, "ts": row.ts, "data": row.data}
+
+class Subscription:
+    """Cola de un cliente. Si se llena (cliente lento) se corta: al reconectar recupera de la tabla."""
+    def __init__(self, topics: Set[str]):
+        self.topics = topics
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.lagged = False
+        self.last_id = 0
+
+class EventBus:
+    def __init__(self, poll_seconds: float = POLL_SECONDS):
+        self.poll_seconds = poll_seconds
+        self._last_id = 0 # Último id leído de la tabla por este worker
+        self._subscribers: List[Subscription] = []
+        self._listeners: Dict[str, List[Callable]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def last_id(self) -> int:
+        return self._last_id
+
+    async def start(self):
+        """Arranca la lectura de la tabla en el event loop actual (se llama en el lifespan)."""
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        async with async_read_engine.connect() as conn:
+            self._last_id = (await conn.execute(select(func.max(Evento.id)))).scalar() or 0
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def notify(self):
+        """Avisa que se confirmaron eventos en este proceso. Seguro desde otros hilos."""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def publish_many(self, topic: str, datos: Iterable) -> int:
+        """Publica eventos en una transacción propia (código sincrónico: scheduler, scripts)."""
+        rows = event_rows(topic, datos)
+        if not rows:
+            return 0
+        with engine.begin() as conn:
+            conn.execute(insert(Evento.__table__), rows)
+        self.notify()
+        return len(rows)
+
+    def publish(self, topic: str, data):
+        self.publish_many(topic, [data])
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self._tail()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Error leyendo eventos: {e}")
+
+    async def _tail(self):
+        async with async_read_engine.connect() as conn:
+            while True:
+                rows = (await conn.execute(
+                    select(Evento).where(Evento.id > self._last_id).order_by(Evento.id).limit(TAIL_BATCH)
+                )).all()
+                for row in rows:
+                    self._fanout(_as_dict(row))
+                if rows:
+                    self._last_id = rows[-1].id
+                if len(rows) < TAIL_BATCH:
+                    return
+
+    def listen(self, topic: str, callback: Callable[[dict], None]):
+        """Registra un callback (en el event loop, no debe bloquear) para cada evento del tópico."""
+        self._listeners.setdefault(topic, []).append(callback)
+
+    def _fanout(self, evento: dict):
+        for callback in self._listeners.get(evento["topic"], ()):
+            try:
+                callback(evento)
+            except Exception as e:
+                print(f"❌ Error procesando evento {evento['id']} ({evento['topic']}): {e}")
+        for sub in list(self._subscribers):
+            if evento["topic"] not in sub.topics:
+                continue
+            try:
+                sub.queue.put_nowait(evento)
+            except asyncio.QueueFull:
+                sub.lagged = True
+                self._subscribers.remove(sub)
+
+    async def since(self, last_id: int, topics: Iterable[str], limit: int = SINCE_LIMIT) -> tuple:
+        """
+        Eventos posteriores a `last_id` de los tópicos pedidos (los `limit` más recientes).
+        `completo` es False si faltan eventos entre `last_id` y lo retornado (purgados, más
+        de `limit`, o un id de otra base): el cliente tiene que recargar.
+        """
+        async with async_read_engine.connect() as conn:
+            primero, ultimo = (await conn.execute(select(func.min(Evento.id), func.max(Evento.id)))).one()
+            ultimo = ultimo or 0
+            rows = (await conn.execute(
+                select(Evento)
+                .where(Evento.id > last_id, Evento.id <= ultimo, Evento.topic.in_(set(topics)))
+                .order_by(Evento.id.desc())
+                .limit(limit + 1)
+            )).all()
+        completo = last_id <= ultimo and len(rows) <= limit and (primero is None or primero <= last_id + 1)
+        return [_as_dict(row) for row in reversed(rows[:limit])], completo, ultimo
+
+    def subscribe(self, topics: Iterable[str]) -> Subscription:
+        """Registra un suscriptor (desde el event loop). Lo perdido se recupera con since()."""
+        sub = Subscription(set(topics))
+        sub.last_id = self._last_id
+        self._subscribers.append(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        if sub in self._subscribers:
+            self._subscribers.remove(sub)
+
+event_bus = EventBus()
+
+def purge_events(days: int = RETENTION_DAYS) -> int:
+    """Borra los eventos de más de `days` días. Retorna cuántos se borraron."""
+    with engine.begin() as conn:
+        return conn.execute(delete(Evento).where(Evento.ts < datetime.utcnow() - timedelta(days=days))).rowcount
+
+def publish_on_commit(model: type, topic: str, serialize: Callable = lambda obj: obj.model_dump()):
+    """
+    Registra un evento por cada instancia nueva de `model`, en la misma transacción que
+    la crea (nada se publica si hay rollback). Se serializa al hacer flush, antes de que
+    el commit expire los atributos; al confirmar se avisa al bus.
+    """
+    key = f"eventos_{topic}"
+
+    @event.listens_for(Session, "after_flush")
+    def _record(session, flush_context):
+        nuevos = [serialize(obj) for obj in session.new if isinstance(obj, model)]
+        if nuevos:
+            session.connection().execute(insert(Evento.__table__), event_rows(topic, nuevos))
+            session.info[key] = True
+
+    @event.listens_for(Session, "after_commit")
+    def _notify(session):
+        if session.info.pop(key, None):
+            event_bus.notify()
+
+    @event.listens_for(Session, "after_rollback")
+    def _discard(session):
+        session.info.pop(key, None)
@@ -0,0 +1,179 @@
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import DateTime, case, literal, or_, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session
+
+from src.shared.database import engine
+from src.core.models import EstadoJobRun, JobRun, LeaderLease
+
+# --- Un solo líder para los trabajos en segundo plano ---
+# Con uvicorn --workers N cada proceso arranca su scheduler, pero solo el que tiene el
+# lease "scheduler" en SQLite lo corre; los demás lo mantienen en pausa.
+# - Lease: fila de LeaderLease que el líder renueva cada RENEW_SECONDS. Tomarla o
+#   renovarla es un solo upsert condicional (holder = yo OR vencida): SQLite serializa
+#   las escrituras, así que dos procesos no pueden ganarla a la vez. Si el líder muere
+#   (o se cuelga más de LEASE_SECONDS) otro worker la toma en el siguiente intento.
+# - Historial: cada ejecución se reserva en JobRun con (job_id, scheduled_for) único y
+#   solo si el lease sigue siendo propio (fencing). Un ex-líder que todavía no se enteró
+#   de que perdió el lease, o dos jobs por el mismo vencimiento, no ejecutan dos veces.
+
+LEASE_SECONDS = int(os.getenv("LEADER_LEASE_SECONDS", "15"))
+RENEW_SECONDS = LEASE_SECONDS / 3
+SCHEDULER_LEASE = "scheduler"
+HOLDER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+def try_acquire(session: Session, name: str, holder: str, now: Optional[datetime] = None) -> Optional[int]:
+    """Toma o renueva el lease. Retorna el term si quedó en manos de `holder`, None si lo tiene otro."""
+    now = now or datetime.utcnow()
+    table = LeaderLease.__table__
+    stmt = sqlite_insert(table).values(
+        name=name, holder=holder, term=1, acquired_at=now, expires_at=now + timedelta(seconds=LEASE_SECONDS),
+    )
+    propio = table.c.holder == holder
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.name],
+        set_={
+            "holder": stmt.excluded.holder,
+            "expires_at": stmt.excluded.expires_at,
+            "term": case((propio, table.c.term), else_=table.c.term + 1),
+            "acquired_at": case((propio, table.c.acquired_at), else_=stmt.excluded.acquired_at),
+        },
+        where=or_(propio, table.c.expires_at < now),
+    ).returning(table.c.term)
+    term = session.execute(stmt).scalar()
+    session.commit()
+    return term
+
+def release(session: Session, name: str, holder: str):
+    """Libera el lease al apagar, así otro worker lo toma sin esperar el vencimiento."""
+    session.execute(
+        update(LeaderLease)
+        .where(LeaderLease.name == name, LeaderLease.holder == holder)
+        .values(expires_at=datetime.utcnow())
+    )
+    session.commit()
+
+class LeaderElector:
+    """Hilo que mantiene (o intenta tomar) el lease y avisa los cambios de liderazgo."""
+    def __init__(self, name: str, holder: str = HOLDER_ID):
+        self.name = name
+        self.holder = holder
+        self.term: Optional[int] = None
+        self._valid_until = datetime.min
+        self._on_elected: Optional[Callable] = None
+        self._on_demoted: Optional[Callable] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self.term is not None
+
+    def start(self, on_elected: Callable, on_demoted: Callable):
+        self._on_elected, self._on_demoted = on_elected, on_demoted
+        self._stop.clear()
+        self._tick() # El primer intento es inmediato: con un solo proceso no hay espera
+        self._thread = threading.Thread(target=self._run, name=f"leader-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if self.is_leader:
+            self._demote()
+            with Session(engine) as session:
+                release(session, self.name, self.holder)
+
+    def _run(self):
+        while not self._stop.wait(RENEW_SECONDS):
+            self._tick()
+
+    def _tick(self):
+        try:
+            with Session(engine) as session:
+                term = try_acquire(session, self.name, self.holder)
+        except Exception as e:
+            print(f"⚠️ [Líder] No se pudo renovar el lease '{self.name}': {e}")
+            # Sin respuesta de la base se sigue siendo líder solo mientras el lease no venza
+            if self.is_leader and datetime.utcnow() >= self._valid_until:
+                self._demote()
+            return
+        if term is None:
+            if self.is_leader:
+                self._demote()
+            return
+        self._valid_until = datetime.utcnow() + timedelta(seconds=LEASE_SECONDS)
+        if self.term != term:
+            self.term = term
+            print(f"👑 [Líder] {self.holder} es líder de '{self.name}' (term {term}).")
+            self._on_elected()
+
+    def _demote(self):
+        print(f"🔻 [Líder] {self.holder} dejó de ser líder de '{self.name}'.")
+        self.term = None
+        self._on_demoted()
+
+scheduler_elector = LeaderElector(SCHEDULER_LEASE)
+
+def interval_slot(seconds: int, now: Optional[datetime] = None) -> datetime:
+    """Inicio del intervalo de `seconds` que contiene a `now` (clave de ejecución de jobs periódicos)."""
+    now = now or datetime.utcnow()
+    epoch = int(now.timestamp())
+    return datetime.fromtimestamp(epoch - epoch % seconds)
+
+def claim_run(session: Session, job_id: str, scheduled_for: datetime,
+              holder: str = HOLDER_ID, lease_name: str = SCHEDULER_LEASE) -> Optional[int]:
+    """Reserva la ejecución si el lease es propio y no vencido. None si ya se ejecutó o no hay liderazgo."""
+    now = datetime.utcnow()
+    lease = LeaderLease.__table__
+    runs = JobRun.__table__
+    stmt = sqlite_insert(runs).from_select(
+        ["job_id", "scheduled_for", "holder", "term", "estado", "started_at"],
+        select(
+            literal(job_id), literal(scheduled_for, DateTime), literal(holder), lease.c.term,
+            literal(EstadoJobRun.EN_CURSO.value), literal(now, DateTime),
+        ).where(lease.c.name == lease_name, lease.c.holder == holder, lease.c.expires_at > now),
+    ).on_conflict_do_nothing(index_elements=[runs.c.job_id, runs.c.scheduled_for]).returning(runs.c.id)
+    run_id = session.execute(stmt).scalar()
+    session.commit()
+    return run_id
+
+def finish_run(session: Session, run_id: int, error: Optional[str] = None):
+    session.execute(
+        update(JobRun).where(JobRun.id == run_id).values(
+            estado=EstadoJobRun.ERROR if error else EstadoJobRun.OK, finished_at=datetime.utcnow(), error=error,
+        )
+    )
+    session.commit()
+
+def run_recorded(job_id: str, scheduled_for: datetime, fn: Callable, *args, **kwargs):
+    """Ejecuta `fn` una sola vez por (job_id, scheduled_for) y deja la ejecución en JobRun."""
+    with Session(engine) as session:
+        run_id = claim_run(session, job_id, scheduled_for)
+    if run_id is None:
+        print(f"⏭️ [Jobs] {job_id} ({scheduled_for}) ya ejecutado o sin liderazgo: se omite.")
+        return None
+    error = None
+    try:
+        return fn(*args, **kwargs)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        with Session(engine) as session:
+            finish_run(session, run_id, error)
+
+def recorded(job_id: str, fn: Callable, slot_seconds: int) -> Callable:
+    """Envuelve un job periódico: una ejecución por intervalo de `slot_seconds`."""
+    def run():
+        return run_recorded(job_id, interval_slot(slot_seconds), fn)
+    run.__name__ = getattr(fn, "__name__", job_id)
+    return run
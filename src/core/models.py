@@ -0,0 +1,74 @@
+from datetime import datetime
+from enum import Enum
+from typing import Optional
+
+from sqlalchemy import JSON, Column, Index, UniqueConstraint
+from sqlmodel import SQLModel, Field
+
+class EstadoNotificacion(str, Enum):
+    PENDIENTE = "PENDIENTE"
+    ENVIADA = "ENVIADA"
+    FALLIDA = "FALLIDA"   # Agotó los reintentos
+
+class Notificacion(SQLModel, table=True):
+    """
+    Bandeja de salida de notificaciones (outbox). Cada alerta se guarda antes de enviarse;
+    el despachador de core/notifications.py la envía, reintenta con backoff y la marca.
+    `proximo_intento` también funciona como reserva: al tomar una fila se corre hacia
+    adelante, así dos procesos no envían la misma notificación.
+    """
+    __table_args__ = (Index("ix_notificacion_estado_proximo", "estado", "proximo_intento"),)
+    id: Optional[int] = Field(default=None, primary_key=True)
+    canal: str = "telegram"
+    chat_id: str
+    mensaje: str
+    estado: EstadoNotificacion = Field(default=EstadoNotificacion.PENDIENTE)
+    creada_en: datetime = Field(default_factory=datetime.utcnow)
+    proximo_intento: datetime = Field(default_factory=datetime.utcnow)
+    intentos: int = 0
+    enviada_en: Optional[datetime] = None
+    ultimo_error: Optional[str] = None
+
+# --- Trabajos en segundo plano con un solo líder (ver core/jobs.py) ---
+
+class LeaderLease(SQLModel, table=True):
+    """Lease de liderazgo por nombre: lo tiene `holder` hasta `expires_at` si no lo renueva."""
+    name: str = Field(primary_key=True)
+    holder: str
+    term: int = 1                 # Sube con cada cambio de líder
+    acquired_at: datetime
+    expires_at: datetime
+
+class EstadoJobRun(str, Enum):
+    EN_CURSO = "EN_CURSO"
+    OK = "OK"
+    ERROR = "ERROR"
+
+class JobRun(SQLModel, table=True):
+    """
+    Historial de ejecuciones. (job_id, scheduled_for) es único: una misma ejecución
+    programada no puede correr dos veces, aunque dos procesos se crean líderes.
+    """
+    __table_args__ = (UniqueConstraint("job_id", "scheduled_for", name="uq_jobrun_job_scheduled"),)
+    id: Optional[int] = Field(default=None, primary_key=True)
+    job_id: str
+    scheduled_for: datetime
+    holder: str
+    term: int
+    estado: EstadoJobRun = Field(default=EstadoJobRun.EN_CURSO)
+    started_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+
+# --- Canal de eventos en vivo (ver core/events.py) ---
+
+class Evento(SQLModel, table=True):
+    """
+    Registro de eventos publicados. El id lo asigna SQLite (AUTOINCREMENT: nunca se reusa,
+    ni después de purgar), así es el mismo en todos los workers y sirve de Last-Event-ID.
+    """
+    __table_args__ = (Index("ix_evento_ts", "ts"), {"sqlite_autoincrement": True})
+    id: Optional[int] = Field(default=None, primary_key=True)
+    topic: str
+    ts: datetime = Field(default_factory=datetime.utcnow)
+    data: dict = Field(sa_column=Column(JSON, nullable=False))
@@ -1,33 +1,251 @@
-import requests
+import asyncio
 import os
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import httpx
+from sqlalchemy import case, event, select, update
+from sqlalchemy.orm import Session
+
+from src.shared.database import async_engine, engine
+from src.core.models import EstadoNotificacion, Notificacion
+
+# --- Bandeja de salida de notificaciones (outbox) ---
+# Las alertas no se envían en línea: se guardan en Notificacion (en la transacción de
+# quien las genera) y un despachador async las envía a Telegram en segundo plano:
+# - Cliente httpx.AsyncClient único (reutiliza conexiones TLS entre envíos).
+# - Al despertar espera COALESCE_WINDOW_SECONDS y junta las pendientes de cada chat en
+#   un solo mensaje (hasta MAX_MENSAJE caracteres): una ráfaga de alertas es un envío.
+# - Límite por chat (CHAT_MIN_INTERVAL_SECONDS entre envíos) y respeta `retry_after` de un 429.
+# - Errores de red o 5xx reintentan con backoff exponencial; tras MAX_INTENTOS queda FALLIDA.
+# - Las filas se reservan corriendo `proximo_intento` LEASE_SECONDS hacia adelante
+#   (UPDATE ... RETURNING), así varios procesos pueden despachar sin duplicar envíos y
+#   una reserva de un proceso caído vuelve a estar disponible sola.
 
 # Idealmente, estos valores vienen de variables de entorno (.env)
-# Pero puedes pegarlos aquí temporalmente para probar.
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_TOKEN", "")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID", "2105670102")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org") # Un stub local para pruebas
+
+ENCABEZADO = "🚨 *ALERTA OvineTech* 🚨\n\n"
+MAX_MENSAJE = 4000                # Telegram corta en 4096 caracteres
+MAX_INTENTOS = 8
+BACKOFF_BASE_SECONDS = 5
+BACKOFF_MAX_SECONDS = 3600
+COALESCE_WINDOW_SECONDS = float(os.getenv("NOTIFY_COALESCE_SECONDS", "2"))
+CHAT_MIN_INTERVAL_SECONDS = 1.0   # Telegram admite ~1 mensaje por segundo por chat
+POLL_SECONDS = 5                  # Reintentos vencidos y filas encoladas por otros procesos
+LEASE_SECONDS = 60
+CLAIM_LIMIT = 500
+HTTP_TIMEOUT_SECONDS = 10
+
+def queue_alert(session: Session, message: str, chat_id: Optional[str] = None) -> Notificacion:
+    """
+    Agrega la alerta a la sesión sin confirmar: se guarda junto con los datos que la
+    originan (sirve para Session y AsyncSession). Al confirmar se despierta el despachador.
+    """
+    notificacion = Notificacion(chat_id=chat_id or TELEGRAM_CHAT_ID, mensaje=message)
+    session.add(notificacion)
+    return notificacion
+
+def send_telegram_alert(message: str, chat_id: Optional[str] = None):
+    """
+    Encola un mensaje urgente para Telegram. No hace I/O de red: lo puede llamar un job
+    del scheduler o cualquier código sincrónico sin bloquear esperando a la API.
+    """
+    with Session(engine) as session:
+        queue_alert(session, message, chat_id)
+        session.commit()
 
-def send_telegram_alert(message: str):
+def backoff_seconds(intentos: int) -> float:
+    """Espera antes del reintento número `intentos` (exponencial con jitter, con tope)."""
+    espera = min(BACKOFF_BASE_SECONDS * 2 ** (intentos - 1), BACKOFF_MAX_SECONDS)
+    return espera * random.uniform(0.8, 1.2)
+
+def coalesce(mensajes: List[tuple]) -> List[tuple]:
     """
-    Envía un mensaje urgente a tu celular vía Telegram.
+    Agrupa (id, mensaje) en bloques de hasta MAX_MENSAJE caracteres con encabezado.
+    Retorna [(ids, texto)]; un mensaje suelto más largo que el tope se recorta.
     """
-    if "PEGAR_TU" in TELEGRAM_BOT_TOKEN:
-        print("❌ Error: Faltan configurar las credenciales de Telegram.")
-        return
-
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-    
-    # Formato del mensaje (Markdown para negritas)
-    payload = {
-        "chat_id": TELEGRAM_CHAT_ID,
-        "text": f"🚨 *ALERTA OvineTech* 🚨\n\n{message}",
-        "parse_mode": "Markdown"
-    }
+    tope = MAX_MENSAJE - len(ENCABEZADO)
+    bloques, ids, partes, largo = [], [], [], 0
+    for id_, mensaje in mensajes:
+        mensaje = mensaje if len(mensaje) <= tope else mensaje[:tope - 1] + "…"
+        extra = len(mensaje) + (2 if partes else 0)
+        if partes and largo + extra > tope:
+            bloques.append((ids, ENCABEZADO + "\n\n".join(partes)))
+            ids, partes, largo, extra = [], [], 0, len(mensaje)
+        ids.append(id_)
+        partes.append(mensaje)
+        largo += extra
+    if partes:
+        bloques.append((ids, ENCABEZADO + "\n\n".join(partes)))
+    return bloques
+
+class NotificationDispatcher:
+    """Despachador async de la bandeja de salida. Se inicia y detiene en el lifespan de la app."""
+    def __init__(self, api_url: str = TELEGRAM_API_URL, token: str = TELEGRAM_BOT_TOKEN):
+        self.api_url = api_url
+        self.token = token
+        self._client: Optional[httpx.AsyncClient] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._next_send: Dict[str, float] = {} # chat_id -> loop.time() del próximo envío permitido
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.token:
+            print("⚠️ Telegram sin configurar (TELEGRAM_TOKEN): las notificaciones quedan en la bandeja de salida.")
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._client = httpx.AsyncClient(base_url=self.api_url, timeout=HTTP_TIMEOUT_SECONDS)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+    def wake(self):
+        """Despierta al despachador. Seguro desde otros hilos (scheduler, threadpool)."""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake.set)
 
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=POLL_SECONDS)
+                # Una ráfaga de alertas llega en pocos segundos: se espera para enviarla junta
+                await asyncio.sleep(COALESCE_WINDOW_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.dispatch_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Error en el despachador de notificaciones: {e}")
+
+    async def dispatch_once(self) -> int:
+        """Reserva las pendientes vencidas y las envía, un bloque por vez por chat. Retorna envíos hechos."""
+        pendientes = await self._claim()
+        por_chat: Dict[str, List[tuple]] = {}
+        intentos = {}
+        for id_, chat_id, mensaje, n in pendientes:
+            por_chat.setdefault(chat_id, []).append((id_, mensaje))
+            intentos[id_] = n
+        enviados = await asyncio.gather(*(self._send_chat(chat_id, mensajes, intentos) for chat_id, mensajes in por_chat.items()))
+        return sum(enviados)
+
+    async def _claim(self) -> List[tuple]:
+        ahora = datetime.utcnow()
+        vencidas = (
+            select(Notificacion.id)
+            .where(Notificacion.estado == EstadoNotificacion.PENDIENTE, Notificacion.proximo_intento <= ahora)
+            .order_by(Notificacion.id)
+            .limit(CLAIM_LIMIT)
+        )
+        async with async_engine.begin() as conn:
+            result = await conn.execute(
+                update(Notificacion)
+                .where(Notificacion.id.in_(vencidas))
+                .values(proximo_intento=ahora + timedelta(seconds=LEASE_SECONDS))
+                .returning(Notificacion.id, Notificacion.chat_id, Notificacion.mensaje, Notificacion.intentos)
+            )
+            return sorted(result.all())
+
+    async def _send_chat(self, chat_id: str, mensajes: List[tuple], intentos: Dict[int, int]) -> int:
+        enviados = 0
+        for ids, texto in coalesce(mensajes):
+            await self._throttle(chat_id)
+            try:
+                response = await self._client.post(
+                    f"/bot{self.token}/sendMessage",
+                    json={"chat_id": chat_id, "text": texto, "parse_mode": "Markdown"},
+                )
+            except httpx.HTTPError as e:
+                await self._retry(ids, max(intentos[i] for i in ids), f"Error de conexión: {e}")
+                continue
+
+            if response.status_code == 200:
+                await self._mark_sent(ids)
+                enviados += 1
+            elif response.status_code == 429:
+                # Telegram indica cuánto esperar: no cuenta como intento fallido
+                retry_after = _retry_after(response)
+                self._next_send[chat_id] = self._loop.time() + retry_after
+                await self._postpone(ids, retry_after)
+            elif response.status_code >= 500:
+                await self._retry(ids, max(intentos[i] for i in ids), f"HTTP {response.status_code}: {response.text[:200]}")
+            else:
+                # 4xx: chat inexistente, bot bloqueado, formato inválido... reintentar no sirve
+                await self._fail(ids, f"HTTP {response.status_code}: {response.text[:200]}")
+        return enviados
+
+    async def _throttle(self, chat_id: str):
+        espera = self._next_send.get(chat_id, 0.0) - self._loop.time()
+        if espera > 0:
+            await asyncio.sleep(espera)
+        self._next_send[chat_id] = self._loop.time() + CHAT_MIN_INTERVAL_SECONDS
+
+    async def _update(self, ids: List[int], **values):
+        async with async_engine.begin() as conn:
+            await conn.execute(update(Notificacion).where(Notificacion.id.in_(ids)).values(**values))
+
+    async def _mark_sent(self, ids: List[int]):
+        await self._update(ids, estado=EstadoNotificacion.ENVIADA, enviada_en=datetime.utcnow(),
+                           intentos=Notificacion.intentos + 1, ultimo_error=None)
+
+    async def _postpone(self, ids: List[int], seconds: float):
+        await self._update(ids, proximo_intento=datetime.utcnow() + timedelta(seconds=seconds), ultimo_error="HTTP 429")
+
+    async def _retry(self, ids: List[int], intentos: int, error: str):
+        await self._update(
+            ids,
+            intentos=Notificacion.intentos + 1,
+            estado=case((Notificacion.intentos + 1 >= MAX_INTENTOS, EstadoNotificacion.FALLIDA.value),
+                        else_=EstadoNotificacion.PENDIENTE.value),
+            proximo_intento=datetime.utcnow() + timedelta(seconds=backoff_seconds(intentos + 1)),
+            ultimo_error=error,
+        )
+
+    async def _fail(self, ids: List[int], error: str):
+        await self._update(ids, estado=EstadoNotificacion.FALLIDA, intentos=Notificacion.intentos + 1, ultimo_error=error)
+
+def _retry_after(response: httpx.Response) -> float:
     try:
-        response = requests.post(url, json=payload, timeout=5)
-        if response.status_code != 200:
-            print(f"⚠️ Error Telegram: {response.text}")
-        else:
-            print(f"✅ Notificación enviada: {message}")
-    except Exception as e:
-        print(f"❌ Error de conexión con Telegram: {e}")
\ No newline at end of file
+        return float(response.json().get("parameters", {}).get("retry_after", BACKOFF_BASE_SECONDS))
+    except (ValueError, AttributeError):
+        return float(response.headers.get("Retry-After", BACKOFF_BASE_SECONDS))
+
+dispatcher = NotificationDispatcher()
+
+_PENDING_KEY = "notificaciones_nuevas"
+
+@event.listens_for(Session, "after_flush")
+def _notify_collect(session, flush_context):
+    if any(isinstance(obj, Notificacion) for obj in session.new):
+        session.info[_PENDING_KEY] = True
+
+@event.listens_for(Session, "after_commit")
+def _notify_wake(session):
+    if session.info.pop(_PENDING_KEY, False):
+        dispatcher.wake()
+
+@event.listens_for(Session, "after_rollback")
+def _notify_discard(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,95 @@
+import asyncio
+import json
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.shared.database import get_async_read_session
+from src.shared.pagination import keyset, page, MAX_PAGE_SIZE
+from src.core.events import TOPICS, event_bus
+from src.core.jobs import scheduler_elector
+from src.core.models import JobRun, LeaderLease
+
+router = APIRouter(prefix="/events", tags=["Events"])
+jobs_router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+HEARTBEAT_SECONDS = 15
+
+def _topics(topic: Optional[List[str]]) -> set:
+    topics = set(topic or TOPICS)
+    desconocidos = topics - TOPICS
+    if desconocidos:
+        raise HTTPException(status_code=422, detail=f"Unknown topics: {sorted(desconocidos)}")
+    return topics
+
+def _sse(evento: dict) -> str:
+    return f"id: {evento['id']}\nevent: {evento['topic']}\ndata: {json.dumps(evento['data'], ensure_ascii=False)}\n\n"
+
+@router.get("/")
+async def read_events(since: int = Query(0, ge=0), topic: Optional[List[str]] = Query(None)):
+    """Deltas para clientes que consultan periódicamente (dashboard): eventos con id > since."""
+    eventos, completo, ultimo = await event_bus.since(since, _topics(topic))
+    return {"ultimo_id": ultimo, "completo": completo, "eventos": eventos}
+
+@router.get("/stream")
+async def stream_events(
+    request: Request,
+    topic: Optional[List[str]] = Query(None),
+    last_event_id: Optional[int] = Header(None),
+):
+    """Server-Sent Events por tópico. Con Last-Event-ID se reenvía lo perdido durante la reconexión."""
+    sub = event_bus.subscribe(_topics(topic))
+
+    async def generate():
+        try:
+            yield f"retry: 3000\n: conectado, ultimo_id={sub.last_id}\n\n"
+            if last_event_id is not None:
+                # Lo que llegue a la cola mientras tanto y ya se haya enviado acá se descarta por id
+                for evento in (await event_bus.since(last_event_id, sub.topics))[0]:
+                    sub.last_id = max(sub.last_id, evento["id"])
+                    yield _sse(evento)
+            while True:
+                if sub.lagged and sub.queue.empty():
+                    return # Cliente lento: se corta y el navegador reconecta con Last-Event-ID
+                try:
+                    evento = await asyncio.wait_for(sub.queue.get(), timeout=HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": ping\n\n"
+                    continue
+                if evento["id"] <= sub.last_id:
+                    continue # Ya enviado en la recuperación inicial
+                sub.last_id = evento["id"]
+                yield _sse(evento)
+        finally:
+            event_bus.unsubscribe(sub)
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@jobs_router.get("/leader")
+async def read_leader(session: AsyncSession = Depends(get_async_read_session)):
+    """Quién tiene el lease del scheduler y si es este worker."""
+    lease = await session.get(LeaderLease, scheduler_elector.name)
+    return {"lease": lease, "worker": scheduler_elector.holder, "es_lider": scheduler_elector.is_leader}
+
+@jobs_router.get("/runs", response_model=List[JobRun])
+async def read_job_runs(
+    response: Response,
+    job_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    session: AsyncSession = Depends(get_async_read_session),
+):
+    statement = select(JobRun)
+    if job_id:
+        statement = statement.where(JobRun.job_id == job_id)
+    runs = (await session.exec(keyset(statement, JobRun.id, cursor, limit))).all()
+    return page(runs, response, limit)
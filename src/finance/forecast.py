@@ -0,0 +1,162 @@
+import threading
+from datetime import date
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from src.shared.database import read_engine
+from src.finance.ledger import ledger_totals, month_start
+from src.finance.models import CuboFinanciero, MetaCapital, SaldoAcumulado, TipoTransaccion
+
+# Pronóstico de flujo de caja por Monte Carlo hacia una MetaCapital.
+# 1. Ajuste: para cada (categoría, tipo) se toma la serie de totales mensuales de los
+#    últimos HISTORY_MONTHS meses completos (desde CuboFinanciero, meses sin movimientos = 0)
+#    y se estima media y desvío. Los ingresos suman y los gastos restan.
+# 2. Simulación: matriz (caminos x meses x categorías) de normales recortadas en cero,
+#    suma por categoría, saldo acumulado por camino y probabilidad de llegar al objetivo
+#    en fecha_limite. Todo vectorizado con NumPy, en bloques de caminos para acotar memoria.
+# Los resultados se cachean por meta y se invalidan cuando cambia el libro mayor
+# (cantidad y total de SaldoAcumulado), el objetivo o el mes en curso.
+
+HISTORY_MONTHS = 24
+DEFAULT_PATHS = 20_000
+MAX_PATHS = 200_000
+BLOCK_ELEMENTS = 4_000_000 # Elementos float32 por bloque (caminos x meses x categorías)
+
+def _add_months(mes: date, n: int) -> date:
+    total = mes.year * 12 + mes.month - 1 + n
+    return date(total // 12, total % 12 + 1, 1)
+
+def horizon_months(today: date, fecha_limite: date) -> int:
+    """Meses de flujo a simular hasta la fecha límite (el mes en curso cuenta si quedan días)."""
+    if fecha_limite < today:
+        return 0
+    return (fecha_limite.year - today.year) * 12 + fecha_limite.month - today.month + 1
+
+def fit_categories(session: Session, today: date, history_months: int = HISTORY_MONTHS):
+    """
+    Retorna (etiquetas, medias, desvíos, signos) por (categoría, tipo) a partir del cubo.
+    Solo meses completos: el mes en curso está incompleto y sesgaría las medias a la baja.
+    """
+    fin = month_start(today)
+    inicio = _add_months(fin, -history_months)
+    rows = session.execute(
+        select(CuboFinanciero.mes, CuboFinanciero.categoria, CuboFinanciero.tipo, CuboFinanciero.total)
+        .where(CuboFinanciero.mes >= inicio, CuboFinanciero.mes < fin)
+    ).all()
+    if not rows:
+        return [], np.zeros(0), np.zeros(0), np.zeros(0)
+
+    # La historia empieza en el primer mes con datos: no se rellena con ceros antes de usar el sistema
+    primero = min(r[0] for r in rows)
+    n_meses = (fin.year - primero.year) * 12 + fin.month - primero.month
+    etiquetas = sorted({(r[1], TipoTransaccion(r[2])) for r in rows}, key=lambda k: (k[0], k[1].value))
+    columna = {k: j for j, k in enumerate(etiquetas)}
+
+    serie = np.zeros((n_meses, len(etiquetas)))
+    for mes, categoria, tipo, total in rows:
+        i = (mes.year - primero.year) * 12 + mes.month - primero.month
+        serie[i, columna[(categoria, TipoTransaccion(tipo))]] += total
+
+    medias = serie.mean(axis=0)
+    desvios = serie.std(axis=0, ddof=1) if n_meses > 1 else np.zeros(len(etiquetas))
+    signos = np.array([1.0 if tipo == TipoTransaccion.INGRESO else -1.0 for _, tipo in etiquetas])
+    return etiquetas, medias, desvios, signos
+
+def simulate(saldo_inicial: float, objetivo: float, meses: int, medias: np.ndarray, desvios: np.ndarray,
+             signos: np.ndarray, paths: int = DEFAULT_PATHS, seed: Optional[int] = None) -> dict:
+    """Monte Carlo vectorizado. Retorna probabilidad de alcanzar el objetivo y percentiles del saldo final."""
+    if meses == 0 or medias.size == 0:
+        finales = np.full(paths, saldo_inicial)
+        return _summary(finales, objetivo, np.full(paths, 0 if saldo_inicial >= objetivo else -1))
+
+    rng = np.random.default_rng(seed)
+    mu = medias.astype(np.float32)
+    sigma = desvios.astype(np.float32)
+    block = max(1, BLOCK_ELEMENTS // (meses * medias.size))
+
+    finales = np.empty(paths)
+    meses_hasta = np.empty(paths, dtype=np.int64)
+    for start in range(0, paths, block):
+        n = min(block, paths - start)
+        montos = rng.standard_normal((n, meses, mu.size), dtype=np.float32) * sigma + mu
+        np.maximum(montos, 0, out=montos) # Un ingreso no se vuelve gasto (ni al revés)
+        neto = montos @ signos.astype(np.float32)
+        saldo = saldo_inicial + np.cumsum(neto, axis=1, dtype=np.float64)
+        alcanzado = saldo >= objetivo
+        finales[start:start + n] = saldo[:, -1]
+        # Primer mes en que el camino alcanza el objetivo (-1 si nunca)
+        meses_hasta[start:start + n] = np.where(alcanzado.any(axis=1), alcanzado.argmax(axis=1) + 1, -1)
+    if saldo_inicial >= objetivo:
+        meses_hasta[:] = 0
+    return _summary(finales, objetivo, meses_hasta)
+
+def _summary(finales: np.ndarray, objetivo: float, meses_hasta: np.ndarray) -> dict:
+    p5, p50, p95 = np.percentile(finales, [5, 50, 95])
+    mediana = np.median(np.where(meses_hasta >= 0, meses_hasta, np.inf))
+    return {
+        "probabilidad": round(float(np.mean(finales >= objetivo)), 4),
+        "saldo_final_p5": round(float(p5), 2),
+        "saldo_final_p50": round(float(p50), 2),
+        "saldo_final_p95": round(float(p95), 2),
+        "meses_hasta_objetivo_p50": int(mediana) if np.isfinite(mediana) else None,
+    }
+
+class ForecastCache:
+    """Cache de proceso por meta. La clave incluye un sello del libro mayor, así nuevas
+    transacciones (ORM o importaciones por Core, de cualquier proceso) invalidan el resultado."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._results: Dict[int, Tuple[tuple, dict]] = {}
+
+    def get(self, goal_id: int, key: tuple) -> Optional[dict]:
+        cached = self._results.get(goal_id)
+        return cached[1] if cached and cached[0] == key else None
+
+    def put(self, goal_id: int, key: tuple, result: dict):
+        with self._lock:
+            self._results[goal_id] = (key, result)
+
+forecast_cache = ForecastCache()
+
+def _ledger_stamp(session: Session) -> tuple:
+    return tuple(session.execute(
+        select(func.coalesce(func.sum(SaldoAcumulado.cantidad), 0), func.coalesce(func.sum(SaldoAcumulado.total), 0.0))
+    ).one())
+
+def goal_forecast(goal_id: int, paths: int = DEFAULT_PATHS, today: Optional[date] = None) -> Optional[dict]:
+    """Pronóstico para una meta. None si la meta no existe. Hace I/O y cálculo: llamar fuera del event loop."""
+    today = today or date.today()
+    with Session(read_engine) as session:
+        meta = session.get(MetaCapital, goal_id)
+        if meta is None:
+            return None
+        key = (_ledger_stamp(session), meta.monto_objetivo, meta.fecha_limite, month_start(today), paths)
+        cached = forecast_cache.get(goal_id, key)
+        if cached is not None:
+            return cached
+
+        totales = ledger_totals(session)
+        saldo = totales.get(TipoTransaccion.INGRESO, 0.0) - totales.get(TipoTransaccion.GASTO, 0.0)
+        etiquetas, medias, desvios, signos = fit_categories(session, today)
+
+    meses = horizon_months(today, meta.fecha_limite)
+    result = {
+        "meta_id": meta.id,
+        "nombre": meta.nombre_objetivo,
+        "objetivo": meta.monto_objetivo,
+        "limite": meta.fecha_limite,
+        "saldo_actual": saldo,
+        "meses_simulados": meses,
+        "caminos": paths,
+        "flujo_mensual_medio": round(float(medias @ signos), 2) if medias.size else 0.0,
+        "categorias": [
+            {"categoria": c, "tipo": t, "media_mensual": round(float(m), 2), "desvio_mensual": round(float(d), 2)}
+            for (c, t), m, d in zip(etiquetas, medias, desvios)
+        ],
+        **simulate(saldo, meta.monto_objetivo, meses, medias, desvios, signos, paths),
+    }
+    forecast_cache.put(goal_id, key, result)
+    return result
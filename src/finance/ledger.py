@@ -0,0 +1,208 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, event, func, inspect, insert, or_, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from src.finance.models import CuboFinanciero, SaldoAcumulado, SaldoMensual, TipoTransaccion, Transaccion
+
+# Libro mayor incremental: cada Transaccion escrita por el ORM (incluidos los GASTO
+# automáticos de cheese_factory.create_lote_queso) suma su monto a SaldoAcumulado,
+# SaldoMensual y CuboFinanciero dentro del mismo flush, así el resumen financiero es
+# una lectura O(1) y la analítica por período lee agregados mensuales.
+# Las cargas por Core (finance/statements.py) llaman a apply_transactions directamente.
+# check_ledger / rebuild_ledger comparan y reconstruyen contra la tabla Transaccion.
+
+TOLERANCIA = 0.005 # Diferencia máxima aceptada por redondeo de floats
+
+def month_start(fecha) -> date:
+    return date(fecha.year, fecha.month, 1)
+
+def _upsert(model, keys):
+    table = model.__table__
+    stmt = sqlite_insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c[k] for k in keys],
+        set_={"total": table.c.total + stmt.excluded.total, "cantidad": table.c.cantidad + stmt.excluded.cantidad},
+    )
+
+_apply_total = _upsert(SaldoAcumulado, ["tipo"])
+_apply_month = _upsert(SaldoMensual, ["mes", "tipo"])
+_apply_cube = _upsert(CuboFinanciero, ["mes", "categoria", "tipo"])
+
+def apply_transactions(connection, movimientos: Iterable[Tuple[TipoTransaccion, str, datetime, float, int]]):
+    """
+    Suma movimientos (tipo, categoria, fecha, monto, signo) a los saldos y al cubo.
+    signo = +1 para altas, -1 para revertir una transacción borrada o modificada.
+    """
+    totales: Dict = defaultdict(lambda: [0.0, 0])
+    mensuales: Dict = defaultdict(lambda: [0.0, 0])
+    cubo: Dict = defaultdict(lambda: [0.0, 0])
+    for tipo, categoria, fecha, monto, signo in movimientos:
+        mes = month_start(fecha)
+        for acumulado in (totales[tipo], mensuales[(mes, tipo)], cubo[(mes, categoria, tipo)]):
+            acumulado[0] += signo * monto
+            acumulado[1] += signo
+
+    if totales:
+        connection.execute(_apply_total, [{"tipo": t, "total": v[0], "cantidad": v[1]} for t, v in totales.items()])
+        connection.execute(_apply_month, [{"mes": k[0], "tipo": k[1], "total": v[0], "cantidad": v[1]} for k, v in mensuales.items()])
+        connection.execute(_apply_cube, [{"mes": k[0], "categoria": k[1], "tipo": k[2], "total": v[0], "cantidad": v[1]} for k, v in cubo.items()])
+
+def _previous(obj, attr: str):
+    deleted = inspect(obj).attrs[attr].history.deleted
+    return deleted[0] if deleted else getattr(obj, attr)
+
+@event.listens_for(Session, "after_flush")
+def _update_ledger(session, flush_context):
+    movimientos = []
+    for obj in session.new:
+        if isinstance(obj, Transaccion):
+            movimientos.append((obj.tipo, obj.categoria, obj.fecha, obj.monto, 1))
+    for obj in session.deleted:
+        if isinstance(obj, Transaccion):
+            movimientos.append((_previous(obj, "tipo"), _previous(obj, "categoria"), _previous(obj, "fecha"), _previous(obj, "monto"), -1))
+    for obj in session.dirty:
+        if isinstance(obj, Transaccion) and obj not in session.deleted:
+            antes = (_previous(obj, "tipo"), _previous(obj, "categoria"), _previous(obj, "fecha"), _previous(obj, "monto"))
+            despues = (obj.tipo, obj.categoria, obj.fecha, obj.monto)
+            if antes != despues:
+                movimientos.append((*antes, -1))
+                movimientos.append((*despues, 1))
+    if movimientos:
+        apply_transactions(session.connection(), movimientos)
+
+def ledger_totals(session: Session) -> Dict[TipoTransaccion, float]:
+    rows = session.execute(select(SaldoAcumulado.tipo, SaldoAcumulado.total))
+    return {TipoTransaccion(tipo): total for tipo, total in rows}
+
+def _expected(session: Session):
+    mes = func.strftime("%Y-%m-01", Transaccion.fecha)
+    cubo = {
+        (date.fromisoformat(m), categoria, TipoTransaccion(tipo)): (total, cantidad)
+        for m, categoria, tipo, total, cantidad in session.execute(
+            select(mes, Transaccion.categoria, Transaccion.tipo, func.sum(Transaccion.monto), func.count())
+            .group_by(mes, Transaccion.categoria, Transaccion.tipo)
+        )
+    }
+    # Los niveles superiores se derivan del cubo (un solo escaneo de Transaccion)
+    totales: Dict = defaultdict(lambda: [0.0, 0])
+    mensuales: Dict = defaultdict(lambda: [0.0, 0])
+    for (m, _, tipo), (total, cantidad) in cubo.items():
+        for acumulado in (totales[tipo], mensuales[(m, tipo)]):
+            acumulado[0] += total
+            acumulado[1] += cantidad
+    return (
+        {k: tuple(v) for k, v in totales.items()},
+        {k: tuple(v) for k, v in mensuales.items()},
+        cubo,
+    )
+
+def _stored(session: Session, model, keys):
+    columns = [getattr(model, k) for k in keys]
+    return {
+        tuple(row[:-2]) if len(keys) > 1 else row[0]: (row[-2], row[-1])
+        for row in session.execute(select(*columns, model.total, model.cantidad))
+    }
+
+def check_ledger(session: Session) -> List[dict]:
+    """Compara los saldos guardados con un recálculo completo. Lista vacía = consistente."""
+    esperados = dict(zip(("total", "mensual", "cubo"), _expected(session)))
+    guardados = {
+        "total": _stored(session, SaldoAcumulado, ["tipo"]),
+        "mensual": _stored(session, SaldoMensual, ["mes", "tipo"]),
+        "cubo": _stored(session, CuboFinanciero, ["mes", "categoria", "tipo"]),
+    }
+
+    diferencias = []
+    for nivel in ("total", "mensual", "cubo"):
+        for clave in esperados[nivel].keys() | guardados[nivel].keys():
+            esperado = esperados[nivel].get(clave, (0.0, 0))
+            guardado = guardados[nivel].get(clave, (0.0, 0))
+            if abs(esperado[0] - guardado[0]) > TOLERANCIA or esperado[1] != guardado[1]:
+                diferencias.append({
+                    "nivel": nivel,
+                    "clave": [str(getattr(k, "value", k)) for k in (clave if isinstance(clave, tuple) else (clave,))],
+                    "esperado": esperado[0],
+                    "guardado": guardado[0],
+                })
+    return diferencias
+
+def rebuild_ledger(session: Session):
+    """Reconstruye saldos y cubo desde cero a partir de Transaccion."""
+    totales, mensuales, cubo = _expected(session)
+    session.execute(delete(SaldoAcumulado))
+    session.execute(delete(SaldoMensual))
+    session.execute(delete(CuboFinanciero))
+    if totales:
+        session.execute(insert(SaldoAcumulado), [{"tipo": t, "total": v[0], "cantidad": v[1]} for t, v in totales.items()])
+        session.execute(insert(SaldoMensual), [{"mes": k[0], "tipo": k[1], "total": v[0], "cantidad": v[1]} for k, v in mensuales.items()])
+        session.execute(insert(CuboFinanciero), [{"mes": k[0], "categoria": k[1], "tipo": k[2], "total": v[0], "cantidad": v[1]} for k, v in cubo.items()])
+
+def ensure_ledger(session: Session):
+    """Al arrancar: reconstruye si la cantidad de transacciones no coincide con el libro o el cubo."""
+    registradas = session.scalar(select(func.coalesce(func.sum(SaldoAcumulado.cantidad), 0)))
+    en_cubo = session.scalar(select(func.coalesce(func.sum(CuboFinanciero.cantidad), 0)))
+    total = session.scalar(select(func.count()).select_from(Transaccion))
+    if registradas != total or en_cubo != total:
+        rebuild_ledger(session)
+        session.commit()
+
+# --- Consultas por rango de fechas sobre el cubo ---
+# Los meses completos dentro de [desde, hasta] se leen de CuboFinanciero; solo los
+# meses de borde incompletos se suman desde Transaccion (acotado por el índice de fecha).
+
+def _next_month(mes: date) -> date:
+    return date(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+
+def full_months(desde: date, hasta: date) -> Tuple[date, date]:
+    """[primero, fin) de los meses completos dentro de [desde, hasta]. Vacío si primero >= fin."""
+    primero = desde if desde.day == 1 else _next_month(month_start(desde))
+    fin = month_start(hasta + timedelta(days=1))
+    return primero, fin
+
+def cube_report(session: Session, desde: date, hasta: date,
+                categorias: Optional[List[str]] = None, tipo: Optional[TipoTransaccion] = None) -> List[dict]:
+    """Totales por mes x categoría x tipo entre desde y hasta (ambos inclusive)."""
+    primero, fin = full_months(desde, hasta)
+    inicio = datetime.combine(desde, datetime.min.time())
+    limite = datetime.combine(hasta + timedelta(days=1), datetime.min.time())
+    filas: Dict = {}
+
+    if primero < fin:
+        cubo = (
+            select(CuboFinanciero.mes, CuboFinanciero.categoria, CuboFinanciero.tipo, CuboFinanciero.total, CuboFinanciero.cantidad)
+            .where(CuboFinanciero.mes >= primero, CuboFinanciero.mes < fin, CuboFinanciero.cantidad > 0)
+        )
+        if categorias:
+            cubo = cubo.where(CuboFinanciero.categoria.in_(categorias))
+        if tipo:
+            cubo = cubo.where(CuboFinanciero.tipo == tipo)
+        for mes, categoria, tipo_fila, total, cantidad in session.execute(cubo):
+            filas[(mes, categoria, tipo_fila)] = (total, cantidad, False)
+        bordes = [
+            and_(Transaccion.fecha >= inicio, Transaccion.fecha < datetime.combine(primero, datetime.min.time())),
+            and_(Transaccion.fecha >= datetime.combine(fin, datetime.min.time()), Transaccion.fecha < limite),
+        ]
+    else:
+        bordes = [and_(Transaccion.fecha >= inicio, Transaccion.fecha < limite)]
+
+    mes = func.strftime("%Y-%m-01", Transaccion.fecha)
+    parciales = (
+        select(mes, Transaccion.categoria, Transaccion.tipo, func.sum(Transaccion.monto), func.count())
+        .where(or_(*bordes))
+        .group_by(mes, Transaccion.categoria, Transaccion.tipo)
+    )
+    if categorias:
+        parciales = parciales.where(Transaccion.categoria.in_(categorias))
+    if tipo:
+        parciales = parciales.where(Transaccion.tipo == tipo)
+    for m, categoria, tipo_fila, total, cantidad in session.execute(parciales):
+        filas[(date.fromisoformat(m), categoria, TipoTransaccion(tipo_fila))] = (total, cantidad, True)
+
+    return [
+        {"mes": k[0], "categoria": k[1], "tipo": k[2], "total": v[0], "cantidad": v[1], "parcial": v[2]}
+        for k, v in sorted(filas.items(), key=lambda item: (item[0][0], item[0][1], item[0][2].value))
+    ]
@@ -8,14 +8,16 @@ class TipoTransaccion(str, Enum):
     GASTO = "GASTO"
 
 class TransaccionBase(SQLModel):
-    fecha: datetime = Field(default_factory=datetime.now)
+    fecha: datetime = Field(default_factory=datetime.now, index=True)
     tipo: TipoTransaccion
-    categoria: str # Ej: "Venta Queso", "Compra Insumos", "Pago Servicios"
+    categoria: str = Field(index=True) # Ej: "Venta Queso", "Compra Insumos", "Pago Servicios"
     monto: float
     descripcion: Optional[str] = None
 
 class Transaccion(TransaccionBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
+    # sha256 de (fecha, monto, descripción) para filas importadas de extractos; NULL en altas manuales
+    hash_contenido: Optional[str] = Field(default=None, unique=True, index=True)
 
 class TransaccionCreate(TransaccionBase):
     pass
@@ -30,3 +32,27 @@ class MetaCapital(MetaCapitalBase, table=True):
 
 class MetaCapitalCreate(MetaCapitalBase):
     pass
+
+# --- Libro Mayor (saldos acumulados) ---
+# Se actualizan en la misma transacción que cada alta de Transaccion (ver finance/ledger.py)
+
+class SaldoAcumulado(SQLModel, table=True):
+    """Total histórico por tipo de transacción."""
+    tipo: TipoTransaccion = Field(primary_key=True)
+    total: float = 0.0
+    cantidad: int = 0
+
+class SaldoMensual(SQLModel, table=True):
+    """Total por mes (primer día del mes) y tipo de transacción."""
+    mes: date = Field(primary_key=True)
+    tipo: TipoTransaccion = Field(primary_key=True)
+    total: float = 0.0
+    cantidad: int = 0
+
+class CuboFinanciero(SQLModel, table=True):
+    """Agregado mes x categoría x tipo para analítica (P&L por período y categoría)."""
+    mes: date = Field(primary_key=True)
+    categoria: str = Field(primary_key=True)
+    tipo: TipoTransaccion = Field(primary_key=True)
+    total: float = 0.0
+    cantidad: int = 0
@@ -1,38 +1,117 @@
-from fastapi import APIRouter, Depends
-from sqlmodel import Session, select, func
-from typing import List, Dict, Any
+from datetime import date
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import insert
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import List, Dict, Any, Optional
 
-from src.shared.database import get_session
+from src.shared.database import get_async_session, get_async_read_session
 from src.finance.models import Transaccion, TransaccionCreate, MetaCapital, MetaCapitalCreate, TipoTransaccion
+from src.finance import forecast, ledger, statements
+from src.core.events import event_bus, event_rows, publish_on_commit
+from src.core.models import Evento
 
 router = APIRouter(prefix="/finance", tags=["Finance"])
 
+# Cada transacción creada por ORM (incluye el GASTO automático de la quesería) va al canal en vivo
+publish_on_commit(Transaccion, "transacciones")
+
 @router.post("/transactions/", response_model=Transaccion)
-def create_transaction(transaction: TransaccionCreate, session: Session = Depends(get_session)):
+async def create_transaction(transaction: TransaccionCreate, session: AsyncSession = Depends(get_async_session)):
     db_transaction = Transaccion.model_validate(transaction)
     session.add(db_transaction)
-    session.commit()
-    session.refresh(db_transaction)
+    await session.commit()
+    await session.refresh(db_transaction)
     return db_transaction
 
+@router.post("/transactions/import")
+async def import_statement(
+    request: Request,
+    categoria: str = statements.CATEGORIA_DEFECTO,
+    separador: str = Query(",", min_length=1, max_length=1),
+    session: AsyncSession = Depends(get_async_session),
+) -> Dict[str, Any]:
+    """
+    Importa un extracto CSV enviado como cuerpo crudo (text/csv), procesándolo a medida
+    que llega. Idempotente: las filas ya importadas (mismo hash de contenido) se omiten.
+    Cada lote se confirma al escribirse: el lock de escritura de SQLite no queda tomado
+    mientras se espera el resto del cuerpo (un extracto grande por un enlace lento
+    bloquearía a los demás escritores). Si el extracto falla a mitad de camino, lo ya
+    confirmado queda y reenviarlo corregido es seguro.
+    """
+    parser = statements.StatementParser(categoria=categoria, separador=separador)
+    pendientes: List[dict] = []
+    importadas = 0
+
+    async def write(rows: List[dict]) -> int:
+        nuevas = (await session.execute(statements.insert_statement(rows))).all()
+        if nuevas:
+            movimientos = [(tipo, cat, fecha, monto, 1) for tipo, cat, fecha, monto in nuevas]
+            await session.run_sync(lambda s: ledger.apply_transactions(s.connection(), movimientos))
+        await session.commit() # Filas + libro mayor del lote, y se libera el lock
+        return len(nuevas)
+
+    try:
+        async for chunk in request.stream():
+            pendientes.extend(parser.feed(chunk))
+            while len(pendientes) >= statements.BATCH_SIZE:
+                importadas += await write(pendientes[:statements.BATCH_SIZE])
+                del pendientes[:statements.BATCH_SIZE]
+        pendientes.extend(parser.close())
+        if pendientes:
+            importadas += await write(pendientes)
+    except ValueError as e:
+        await session.rollback()
+        detalle = str(e)
+        if importadas:
+            detalle += f" ({importadas} filas ya importadas; reenviar el extracto corregido es seguro)"
+        raise HTTPException(status_code=422, detail=detalle)
+    finally:
+        if importadas:
+            # La importación escribe por Core (sin eventos de ORM): se publica un resumen
+            resumen = {"importadas": importadas, "categoria": categoria, "origen": "extracto"}
+            await session.execute(insert(Evento.__table__), event_rows("transacciones", [resumen]))
+            await session.commit()
+            event_bus.notify()
+
+    validas = parser.leidas - parser.cantidad_errores
+    return {
+        "leidas": parser.leidas,
+        "importadas": importadas,
+        "duplicadas": validas - importadas,
+        "cantidad_errores": parser.cantidad_errores,
+        "errores": parser.errores,
+    }
+
 @router.post("/goals/", response_model=MetaCapital)
-def create_goal(goal: MetaCapitalCreate, session: Session = Depends(get_session)):
+async def create_goal(goal: MetaCapitalCreate, session: AsyncSession = Depends(get_async_session)):
     db_goal = MetaCapital.model_validate(goal)
     session.add(db_goal)
-    session.commit()
-    session.refresh(db_goal)
+    await session.commit()
+    await session.refresh(db_goal)
     return db_goal
 
+@router.get("/goals/{goal_id}/forecast")
+async def read_goal_forecast(goal_id: int, paths: int = Query(forecast.DEFAULT_PATHS, ge=1000, le=forecast.MAX_PATHS)) -> Dict[str, Any]:
+    """Probabilidad de alcanzar la meta en su fecha límite (Monte Carlo sobre el flujo mensual por categoría)."""
+    # La simulación es CPU: se hace en el threadpool para no frenar el event loop
+    result = await run_in_threadpool(forecast.goal_forecast, goal_id, paths)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Goal not found")
+    return result
+
 @router.get("/summary/")
-def get_financial_summary(session: Session = Depends(get_session)) -> Dict[str, Any]:
-    # 1. Calcular Balance Total (Ingresos - Gastos)
-    ingresos = session.exec(select(func.sum(Transaccion.monto)).where(Transaccion.tipo == TipoTransaccion.INGRESO)).one() or 0.0
-    gastos = session.exec(select(func.sum(Transaccion.monto)).where(Transaccion.tipo == TipoTransaccion.GASTO)).one() or 0.0
+async def get_financial_summary(session: AsyncSession = Depends(get_async_read_session)) -> Dict[str, Any]:
+    # 1. Calcular Balance Total (Ingresos - Gastos) desde el libro mayor (sin escanear Transaccion)
+    totales = await session.run_sync(ledger.ledger_totals)
+    ingresos = totales.get(TipoTransaccion.INGRESO, 0.0)
+    gastos = totales.get(TipoTransaccion.GASTO, 0.0)
     total_ahorrado = ingresos - gastos
 
     # 2. Obtener Meta Activa (Tomamos la última creada como ejemplo, o la más cercana)
     # Por simplicidad, tomamos la última meta registrada.
-    meta = session.exec(select(MetaCapital).order_by(MetaCapital.id.desc())).first()
+    meta = (await session.exec(select(MetaCapital).order_by(MetaCapital.id.desc()))).first()
     
     progreso_pct = 0.0
     meta_info = None
@@ -43,6 +122,7 @@ def get_financial_summary(session: Session = Depends(get_session)) -> Dict[str,
             # Cap at 100% just for display logic if needed, but raw value is better
         
         meta_info = {
+            "id": meta.id,
             "nombre": meta.nombre_objetivo,
             "objetivo": meta.monto_objetivo,
             "limite": meta.fecha_limite,
@@ -55,3 +135,37 @@ def get_financial_summary(session: Session = Depends(get_session)) -> Dict[str,
         "total_gastos": gastos,
         "meta_activa": meta_info
     }
+
+@router.get("/ledger/check")
+async def check_ledger(session: AsyncSession = Depends(get_async_read_session)) -> Dict[str, Any]:
+    diferencias = await session.run_sync(ledger.check_ledger)
+    return {"consistente": not diferencias, "diferencias": diferencias}
+
+@router.post("/ledger/rebuild")
+async def rebuild_ledger(session: AsyncSession = Depends(get_async_session)) -> Dict[str, Any]:
+    await session.run_sync(ledger.rebuild_ledger)
+    await session.commit()
+    return {"status": "ok"}
+
+@router.get("/cube/")
+async def read_cube(
+    desde: date,
+    hasta: date,
+    categoria: Optional[List[str]] = Query(None),
+    tipo: Optional[TipoTransaccion] = None,
+    session: AsyncSession = Depends(get_async_read_session),
+) -> Dict[str, Any]:
+    """P&L por mes x categoría x tipo. Meses completos desde el cubo, bordes desde Transaccion."""
+    if desde > hasta:
+        raise HTTPException(status_code=422, detail="desde must be before hasta")
+    filas = await session.run_sync(lambda s: ledger.cube_report(s, desde, hasta, categoria, tipo))
+    ingresos = sum(f["total"] for f in filas if f["tipo"] == TipoTransaccion.INGRESO)
+    gastos = sum(f["total"] for f in filas if f["tipo"] == TipoTransaccion.GASTO)
+    return {
+        "desde": desde,
+        "hasta": hasta,
+        "filas": filas,
+        "total_ingresos": ingresos,
+        "total_gastos": gastos,
+        "balance": ingresos - gastos,
+    }
@@ -0,0 +1,149 @@
+import codecs
+import csv
+import hashlib
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from src.finance.models import TipoTransaccion, Transaccion
+
+# Importación de extractos bancarios / de caja en CSV.
+# El cuerpo se procesa a medida que llega (decodificación y parseo incremental, una fila
+# por línea) y se escribe en INSERTs multi-valor con ON CONFLICT DO NOTHING sobre
+# Transaccion.hash_contenido: reimportar un extracto que se solapa con otro ya cargado
+# solo escribe las filas nuevas. Las filas insertadas (RETURNING) se pasan al libro mayor.
+#
+# Columnas: fecha, monto, descripcion (obligatorias); categoria y tipo (opcionales).
+# Sin columna tipo, el signo del monto decide: negativo = GASTO, positivo = INGRESO.
+
+BATCH_SIZE = 500 # Filas por INSERT multi-valor (6 parámetros por fila)
+MAX_ERRORES = 100 # Errores de parseo detallados en la respuesta
+CATEGORIA_DEFECTO = "Extracto bancario"
+FORMATOS_FECHA = ("%d/%m/%Y", "%d-%m-%Y", "%d/%m/%Y %H:%M", "%d/%m/%y")
+
+def content_hash(fecha: datetime, monto: float, descripcion: str, ocurrencia: int = 0) -> str:
+    """
+    sha256 de (fecha, monto, descripción). `ocurrencia` distingue movimientos idénticos
+    dentro del mismo extracto (ej. dos cargos iguales el mismo día).
+    """
+    clave = f"{fecha.isoformat()}|{monto:.2f}|{' '.join(descripcion.split()).lower()}|{ocurrencia}"
+    return hashlib.sha256(clave.encode("utf-8")).hexdigest()
+
+def parse_fecha(value: str) -> datetime:
+    value = value.strip()
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(value, formato)
+        except ValueError:
+            continue
+    raise ValueError(f"fecha inválida: {value!r}")
+
+def parse_monto(value: str) -> float:
+    """Acepta '1234.56', '-1.234,56', '$ 1,234.56'. El último separador es el decimal."""
+    limpio = value.strip().replace("$", "").replace(" ", "")
+    if "," in limpio and "." in limpio:
+        decimal = "," if limpio.rfind(",") > limpio.rfind(".") else "."
+        miles = "." if decimal == "," else ","
+        limpio = limpio.replace(miles, "").replace(decimal, ".")
+    elif "," in limpio:
+        limpio = limpio.replace(",", ".")
+    try:
+        return float(limpio)
+    except ValueError:
+        raise ValueError(f"monto inválido: {value!r}")
+
+class StatementParser:
+    """
+    Parser incremental: recibe bloques de bytes y devuelve filas listas para insertar.
+    Las líneas incompletas quedan pendientes hasta el siguiente bloque.
+    """
+    def __init__(self, categoria: str = CATEGORIA_DEFECTO, separador: str = ","):
+        self.categoria = categoria
+        self.separador = separador
+        self.leidas = 0
+        self.errores: List[dict] = []
+        self.cantidad_errores = 0
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+        self._pendiente = ""
+        self._columnas: Optional[Dict[str, int]] = None
+        self._linea = 0
+        self._ocurrencias: Dict[tuple, int] = defaultdict(int)
+
+    def feed(self, chunk: bytes) -> List[dict]:
+        texto = self._pendiente + self._decoder.decode(chunk)
+        lineas = texto.split("\n")
+        self._pendiente = lineas.pop()
+        return self._parse_lines(lineas)
+
+    def close(self) -> List[dict]:
+        resto = self._pendiente + self._decoder.decode(b"", final=True)
+        self._pendiente = ""
+        return self._parse_lines([resto]) if resto.strip() else []
+
+    def _error(self, mensaje: str):
+        self.cantidad_errores += 1
+        if len(self.errores) < MAX_ERRORES:
+            self.errores.append({"linea": self._linea, "error": mensaje})
+
+    def _parse_lines(self, lineas: List[str]) -> List[dict]:
+        filas = []
+        for campos in csv.reader((linea.rstrip("\r") for linea in lineas), delimiter=self.separador):
+            self._linea += 1
+            if not any(c.strip() for c in campos):
+                continue
+            if self._columnas is None:
+                self._set_header(campos)
+                continue
+            self.leidas += 1
+            try:
+                filas.append(self._row(campos))
+            except (ValueError, IndexError) as e:
+                self._error(str(e))
+        return filas
+
+    def _set_header(self, campos: List[str]):
+        columnas = {c.strip().lower(): i for i, c in enumerate(campos)}
+        faltantes = {"fecha", "monto", "descripcion"} - columnas.keys()
+        if faltantes:
+            raise ValueError(f"Faltan columnas en el extracto: {', '.join(sorted(faltantes))}")
+        self._columnas = columnas
+
+    def _row(self, campos: List[str]) -> dict:
+        col = self._columnas
+        fecha = parse_fecha(campos[col["fecha"]])
+        monto = parse_monto(campos[col["monto"]])
+        descripcion = campos[col["descripcion"]].strip()
+
+        if "tipo" in col and campos[col["tipo"]].strip():
+            tipo = TipoTransaccion(campos[col["tipo"]].strip().upper())
+        else:
+            tipo = TipoTransaccion.GASTO if monto < 0 else TipoTransaccion.INGRESO
+        categoria = campos[col["categoria"]].strip() if "categoria" in col else ""
+
+        clave = (fecha, round(monto, 2), " ".join(descripcion.split()).lower())
+        ocurrencia = self._ocurrencias[clave]
+        self._ocurrencias[clave] += 1
+        return {
+            "fecha": fecha,
+            "tipo": tipo,
+            "categoria": categoria or self.categoria,
+            "monto": abs(monto),
+            "descripcion": descripcion or None,
+            "hash_contenido": content_hash(fecha, monto, descripcion, ocurrencia),
+        }
+
+def insert_statement(rows: List[dict]):
+    """INSERT multi-valor que ignora hashes ya cargados y devuelve los movimientos nuevos."""
+    table = Transaccion.__table__
+    return (
+        sqlite_insert(table)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=[table.c.hash_contenido])
+        .returning(table.c.tipo, table.c.categoria, table.c.fecha, table.c.monto)
+    )
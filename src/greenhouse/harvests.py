@@ -0,0 +1,114 @@
+import math
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from src.greenhouse.models import EstadisticaSemilla, FVHCiclo, FVHCosecha
+
+# Cosechas de FVH: el ratio de conversión se guarda al registrar la cosecha (no se
+# recalcula navegando cosecha.ciclo en cada lectura) y cada alta suma a
+# EstadisticaSemilla (upsert `x = x + excluded.x`) en la misma transacción, así las
+# estadísticas por tipo de semilla son una lectura de una fila por semilla.
+
+def conversion_ratio(peso_final_pasto_kg: float, peso_semilla_kg: float) -> float:
+    return peso_final_pasto_kg / peso_semilla_kg if peso_semilla_kg > 0 else 0.0
+
+def cycle_days(fecha_siembra: datetime, fecha_cosecha: datetime) -> float:
+    return max((fecha_cosecha - fecha_siembra).total_seconds() / 86400, 0.0)
+
+_SUMAS = ["cosechas", "suma_ratio", "suma_ratio_cuadrado", "kg_semilla", "kg_pasto", "suma_dias_ciclo"]
+
+def _accumulate_statement():
+    table = EstadisticaSemilla.__table__
+    stmt = sqlite_insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.tipo_semilla],
+        set_={c: table.c[c] + stmt.excluded[c] for c in _SUMAS},
+    )
+
+accumulate_seed_stats = _accumulate_statement()
+
+def seed_stats_delta(cycle: FVHCiclo, harvest: FVHCosecha) -> dict:
+    return {
+        "tipo_semilla": cycle.tipo_semilla,
+        "cosechas": 1,
+        "suma_ratio": harvest.ratio_conversion,
+        "suma_ratio_cuadrado": harvest.ratio_conversion ** 2,
+        "kg_semilla": cycle.peso_semilla_kg,
+        "kg_pasto": harvest.peso_final_pasto_kg,
+        "suma_dias_ciclo": cycle_days(cycle.fecha_siembra, harvest.fecha_cosecha),
+    }
+
+def harvest_list_statement(tipo_semilla: Optional[str] = None, desde: Optional[datetime] = None, hasta: Optional[datetime] = None):
+    """Cosechas con su ciclo en un solo JOIN (sin carga perezosa de cosecha.ciclo)."""
+    statement = select(FVHCosecha, FVHCiclo).join(FVHCiclo, FVHCosecha.ciclo_id == FVHCiclo.id)
+    if tipo_semilla:
+        statement = statement.where(FVHCiclo.tipo_semilla == tipo_semilla)
+    if desde:
+        statement = statement.where(FVHCosecha.fecha_cosecha >= desde)
+    if hasta:
+        statement = statement.where(FVHCosecha.fecha_cosecha < hasta)
+    return statement
+
+def harvest_read(harvest: FVHCosecha, cycle: FVHCiclo) -> dict:
+    return {
+        **harvest.model_dump(),
+        "tipo_semilla": cycle.tipo_semilla,
+        "peso_semilla_kg": cycle.peso_semilla_kg,
+        "fecha_siembra": cycle.fecha_siembra,
+        "dias_ciclo": round(cycle_days(cycle.fecha_siembra, harvest.fecha_cosecha), 1),
+    }
+
+def seed_stats_read(stats: EstadisticaSemilla) -> dict:
+    n = stats.cosechas
+    media = stats.suma_ratio / n if n else 0.0
+    varianza = (stats.suma_ratio_cuadrado - n * media ** 2) / (n - 1) if n > 1 else 0.0
+    return {
+        "tipo_semilla": stats.tipo_semilla,
+        "cosechas": n,
+        "ratio_medio": round(media, 3),
+        "ratio_desvio": round(math.sqrt(max(varianza, 0.0)), 3),
+        "ratio_global": round(conversion_ratio(stats.kg_pasto, stats.kg_semilla), 3),
+        "kg_semilla": stats.kg_semilla,
+        "kg_pasto": stats.kg_pasto,
+        "dias_ciclo_medio": round(stats.suma_dias_ciclo / n, 1) if n else 0.0,
+    }
+
+def rebuild_seed_stats(session: Session):
+    """Completa ratios faltantes y recalcula EstadisticaSemilla desde las cosechas."""
+    semilla = select(FVHCiclo.peso_semilla_kg).where(FVHCiclo.id == FVHCosecha.ciclo_id).scalar_subquery()
+    session.execute(
+        update(FVHCosecha)
+        .where(FVHCosecha.ratio_conversion == 0)
+        .values(ratio_conversion=func.coalesce(FVHCosecha.peso_final_pasto_kg / func.nullif(semilla, 0), 0.0))
+    )
+    session.execute(delete(EstadisticaSemilla))
+    dias = func.julianday(FVHCosecha.fecha_cosecha) - func.julianday(FVHCiclo.fecha_siembra)
+    session.execute(
+        insert(EstadisticaSemilla).from_select(
+            ["tipo_semilla", *_SUMAS],
+            select(
+                FVHCiclo.tipo_semilla,
+                func.count(),
+                func.sum(FVHCosecha.ratio_conversion),
+                func.sum(FVHCosecha.ratio_conversion * FVHCosecha.ratio_conversion),
+                func.sum(FVHCiclo.peso_semilla_kg),
+                func.sum(FVHCosecha.peso_final_pasto_kg),
+                func.sum(func.max(dias, 0)),
+            )
+            .select_from(FVHCosecha)
+            .join(FVHCiclo, FVHCosecha.ciclo_id == FVHCiclo.id)
+            .group_by(FVHCiclo.tipo_semilla),
+        )
+    )
+
+def ensure_seed_stats(session: Session):
+    """Al arrancar: reconstruye si los acumulados no cubren todas las cosechas."""
+    counted = session.scalar(select(func.coalesce(func.sum(EstadisticaSemilla.cosechas), 0)))
+    total = session.scalar(select(func.count()).select_from(FVHCosecha))
+    if counted != total:
+        rebuild_seed_stats(session)
+        session.commit()
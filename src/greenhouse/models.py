@@ -22,19 +22,45 @@ class FVHCicloCreate(FVHCicloBase):
     pass
 
 class FVHCosechaBase(SQLModel):
-    ciclo_id: int = Field(foreign_key="fvhciclo.id")
+    ciclo_id: int = Field(foreign_key="fvhciclo.id", index=True)
     fecha_cosecha: datetime = Field(default_factory=datetime.utcnow)
     peso_final_pasto_kg: float
 
 class FVHCosecha(FVHCosechaBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
+    # kg de pasto por kg de semilla, calculado al registrar la cosecha (ver create_harvest)
+    ratio_conversion: float = 0.0
     ciclo: Optional[FVHCiclo] = Relationship(back_populates="cosechas")
 
-    @property
-    def ratio_conversion(self) -> float:
-        if self.ciclo and self.ciclo.peso_semilla_kg > 0:
-            return self.peso_final_pasto_kg / self.ciclo.peso_semilla_kg
-        return 0.0
-
 class FVHCosechaCreate(FVHCosechaBase):
     pass
+
+class FVHCosechaRead(FVHCosechaBase):
+    id: int
+    ratio_conversion: float
+    tipo_semilla: str
+    peso_semilla_kg: float
+    fecha_siembra: datetime
+    dias_ciclo: float
+
+# --- Estadísticas de conversión por tipo de semilla ---
+# Acumulados que se suman en la misma transacción de cada cosecha (ver greenhouse/harvests.py)
+
+class EstadisticaSemilla(SQLModel, table=True):
+    tipo_semilla: str = Field(primary_key=True)
+    cosechas: int = 0
+    suma_ratio: float = 0.0
+    suma_ratio_cuadrado: float = 0.0 # Para el desvío estándar sin releer las cosechas
+    kg_semilla: float = 0.0
+    kg_pasto: float = 0.0
+    suma_dias_ciclo: float = 0.0
+
+class EstadisticaSemillaRead(SQLModel):
+    tipo_semilla: str
+    cosechas: int
+    ratio_medio: float
+    ratio_desvio: float
+    ratio_global: float # kg_pasto / kg_semilla de todas las cosechas
+    kg_semilla: float
+    kg_pasto: float
+    dias_ciclo_medio: float
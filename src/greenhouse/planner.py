@@ -0,0 +1,221 @@
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+from src.shared.database import read_engine
+from src.greenhouse.harvests import seed_stats_read
+from src.greenhouse.models import EstadisticaSemilla, EstadoCiclo, FVHCiclo, FVHCosecha
+from src.ovine_manager.models import Animal, EventoAlimentacion, LoteOvejas
+
+# --- Planificador de siembras de FVH ---
+# 1. Demanda: kg/día por lote = cabezas actuales x consumo por cabeza, con el consumo
+#    estimado de EventoAlimentacion de los últimos FEED_WINDOW_DAYS días (lotes sin
+#    historial usan la mediana del resto, o CONSUMO_DEFECTO_KG si no hay historial).
+# 2. Oferta comprometida: ciclos GERMINANDO/LISTO cosechan en fecha_siembra + días de ciclo
+#    con peso_semilla x ratio de la semilla.
+# 3. Calendario: una siembra cada `cada_dias`; cada cosecha cubre la demanda neta de los
+#    `cada_dias` días siguientes. Todo con sumas acumuladas de NumPy sobre el horizonte,
+#    así replanificar cuesta milisegundos y se hace después de cada cosecha.
+# Ratio y días de ciclo salen de EstadisticaSemilla (acumulados por cada cosecha).
+
+FEED_WINDOW_DAYS = 30
+HORIZON_DAYS = 90
+MAX_HORIZON_DAYS = 365
+CONSUMO_DEFECTO_KG = 2.0      # kg de FVH por cabeza y día si no hay historial de alimentación
+RATIO_DEFECTO = 6.0           # kg de pasto por kg de semilla si no hay cosechas registradas
+DIAS_CICLO_DEFECTO = 10.0
+CACHE_TTL_SECONDS = 15 * 60   # Tope de antigüedad para cubrir escrituras de otros procesos
+
+def load_demand(session: Session, today: date) -> List[dict]:
+    """Cabezas y consumo por cabeza de cada lote con animales."""
+    cabezas = dict(session.execute(
+        select(Animal.lote_actual_id, func.count()).where(Animal.lote_actual_id.is_not(None)).group_by(Animal.lote_actual_id)
+    ).all())
+    if not cabezas:
+        return []
+    nombres = dict(session.execute(select(LoteOvejas.id, LoteOvejas.nombre).where(LoteOvejas.id.in_(cabezas))).all())
+
+    desde = datetime.combine(today - timedelta(days=FEED_WINDOW_DAYS), datetime.min.time())
+    historial = session.execute(
+        select(
+            EventoAlimentacion.lote_id,
+            func.sum(EventoAlimentacion.kilos_ofrecidos),
+            func.count(func.distinct(func.date(EventoAlimentacion.fecha))),
+        )
+        .where(EventoAlimentacion.fecha >= desde, EventoAlimentacion.lote_id.in_(cabezas))
+        .group_by(EventoAlimentacion.lote_id)
+    ).all()
+
+    lotes = np.array(sorted(cabezas), dtype=np.int64)
+    n = np.array([cabezas[l] for l in lotes], dtype=np.float64)
+    consumo = np.full(len(lotes), np.nan)
+    posicion = {l: i for i, l in enumerate(lotes.tolist())}
+    for lote_id, kilos, dias in historial:
+        if dias:
+            consumo[posicion[lote_id]] = kilos / dias / cabezas[lote_id]
+    observado = ~np.isnan(consumo)
+    consumo[~observado] = np.median(consumo[observado]) if observado.any() else CONSUMO_DEFECTO_KG
+
+    return [
+        {"lote_id": int(l), "nombre": nombres.get(int(l), ""), "cabezas": int(c),
+         "consumo_cabeza_kg": round(float(k), 3), "demanda_kg_dia": round(float(c * k), 2), "con_historial": bool(o)}
+        for l, c, k, o in zip(lotes, n, consumo, observado)
+    ]
+
+def load_conversion(session: Session) -> Dict[str, dict]:
+    """Ratio, días de ciclo y cantidad de cosechas por tipo de semilla, desde EstadisticaSemilla."""
+    conversion = {}
+    for stats in session.scalars(select(EstadisticaSemilla).where(EstadisticaSemilla.cosechas > 0)):
+        leido = seed_stats_read(stats)
+        conversion[stats.tipo_semilla] = {
+            "tipo_semilla": stats.tipo_semilla,
+            "ratio": leido["ratio_medio"] or RATIO_DEFECTO,
+            "dias_ciclo": leido["dias_ciclo_medio"] or DIAS_CICLO_DEFECTO,
+            "cosechas": stats.cosechas,
+        }
+    return conversion
+
+def pick_seed(conversion: Dict[str, dict], tipo_semilla: Optional[str]) -> dict:
+    """La semilla pedida o la más cosechada; valores por defecto si no hay historial."""
+    if tipo_semilla in conversion:
+        return conversion[tipo_semilla]
+    if conversion and not tipo_semilla:
+        return max(conversion.values(), key=lambda c: c["cosechas"])
+    return {"tipo_semilla": tipo_semilla, "ratio": RATIO_DEFECTO, "dias_ciclo": DIAS_CICLO_DEFECTO, "cosechas": 0}
+
+def load_committed(session: Session) -> List[tuple]:
+    """(fecha_siembra, tipo_semilla, peso_semilla_kg) de los ciclos en curso."""
+    return session.execute(
+        select(FVHCiclo.fecha_siembra, FVHCiclo.tipo_semilla, FVHCiclo.peso_semilla_kg)
+        .where(FVHCiclo.estado.in_([EstadoCiclo.GERMINANDO, EstadoCiclo.LISTO]))
+        .where(~select(FVHCosecha.id).where(FVHCosecha.ciclo_id == FVHCiclo.id).exists())
+    ).all()
+
+def schedule(demanda_dia: float, semilla_plan: dict, comprometido: List[tuple], conversion: Dict[str, dict],
+             today: date, horizonte: int, cada_dias: int) -> dict:
+    """Calendario de siembras vectorizado sobre el horizonte (día 0 = hoy)."""
+    demanda = np.full(horizonte, demanda_dia)
+
+    # Oferta de ciclos en curso, ubicada en su día de cosecha esperado
+    oferta = np.zeros(horizonte)
+    if comprometido:
+        ratio = np.array([conversion.get(t, semilla_plan)["ratio"] for _, t, _ in comprometido])
+        dias = np.array([conversion.get(t, semilla_plan)["dias_ciclo"] for _, t, _ in comprometido])
+        siembra = np.array([(f.date() - today).days for f, _, _ in comprometido])
+        cosecha = np.clip(np.ceil(siembra + dias).astype(np.int64), 0, None)
+        kilos = np.array([kg for _, _, kg in comprometido]) * ratio
+        dentro = cosecha < horizonte
+        np.add.at(oferta, cosecha[dentro], kilos[dentro])
+
+    # Cobertura: la oferta de un día alimenta ese día y los siguientes (el excedente se arrastra)
+    demanda_acum = np.concatenate([[0.0], np.cumsum(demanda)])
+    oferta_acum = np.concatenate([[0.0], np.cumsum(oferta)])
+
+    dias_ciclo = int(np.ceil(semilla_plan["dias_ciclo"]))
+    primera = min(dias_ciclo, horizonte)
+    # Lo que falta antes de la primera cosecha posible no se recupera con siembras nuevas
+    deficit_inicial = float(max(demanda_acum[primera] - oferta_acum[primera], 0.0))
+
+    cosechas = np.arange(dias_ciclo, horizonte, cada_dias)
+    fin = np.minimum(cosechas + cada_dias, horizonte)
+    # Pasto nuevo acumulado necesario al cierre de cada ventana. El máximo acumulado hace
+    # que un excedente de ciclos en curso se consuma antes de pedir más siembra.
+    requerido = np.maximum.accumulate(np.maximum(demanda_acum[fin] - oferta_acum[fin] - deficit_inicial, 0.0))
+    pasto = np.diff(requerido, prepend=0.0)
+    semilla = pasto / semilla_plan["ratio"]
+
+    siembras = [
+        {
+            "fecha_siembra": today + timedelta(days=int(c) - dias_ciclo),
+            "fecha_cosecha": today + timedelta(days=int(c)),
+            "kg_semilla": round(float(s), 2),
+            "kg_pasto_esperado": round(float(p), 2),
+        }
+        for c, s, p in zip(cosechas, semilla, pasto) if s > 0
+    ]
+    return {
+        "siembras": siembras,
+        "kg_semilla_total": round(float(semilla.sum()), 2),
+        "kg_pasto_comprometido": round(float(oferta.sum()), 2),
+        "deficit_antes_primera_cosecha_kg": round(deficit_inicial, 2),
+    }
+
+def build_plan(session: Session, today: Optional[date] = None, horizonte: int = HORIZON_DAYS,
+               tipo_semilla: Optional[str] = None, cada_dias: int = 1) -> dict:
+    today = today or date.today()
+    lotes = load_demand(session, today)
+    conversion = load_conversion(session)
+    semilla_plan = pick_seed(conversion, tipo_semilla)
+    comprometido = load_committed(session)
+    demanda_dia = sum(l["demanda_kg_dia"] for l in lotes)
+    return {
+        "generado_en": datetime.utcnow(),
+        "horizonte_dias": horizonte,
+        "cada_dias": cada_dias,
+        "semilla": semilla_plan,
+        "demanda_kg_dia": round(demanda_dia, 2),
+        "lotes": lotes,
+        **schedule(demanda_dia, semilla_plan, comprometido, conversion, today, horizonte, cada_dias),
+    }
+
+class PlanCache:
+    """
+    Último plan por parámetros. Se invalida al confirmar cambios en ciclos, cosechas,
+    eventos de alimentación o animales (eventos de Session), al cambiar el día o por TTL.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._plans: Dict[tuple, tuple] = {}
+
+    def get(self, key: tuple) -> Optional[dict]:
+        cached = self._plans.get(key)
+        if cached and time.monotonic() - cached[0] < CACHE_TTL_SECONDS:
+            return cached[1]
+        return None
+
+    def put(self, key: tuple, plan: dict):
+        with self._lock:
+            self._plans[key] = (time.monotonic(), plan)
+
+    def invalidate(self):
+        with self._lock:
+            self._plans.clear()
+
+plan_cache = PlanCache()
+
+def current_plan(horizonte: int = HORIZON_DAYS, tipo_semilla: Optional[str] = None, cada_dias: int = 1) -> dict:
+    """Plan cacheado o recalculado. Hace I/O: llamar fuera del event loop."""
+    key = (date.today(), horizonte, tipo_semilla, cada_dias)
+    plan = plan_cache.get(key)
+    if plan is None:
+        with Session(read_engine) as session:
+            plan = build_plan(session, key[0], horizonte, tipo_semilla, cada_dias)
+        plan_cache.put(key, plan)
+    return plan
+
+def replan():
+    """Recalcula el plan por defecto (se llama después de cada cosecha)."""
+    plan_cache.invalidate()
+    return current_plan()
+
+_PLAN_INPUTS = (FVHCiclo, FVHCosecha, EventoAlimentacion, Animal)
+_PENDING_KEY = "fvh_plan_dirty"
+
+@event.listens_for(Session, "after_flush")
+def _plan_collect_changes(session, flush_context):
+    if any(isinstance(obj, _PLAN_INPUTS) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info[_PENDING_KEY] = True
+
+@event.listens_for(Session, "after_commit")
+def _plan_invalidate(session):
+    if session.info.pop(_PENDING_KEY, False):
+        plan_cache.invalidate()
+
+@event.listens_for(Session, "after_rollback")
+def _plan_discard(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -1,34 +1,83 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
-from typing import List
+from fastapi import APIRouter, BackgroundTasks, Depends, Query, Response, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from datetime import datetime
+from typing import List, Optional
 
-from src.shared.database import get_session
-from src.greenhouse.models import FVHCiclo, FVHCicloCreate, FVHCosecha, FVHCosechaCreate
+from src.shared.database import get_async_session, get_async_read_session
+from src.shared.pagination import keyset, legacy_limit, page, MAX_PAGE_SIZE
+from src.shared.dates import naive_utc
+from src.greenhouse.models import (
+    EstadisticaSemilla, EstadisticaSemillaRead, FVHCiclo, FVHCicloCreate, FVHCosecha, FVHCosechaCreate, FVHCosechaRead,
+)
+from src.greenhouse import harvests, planner
 
 router = APIRouter(prefix="/greenhouse", tags=["GreenHouse"])
 
 @router.post("/cycles/", response_model=FVHCiclo)
-def create_cycle(cycle_data: FVHCicloCreate, session: Session = Depends(get_session)):
+async def create_cycle(cycle_data: FVHCicloCreate, session: AsyncSession = Depends(get_async_session)):
     cycle = FVHCiclo.model_validate(cycle_data)
+    cycle.fecha_siembra = naive_utc(cycle.fecha_siembra)
     session.add(cycle)
-    session.commit()
-    session.refresh(cycle)
+    await session.commit()
+    await session.refresh(cycle)
     return cycle
 
 @router.get("/cycles/", response_model=List[FVHCiclo])
-def read_cycles(skip: int = 0, limit: int = 100, session: Session = Depends(get_session)):
-    cycles = session.exec(select(FVHCiclo).offset(skip).limit(limit)).all()
-    return cycles
+async def read_cycles(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, description=f"Máximo {MAX_PAGE_SIZE} por página"),
+    skip: int = Query(0, ge=0, deprecated=True, description="Deprecado: usar cursor"),
+    session: AsyncSession = Depends(get_async_read_session),
+):
+    limit = legacy_limit(limit, skip, response)
+    cycles = (await session.exec(keyset(select(FVHCiclo), FVHCiclo.id, cursor, limit, skip=skip))).all()
+    return page(cycles, response, limit)
 
 @router.post("/harvests/", response_model=FVHCosecha)
-def create_harvest(harvest_data: FVHCosechaCreate, session: Session = Depends(get_session)):
+async def create_harvest(harvest_data: FVHCosechaCreate, background_tasks: BackgroundTasks, session: AsyncSession = Depends(get_async_session)):
     # Validate cycle exists
-    cycle = session.get(FVHCiclo, harvest_data.ciclo_id)
+    cycle = await session.get(FVHCiclo, harvest_data.ciclo_id)
     if not cycle:
         raise HTTPException(status_code=404, detail="FVH Cycle not found")
         
     harvest = FVHCosecha.model_validate(harvest_data)
+    harvest.fecha_cosecha = naive_utc(harvest.fecha_cosecha) # fecha_siembra viene naive de la base
+    harvest.ratio_conversion = harvests.conversion_ratio(harvest.peso_final_pasto_kg, cycle.peso_semilla_kg)
     session.add(harvest)
-    session.commit()
-    session.refresh(harvest)
+    await session.execute(harvests.accumulate_seed_stats, [harvests.seed_stats_delta(cycle, harvest)])
+    await session.commit()
+    await session.refresh(harvest)
+    # Con el nuevo ratio y el ciclo cerrado se recalcula el plan de siembras fuera del request
+    background_tasks.add_task(planner.replan)
     return harvest
+
+@router.get("/harvests/", response_model=List[FVHCosechaRead])
+async def read_harvests(
+    response: Response,
+    tipo_semilla: Optional[str] = None,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    session: AsyncSession = Depends(get_async_read_session),
+):
+    statement = keyset(harvests.harvest_list_statement(tipo_semilla, desde, hasta), FVHCosecha.id, cursor, limit)
+    rows = (await session.exec(statement)).all()
+    return page([FVHCosechaRead(**harvests.harvest_read(h, c)) for h, c in rows], response, limit)
+
+@router.get("/harvests/stats", response_model=List[EstadisticaSemillaRead])
+async def read_seed_stats(session: AsyncSession = Depends(get_async_read_session)):
+    stats = (await session.exec(select(EstadisticaSemilla).order_by(EstadisticaSemilla.tipo_semilla))).all()
+    return [harvests.seed_stats_read(s) for s in stats]
+
+@router.get("/plan")
+async def read_sowing_plan(
+    horizonte_dias: int = Query(planner.HORIZON_DAYS, ge=7, le=planner.MAX_HORIZON_DAYS),
+    tipo_semilla: Optional[str] = None,
+    cada_dias: int = Query(1, ge=1, le=30),
+):
+    """Calendario de siembras y kg de semilla para cubrir la demanda de FVH de los lotes."""
+    return await run_in_threadpool(planner.current_plan, horizonte_dias, tipo_semilla, cada_dias)
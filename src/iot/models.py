@@ -0,0 +1,31 @@
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import Index
+from sqlmodel import SQLModel, Field
+
+class AlertaIoTBase(SQLModel):
+    sensor_id: str = Field(min_length=1)
+    tipo_alerta: str = Field(min_length=1)  # Ej: "TEMPERATURA_ALTA"
+    valor: float
+    mensaje: str
+    fecha: Optional[datetime] = None        # Hora del evento en el sensor; sin dato se usa la de llegada
+
+class AlertaIoT(AlertaIoTBase, table=True):
+    """
+    Alerta enviada por un sensor (cámaras de frío, invernadero). Los índices cubren las
+    consultas de historial: por sensor, por tipo y por rango de fechas.
+    """
+    __table_args__ = (
+        Index("ix_alertaiot_sensor_fecha", "sensor_id", "fecha"),
+        Index("ix_alertaiot_tipo_fecha", "tipo_alerta", "fecha"),
+        Index("ix_alertaiot_fecha", "fecha"),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+    recibida_en: datetime = Field(default_factory=datetime.utcnow)
+
+class AlertaIoTCreate(AlertaIoTBase):
+    pass
+
+class LoteAlertasIoT(SQLModel):
+    alertas: List[AlertaIoTCreate] = Field(..., min_length=1, max_length=5_000)
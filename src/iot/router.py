@@ -0,0 +1,62 @@
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.shared.database import get_async_read_session
+from src.shared.pagination import keyset, page, MAX_PAGE_SIZE
+from src.iot.models import AlertaIoT, AlertaIoTCreate, LoteAlertasIoT
+from src.iot.writer import QueueFull, alert_writer
+
+router = APIRouter(prefix="/api/alertas", tags=["IoT"])
+
+RETRY_AFTER_SECONDS = 1
+
+def _rows(alertas: List[AlertaIoTCreate]) -> List[dict]:
+    ahora = datetime.utcnow()
+    return [{**a.model_dump(), "fecha": a.fecha or ahora, "recibida_en": ahora} for a in alertas]
+
+async def _persist(alertas: List[AlertaIoTCreate]) -> int:
+    try:
+        return await alert_writer.write(_rows(alertas))
+    except QueueFull:
+        raise HTTPException(
+            status_code=429,
+            detail="Alert queue is full, retry later",
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+        )
+
+@router.post("/")
+async def recibir_alerta(alerta: AlertaIoTCreate):
+    await _persist([alerta])
+    return {"status": "recibido", "alerta": alerta.tipo_alerta}
+
+@router.post("/batch")
+async def recibir_alertas(lote: LoteAlertasIoT):
+    """Lote de alertas de un gateway: se confirman juntas en la transacción del grupo."""
+    return {"status": "recibido", "recibidas": await _persist(lote.alertas)}
+
+@router.get("/", response_model=List[AlertaIoT])
+async def read_alertas(
+    response: Response,
+    sensor_id: Optional[str] = None,
+    tipo_alerta: Optional[str] = None,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    session: AsyncSession = Depends(get_async_read_session),
+):
+    statement = select(AlertaIoT)
+    if sensor_id:
+        statement = statement.where(AlertaIoT.sensor_id == sensor_id)
+    if tipo_alerta:
+        statement = statement.where(AlertaIoT.tipo_alerta == tipo_alerta)
+    if desde:
+        statement = statement.where(AlertaIoT.fecha >= desde)
+    if hasta:
+        statement = statement.where(AlertaIoT.fecha < hasta)
+    alertas = (await session.exec(keyset(statement, AlertaIoT.id, cursor, limit))).all()
+    return page(alertas, response, limit)
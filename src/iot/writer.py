@@ -0,0 +1,102 @@
+import asyncio
+import os
+from typing import List, Optional
+
+from sqlalchemy import insert
+
+from src.shared.database import async_engine
+from src.iot.models import AlertaIoT
+from src.core.events import event_bus, event_rows
+from src.core.models import Evento
+
+# --- Escritor de alertas IoT con group commit ---
+# Los endpoints no escriben en la base: encolan sus filas y esperan la confirmación.
+# Una única tarea toma todo lo encolado (hasta GROUP_MAX_ROWS filas) y lo inserta en una
+# sola transacción; mientras ese commit está en curso se junta el grupo siguiente. Con
+# una ráfaga de sensores, miles de alertas cuestan unos pocos commits en vez de uno por
+# request, y el escritor único evita peleas por el lock de escritura de SQLite.
+# Si la cola supera QUEUE_MAX_ROWS filas, submit() falla y el endpoint responde 429.
+
+QUEUE_MAX_ROWS = int(os.getenv("IOT_QUEUE_MAX_ROWS", "50000"))
+GROUP_MAX_ROWS = 5_000
+
+class QueueFull(Exception):
+    pass
+
+class AlertWriter:
+    def __init__(self, max_rows: int = QUEUE_MAX_ROWS):
+        self.max_rows = max_rows
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pending = 0 # Filas encoladas o en el commit en curso
+        self._closing = False
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def start(self):
+        self._closing = False
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Deja de aceptar filas, confirma lo encolado y termina la tarea."""
+        if self._task is None:
+            return
+        # Desde acá submit() rechaza: nada entra después de que join() vacíe la cola
+        self._closing = True
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def submit(self, rows: List[dict]) -> asyncio.Future:
+        """Encola filas de AlertaIoT. Retorna un Future que se resuelve al confirmarse la transacción."""
+        if self._task is None or self._closing or self._pending + len(rows) > self.max_rows:
+            raise QueueFull()
+        future = asyncio.get_running_loop().create_future()
+        self._pending += len(rows)
+        self._queue.put_nowait((rows, future))
+        return future
+
+    async def write(self, rows: List[dict]) -> int:
+        await self.submit(rows)
+        return len(rows)
+
+    async def _run(self):
+        while True:
+            grupo = [await self._queue.get()]
+            filas = len(grupo[0][0])
+            while filas < GROUP_MAX_ROWS and not self._queue.empty():
+                entrada = self._queue.get_nowait()
+                grupo.append(entrada)
+                filas += len(entrada[0])
+            try:
+                await self._commit(grupo)
+            finally:
+                for _ in grupo:
+                    self._queue.task_done()
+
+    async def _commit(self, grupo: List[tuple]):
+        rows = [row for filas, _ in grupo for row in filas]
+        try:
+            async with async_engine.begin() as conn:
+                await conn.execute(insert(AlertaIoT.__table__), rows)
+                await conn.execute(insert(Evento.__table__), event_rows("alertas_iot", rows))
+        except Exception as e:
+            for _, future in grupo:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for filas, future in grupo:
+                if not future.done(): # El cliente pudo haberse desconectado
+                    future.set_result(len(filas))
+            event_bus.notify()
+        finally:
+            self._pending -= len(rows)
+
+alert_writer = AlertWriter()
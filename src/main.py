@@ -1,29 +1,92 @@
 from contextlib import asynccontextmanager
+from apscheduler.triggers.interval import IntervalTrigger
 from fastapi import FastAPI
-from pydantic import BaseModel
+from sqlmodel import Session
 
 
-from src.shared.database import create_db_and_tables
+from src.shared.database import create_db_and_tables, dispose_async_engines, engine, read_engine
 # Import models to register them with SQLModel metadata
 from src.greenhouse import models as greenhouse_models
 from src.ovine_manager import models as ovine_models
 from src.cheese_factory import models as cheese_models
 from src.finance import models as finance_models
+from src.core import models as core_models
+from src.iot import models as iot_models
+from src.maintenance import models as maintenance_models
+from src.quality_control import models as quality_models
 
 from src.greenhouse.router import router as greenhouse_router
 from src.ovine_manager.router import router as ovine_manager_router
 from src.cheese_factory.router import router as cheese_factory_router
 from src.finance.router import router as finance_router
+from src.telemetry.router import router as telemetry_router
+from src.iot.router import router as iot_router
+from src.core.router import router as events_router, jobs_router
+from src.maintenance.api import router as maintenance_router
+from src.quality_control.router import router as quality_router
 
-from src.maintenance.scheduler import start_scheduler
+from src.ovine_manager.rfid_index import rfid_index
+from src.ovine_manager import rfid_sync # Registra la invalidación del índice RFID entre workers
+from src.ovine_manager.kpis import ensure_flock_counters
+from src.ovine_manager import growth
+from src.finance.ledger import ensure_ledger
+from src.greenhouse.harvests import ensure_seed_stats
+from src.maintenance.cleaning import ensure_last_cleaning
+from src.telemetry.storage import apply_retention, create_telemetry_tables
+from src.maintenance.scheduler import start_scheduler, on_leader_elected, on_leader_demoted
+from src.core.jobs import recorded, scheduler_elector
+from src.core.notifications import dispatcher
+from src.core.events import event_bus, purge_events
+from src.iot.writer import alert_writer
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     create_db_and_tables()
+    create_telemetry_tables()
+    with Session(engine) as session:
+        ensure_flock_counters(session)
+        ensure_ledger(session)
+        ensure_seed_stats(session)
+        ensure_last_cleaning(session)
     scheduler = start_scheduler()
+    scheduler.add_job(
+        recorded("telemetry_retention", apply_retention, 3600),
+        trigger=IntervalTrigger(hours=1),
+        id="telemetry_retention",
+        name="Sellar cabezas inactivas y aplicar retención de telemetría",
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        recorded("events_purge", purge_events, 3600),
+        trigger=IntervalTrigger(hours=1),
+        id="events_purge",
+        name="Purgar eventos del canal en vivo",
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        growth.refresh_if_stale,
+        trigger=IntervalTrigger(seconds=growth.REFRESH_SECONDS),
+        args=[engine],
+        id="growth_alerts",
+        name="Recalcular alertas de crecimiento si hubo pesadas nuevas",
+        replace_existing=True,
+    )
+    await event_bus.start()
+    # Después de start(): un cambio confirmado mientras carga llega igual como invalidación
+    with Session(read_engine) as session:
+        rfid_index.load(session)
+    # Los jobs corren solo en el worker que tenga el lease (los demás quedan en pausa)
+    scheduler_elector.start(on_elected=on_leader_elected, on_demoted=on_leader_demoted)
+    dispatcher.start()
+    alert_writer.start()
     yield
+    scheduler_elector.stop()
     scheduler.shutdown()
+    await alert_writer.stop()
+    await dispatcher.stop()
+    await event_bus.stop()
+    await dispose_async_engines()
 
 app = FastAPI(title="OvineTech ERP", lifespan=lifespan)
 
@@ -31,22 +94,14 @@ app.include_router(greenhouse_router)
 app.include_router(ovine_manager_router)
 app.include_router(cheese_factory_router)
 app.include_router(finance_router)
+app.include_router(telemetry_router)
+app.include_router(iot_router)
+app.include_router(events_router)
+app.include_router(jobs_router)
+app.include_router(maintenance_router)
+app.include_router(quality_router)
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to OvineTech ERP"}
 
-
-# 1. Definimos la estructura del mensaje de Alerta
-class AlertaIoT(BaseModel):
-    sensor_id: str
-    tipo_alerta: str  # Ej: "TEMPERATURA_ALTA"
-    valor: float
-    mensaje: str
-
-# 2. Creamos el Endpoint (El Buzón de Entrada)
-@app.post("/api/alertas/")
-def recibir_alerta(alerta: AlertaIoT):
-    print(f"🚨 [ALERTA RECIBIDA] {alerta.tipo_alerta}: {alerta.mensaje} (Valor: {alerta.valor})")
-    # Aquí en el futuro guardaremos en la base de datos
-    return {"status": "recibido", "alerta": alerta.tipo_alerta}
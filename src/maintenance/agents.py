@@ -1,18 +1,25 @@
 from datetime import datetime, timedelta
-from typing import List
-from .models import Equipment, CleaningLog
+from typing import Dict, List, Optional, Set
 
+from sqlalchemy import or_
+from sqlmodel import Session, select
+
+from src.core.notifications import queue_alert
+from src.shared.dates import naive_local
+from .models import Equipment, CleaningLog, LastCleaning
+from .cleaning import apply_cleaning, insert_cleaning_logs
+
+ALERT_HOURS = 12 # Regla de alerta del escaneo: horas sin limpieza
 
 class MaintenanceAgent:
-    def __init__(self, db_connection):
-        self.db = db_connection # Simulación de conexión a base de datos
+    def __init__(self, session: Session):
+        self.session = session
 
-    def _get_last_log(self, equipment_id: str) -> Optional[CleaningLog]:
-        # Aquí harías la query real a tu DB ordenando por fecha desc
-        # Retorno simulado para el ejemplo:
-        return self.db.get_last_log_for(equipment_id)
+    def _get_last_log(self, equipment_id: str) -> Optional[LastCleaning]:
+        # Una lectura por clave primaria sobre la tabla materializada
+        return self.session.get(LastCleaning, equipment_id)
 
-    def validate_equipment_readiness(self, equipment: Equipment) -> dict:
+    def validate_equipment_readiness(self, equipment: Equipment, now: Optional[datetime] = None) -> dict:
         """
         Verifica si un equipo está apto para entrar en producción.
         Retorna un diccionario con status y motivo.
@@ -32,14 +39,14 @@ class MaintenanceAgent:
             }
 
         # 3. Verificar calidad de la limpieza
-        if not last_log.is_successful():
+        if not last_log.successful:
              return {
                 "ready": False, 
                 "reason": "La última limpieza falló (pH incorrecto o inspección visual rechazada)."
             }
 
         # 4. Verificar la "Ventana de Esterilidad" (Tiempo)
-        time_elapsed = datetime.now() - last_log.timestamp
+        time_elapsed = (now or datetime.now()) - last_log.timestamp
         if time_elapsed > timedelta(hours=equipment.max_sterile_hours):
             return {
                 "ready": False, 
@@ -52,40 +59,68 @@ class MaintenanceAgent:
             "reason": f"OK. Limpio hace {str(time_elapsed).split('.')[0]} horas."
         }
 
-    def register_cleaning(self, log: CleaningLog):
-        # Guardar en DB y disparar alertas si falló
+    def register_cleaning(self, log: CleaningLog, equipment: Equipment):
+        """
+        Guarda el log y actualiza la última limpieza del equipo. No confirma: la
+        transacción es de quien llama (un log suelto o un lote completo).
+        """
         print(f"[{log.timestamp}] Registrando limpieza para {log.equipment_id}...")
+        self.session.add(log)
+        apply_cleaning(self.session, log, equipment)
         if not log.is_successful():
             print(" ALERTA: Intento de limpieza fallido registrado.")
-        self.db.save(log)
+            queue_alert(self.session, f"Limpieza fallida en {equipment.name} ({log.cleaning_type.value}, por {log.performed_by}).")
+
+    def register_cleanings(self, logs: List[CleaningLog], equipment: Dict[str, Equipment]) -> Set[str]:
+        """
+        Registra un lote de logs (buffer offline de un controlador CIP). Los ids ya
+        registrados se ignoran; la última limpieza se actualiza una vez por equipo, con el
+        log más nuevo del lote. No confirma. Retorna los ids insertados.
+        """
+        # Un buffer offline puede mezclar fechas con y sin zona ("...Z" y naive); los que no
+        # vienen de CleaningLogCreate (que ya las normaliza) se llevan a hora local acá
+        for log in logs:
+            log.timestamp = naive_local(log.timestamp)
+        nuevos = insert_cleaning_logs(self.session, logs)
+        ultimo: Dict[str, CleaningLog] = {}
+        for log in logs:
+            if log.id not in nuevos:
+                continue
+            if log.equipment_id not in ultimo or log.timestamp >= ultimo[log.equipment_id].timestamp:
+                ultimo[log.equipment_id] = log
+            if not log.is_successful():
+                eq = equipment[log.equipment_id]
+                queue_alert(self.session, f"Limpieza fallida en {eq.name} ({log.cleaning_type.value}, por {log.performed_by}).")
+        for equipment_id, log in ultimo.items():
+            apply_cleaning(self.session, log, equipment[equipment_id])
+        return nuevos
 
-    def check_critical_sanitization_status(self) -> List[str]:
+    def check_critical_sanitization_status(self, now: Optional[datetime] = None) -> List[str]:
         """
-        Escanea TODOS los equipos críticos. 
+        Escanea TODOS los equipos críticos en una sola consulta.
         Retorna una lista de alertas si alguno excedió su ventana de limpieza.
         """
+        now = now or datetime.now()
         alerts = []
-        # Imaginemos que obtenemos todos los equipos que requieren sanitización
-        critical_equipment = self.db.get_all_equipment(requires_sanitization=True)
+        critical_equipment = self.session.exec(
+            select(Equipment.name, LastCleaning.timestamp)
+            .outerjoin(LastCleaning, LastCleaning.equipment_id == Equipment.id)
+            .where(Equipment.requires_sanitization == True)
+            .where(or_(LastCleaning.timestamp == None, LastCleaning.timestamp < now - timedelta(hours=ALERT_HOURS)))
+            .order_by(Equipment.name)
+        ).all()
 
-        for eq in critical_equipment:
-            last_log = self._get_last_log(eq.id)
-            
+        for name, last_timestamp in critical_equipment:
             # CASO A: Nunca se ha limpiado (y ya debería estar operativo)
-            if not last_log:
-                alerts.append(f"URGENTE: {eq.name} nunca ha registrado limpieza.")
+            if last_timestamp is None:
+                alerts.append(f"URGENTE: {name} nunca ha registrado limpieza.")
                 continue
 
             # CASO B: Se limpió, pero hace demasiado tiempo (Regla de las 12 horas)
-            # Nota: Podrías usar eq.max_sterile_hours, o una regla fija de 12h para alertas
-            hours_since_cleaning = (datetime.now() - last_log.timestamp).total_seconds() / 3600
-            
-            # Umbral de alerta: Si pasaron 12 horas desde la última limpieza
-            if hours_since_cleaning > 12:
-                alerts.append(
-                    f"ALERTA SANITARIA: {eq.name} lleva {int(hours_since_cleaning)} horas sin limpieza. "
-                    f"Riesgo de contaminación bacteriana."
-                )
+            hours_since_cleaning = (now - last_timestamp).total_seconds() / 3600
+            alerts.append(
+                f"ALERTA SANITARIA: {name} lleva {int(hours_since_cleaning)} horas sin limpieza. "
+                f"Riesgo de contaminación bacteriana."
+            )
         
         return alerts
-        
\ No newline at end of file
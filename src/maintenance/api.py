@@ -1,20 +1,137 @@
-from fastapi import APIRouter, Depends
-from .models import CleaningLog
+import json
+from typing import Any, Dict, List
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from pydantic import ValidationError
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.shared.database import get_async_session, get_async_read_session
+from .models import CleaningLog, CleaningLogCreate, Equipment, EquipmentCreate
 from .agents import MaintenanceAgent
+from .cleaning import refresh_expiry
+
+router = APIRouter(prefix="/maintenance", tags=["Maintenance"])
+
+MAX_BATCH = 5_000
 
-router = APIRouter()
+def _parse_batch(body: bytes, content_type: str) -> List[Any]:
+    """Arreglo JSON o NDJSON (un log por línea). Las líneas NDJSON ilegibles quedan como error del ítem."""
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        items = []
+        for line in body.decode("utf-8").splitlines():
+            if line.strip():
+                try:
+                    items.append(json.loads(line))
+                except ValueError as e:
+                    items.append(e)
+        return items
+    try:
+        items = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Body must be a JSON array or NDJSON")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=422, detail="Body must be a JSON array or NDJSON")
+    return items
 
-# Dependencia para obtener el agente (simplificado)
-def get_maintenance_agent():
-    # Aquí inyectarías tu conexión real a DB
-    return MaintenanceAgent(db_connection=MockDB()) 
+@router.post("/equipment", response_model=Equipment)
+async def upsert_equipment(equipment_data: EquipmentCreate, session: AsyncSession = Depends(get_async_session)):
+    equipment = await session.get(Equipment, equipment_data.id)
+    if equipment is None:
+        equipment = Equipment.model_validate(equipment_data)
+    else:
+        equipment.sqlmodel_update(equipment_data.model_dump())
+    session.add(equipment)
+    await session.run_sync(lambda s: refresh_expiry(s, equipment))
+    await session.commit()
+    await session.refresh(equipment)
+    return equipment
+
+@router.get("/equipment", response_model=List[Equipment])
+async def read_equipment(session: AsyncSession = Depends(get_async_read_session)):
+    return (await session.exec(select(Equipment).order_by(Equipment.id))).all()
+
+@router.get("/equipment/{equipment_id}/readiness")
+async def read_readiness(equipment_id: str, session: AsyncSession = Depends(get_async_read_session)):
+    equipment = await session.get(Equipment, equipment_id)
+    if not equipment:
+        raise HTTPException(status_code=404, detail="Equipment not found")
+    return await session.run_sync(lambda s: MaintenanceAgent(s).validate_equipment_readiness(equipment))
+
+@router.get("/status")
+async def read_sanitization_status(session: AsyncSession = Depends(get_async_read_session)):
+    alerts = await session.run_sync(lambda s: MaintenanceAgent(s).check_critical_sanitization_status())
+    return {"ok": not alerts, "alerts": alerts}
 
 @router.post("/logs")
-def create_cleaning_log(log_data: CleaningLog, agent: MaintenanceAgent = Depends(get_maintenance_agent)):
+async def create_cleaning_log(log_data: CleaningLogCreate, session: AsyncSession = Depends(get_async_session)):
     """
     Este endpoint recibe el JSON de la Raspberry Pi.
     """
-    # 1. El Agente valida y registra
-    agent.register_cleaning(log_data)
-    
-    return {"status": "success", "message": "Limpieza registrada correctamente"}
\ No newline at end of file
+    equipment = await session.get(Equipment, log_data.equipment_id)
+    if not equipment:
+        raise HTTPException(status_code=404, detail="Equipment not found")
+    if await session.get(CleaningLog, log_data.id):
+        return {"status": "duplicate", "message": "Limpieza ya registrada"}
+
+    # 1. El Agente valida y registra (log + última limpieza en la misma transacción)
+    log = CleaningLog.model_validate(log_data)
+    await session.run_sync(lambda s: MaintenanceAgent(s).register_cleaning(log, equipment))
+    await session.commit()
+
+    return {"status": "success", "message": "Limpieza registrada correctamente", "successful": log.is_successful()}
+
+@router.post("/logs/batch")
+async def create_cleaning_logs(request: Request, session: AsyncSession = Depends(get_async_session)) -> Dict[str, Any]:
+    """
+    Lote de logs que un controlador CIP acumuló sin conexión (arreglo JSON o NDJSON).
+    Todo se escribe en una transacción; los ids ya registrados se informan como duplicados,
+    así reenviar el mismo buffer tras un corte es seguro. Retorna el estado de cada ítem.
+    """
+    items = _parse_batch(await request.body(), request.headers.get("content-type", ""))
+    if len(items) > MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {MAX_BATCH} logs)")
+
+    resultados: List[dict] = []
+    validos: List[tuple] = [] # (índice, log)
+    vistos = set()
+    for i, item in enumerate(items):
+        try:
+            if isinstance(item, Exception):
+                raise item
+            log = CleaningLog.model_validate(CleaningLogCreate.model_validate(item))
+        except (ValidationError, ValueError) as e:
+            resultados.append({"index": i, "id": item.get("id") if isinstance(item, dict) else None, "status": "error", "detail": str(e)})
+            continue
+        if log.id in vistos:
+            resultados.append({"index": i, "id": log.id, "status": "duplicate"})
+            continue
+        vistos.add(log.id)
+        resultados.append({"index": i, "id": log.id, "status": None})
+        validos.append((i, log))
+
+    equipment = {}
+    ids = {log.equipment_id for _, log in validos}
+    if ids:
+        equipment = {eq.id: eq for eq in (await session.exec(select(Equipment).where(Equipment.id.in_(ids)))).all()}
+    registrables = []
+    for i, log in validos:
+        if log.equipment_id in equipment:
+            registrables.append(log)
+        else:
+            resultados[i].update(status="error", detail="Equipment not found")
+
+    nuevos = set()
+    if registrables:
+        nuevos = await session.run_sync(lambda s: MaintenanceAgent(s).register_cleanings(registrables, equipment))
+        await session.commit()
+    for i, log in validos:
+        if resultados[i]["status"] is None:
+            resultados[i]["status"] = "created" if log.id in nuevos else "duplicate"
+            resultados[i]["successful"] = log.is_successful()
+
+    conteo = {"created": 0, "duplicate": 0, "error": 0}
+    for r in resultados:
+        conteo[r["status"]] += 1
+    return {"received": len(items), "created": conteo["created"], "duplicates": conteo["duplicate"],
+            "errors": conteo["error"], "items": resultados}
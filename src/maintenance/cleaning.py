@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta
+from typing import List, Set
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from .models import CleaningLog, Equipment, LastCleaning
+
+# Última limpieza por equipo: cada CleaningLog hace upsert sobre LastCleaning en su misma
+# transacción. El upsert solo avanza si el log es más nuevo que el guardado, así los logs
+# que un controlador CIP reenvía fuera de orden (buffer offline) no pisan uno posterior.
+# Cada cambio efectivo deja su vencimiento en session.info[DEADLINES_KEY]; al confirmarse,
+# maintenance/scheduler.py reprograma la alerta de vencimiento de ese equipo. Un equipo
+# crítico sin limpiezas vence a max_sterile_hours de su alta (log_id None).
+
+DEADLINES_KEY = "sanitation_deadlines"
+
+def expiry(timestamp: datetime, max_sterile_hours: int) -> datetime:
+    return timestamp + timedelta(hours=max_sterile_hours)
+
+def _upsert_statement():
+    table = LastCleaning.__table__
+    stmt = sqlite_insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.equipment_id],
+        set_={c: stmt.excluded[c] for c in ("log_id", "timestamp", "successful", "expires_at")},
+        where=stmt.excluded.timestamp >= table.c.timestamp,
+    ).returning(table.c.equipment_id, table.c.log_id, table.c.successful, table.c.expires_at)
+
+upsert_last_cleaning = _upsert_statement()
+
+INSERT_CHUNK = 500 # Filas por INSERT multi-VALUES (9 columnas, lejos del límite de parámetros de SQLite)
+
+def insert_cleaning_logs(session: Session, logs: List[CleaningLog]) -> Set[str]:
+    """Inserta logs ignorando ids ya registrados (reenvíos del dispositivo). Retorna los ids nuevos."""
+    table = CleaningLog.__table__
+    nuevos = set()
+    for start in range(0, len(logs), INSERT_CHUNK):
+        rows = [log.model_dump() for log in logs[start:start + INSERT_CHUNK]]
+        nuevos.update(session.execute(
+            sqlite_insert(table).values(rows).on_conflict_do_nothing(index_elements=[table.c.id]).returning(table.c.id)
+        ).scalars())
+    return nuevos
+
+def last_cleaning_row(log: CleaningLog, equipment: Equipment) -> dict:
+    return {
+        "equipment_id": log.equipment_id,
+        "log_id": log.id,
+        "timestamp": log.timestamp,
+        "successful": log.is_successful(),
+        "expires_at": expiry(log.timestamp, equipment.max_sterile_hours),
+    }
+
+def note_deadline(session: Session, equipment_id: str, log_id: str, successful: bool, expires_at: datetime):
+    """Vencimiento a programar cuando se confirme la transacción (solo limpiezas exitosas)."""
+    if successful:
+        session.info.setdefault(DEADLINES_KEY, []).append((equipment_id, log_id, expires_at))
+
+def apply_cleaning(session: Session, log: CleaningLog, equipment: Equipment) -> bool:
+    """Upsert de la última limpieza. True si el log pasó a ser la última del equipo."""
+    row = session.execute(upsert_last_cleaning.values(last_cleaning_row(log, equipment))).first()
+    if row is not None and equipment.requires_sanitization:
+        note_deadline(session, *row)
+    return row is not None
+
+def first_deadline(equipment: Equipment):
+    """Vencimiento de un equipo que nunca registró limpieza (None si es un alta anterior sin fecha)."""
+    if equipment.created_at is None:
+        return None
+    return expiry(equipment.created_at, equipment.max_sterile_hours)
+
+def refresh_expiry(session: Session, equipment: Equipment):
+    """
+    Al dar de alta o modificar un equipo: recalcula el vencimiento guardado si cambió
+    max_sterile_hours, o programa el primero si todavía no tiene limpiezas.
+    """
+    last = session.get(LastCleaning, equipment.id)
+    if last is None:
+        deadline = first_deadline(equipment)
+        if deadline is not None and equipment.requires_sanitization:
+            session.info.setdefault(DEADLINES_KEY, []).append((equipment.id, None, deadline))
+    else:
+        last.expires_at = expiry(last.timestamp, equipment.max_sterile_hours)
+        session.add(last)
+        if equipment.requires_sanitization:
+            note_deadline(session, last.equipment_id, last.log_id, last.successful, last.expires_at)
+
+def rebuild_last_cleaning(session: Session):
+    """Recalcula LastCleaning desde el historial completo de CleaningLog."""
+    session.execute(delete(LastCleaning))
+    orden = func.row_number().over(partition_by=CleaningLog.equipment_id, order_by=CleaningLog.timestamp.desc()).label("orden")
+    ranked = select(CleaningLog.id, orden).subquery()
+    ultimos = session.execute(
+        select(CleaningLog, Equipment)
+        .join(ranked, ranked.c.id == CleaningLog.id)
+        .join(Equipment, Equipment.id == CleaningLog.equipment_id)
+        .where(ranked.c.orden == 1)
+    ).all()
+    if ultimos:
+        session.execute(LastCleaning.__table__.insert(), [last_cleaning_row(log, eq) for log, eq in ultimos])
+
+def ensure_last_cleaning(session: Session):
+    """Al arrancar: reconstruye si falta algún equipo con limpiezas registradas."""
+    counted = session.scalar(select(func.count()).select_from(LastCleaning))
+    total = session.scalar(select(func.count(func.distinct(CleaningLog.equipment_id))))
+    if counted != total:
+        rebuild_last_cleaning(session)
+        session.commit()
@@ -1,33 +1,43 @@
 from datetime import datetime, timedelta
 from typing import Optional, List
 from enum import Enum
-from pydantic import BaseModel, Field
+from pydantic import field_validator
+from sqlalchemy import JSON, Column, Index
+from sqlmodel import SQLModel, Field
 import uuid
 
+from src.shared.dates import naive_local
+
 # Tipos de limpieza para estandarizar
 class CleaningType(str, Enum):
     CIP = "CIP_AUTOMATICO"      # Clean In Place (Sistemas de tuberías/bombas)
     MANUAL = "MANUAL_PROFUNDO"  # Desarme y cepillado (Válvulas, moldes)
     RINSING = "ENJUAGUE"        # Solo agua (entre lotes rápidos)
 
-# Modelo del Equipo (Simplificado para este contexto)
-class Equipment(BaseModel):
-    id: str
+# Modelo del Equipo
+class EquipmentBase(SQLModel):
     name: str
     requires_sanitization: bool = True # Si toca leche/queso, es True. Si es un motor, False.
     max_sterile_hours: int = 4  # Tiempo máx que aguanta limpio sin usar (Regla sanitaria)
 
+class Equipment(EquipmentBase, table=True):
+    id: str = Field(primary_key=True)
+    # Sin limpiezas, el primer vencimiento cuenta desde el alta (ver cleaning.refresh_expiry)
+    created_at: Optional[datetime] = Field(default_factory=datetime.now)
+
+class EquipmentCreate(EquipmentBase):
+    id: str = Field(min_length=1)
+
 # El Log de Limpieza (La evidencia)
-class CleaningLog(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    equipment_id: str
+class CleaningLogBase(SQLModel):
+    equipment_id: str = Field(foreign_key="equipment.id")
     timestamp: datetime = Field(default_factory=datetime.now)
     performed_by: str  # ID del usuario o "SYSTEM_AUTO"
     cleaning_type: CleaningType
-    chemicals_used: List[str]  # Ej: ["Cloro", "Ácido Peracético"]
+    chemicals_used: List[str] = Field(sa_column=Column(JSON, nullable=False))  # Ej: ["Cloro", "Ácido Peracético"]
     ph_check: Optional[float] = None  # Dato de sensor (crítico para CIP)
     visual_check_passed: bool = True  # Verificación humana o por cámara
-    
+
     # Propiedad calculada para saber si el log es válido sanitariamente
     def is_successful(self) -> bool:
         # Lógica: Debe pasar inspección visual y, si hay pH, estar en rango seguro
@@ -36,4 +46,31 @@ class CleaningLog(BaseModel):
         if self.ph_check is not None and (self.ph_check < 6.0 or self.ph_check > 8.0):
              # Ejemplo: Si quedó ácido residual, falla.
             return False
-        return True
\ No newline at end of file
+        return True
+
+class CleaningLog(CleaningLogBase, table=True):
+    __table_args__ = (Index("ix_cleaninglog_equipment_timestamp", "equipment_id", "timestamp"),)
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()), primary_key=True)
+
+class CleaningLogCreate(CleaningLogBase):
+    # Lo genera el dispositivo: un reenvío del mismo log no crea un registro nuevo
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+
+    @field_validator("timestamp")
+    @classmethod
+    def _timestamp_local(cls, value: datetime) -> datetime:
+        # La Raspberry Pi puede mandar UTC ("...Z"): SQLite descarta la zona y el módulo
+        # compara contra datetime.now(), así que se guarda en hora local sin zona
+        return naive_local(value)
+
+# --- Última limpieza por equipo (tabla materializada) ---
+# Se actualiza con upsert en la misma transacción de cada CleaningLog (ver maintenance/cleaning.py),
+# así las verificaciones de aptitud y el escaneo del scheduler no recorren el historial.
+
+class LastCleaning(SQLModel, table=True):
+    __table_args__ = (Index("ix_lastcleaning_expires_at", "expires_at"),)
+    equipment_id: str = Field(foreign_key="equipment.id", primary_key=True)
+    log_id: str
+    timestamp: datetime = Field(index=True)
+    successful: bool
+    expires_at: datetime # timestamp + max_sterile_hours del equipo
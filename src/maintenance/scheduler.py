@@ -1,41 +1,180 @@
+from datetime import datetime
+from typing import Optional
+
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.date import DateTrigger
 from apscheduler.triggers.interval import IntervalTrigger
+from sqlalchemy import event
+from sqlmodel import Session, select
+from src.shared.database import engine
 from .agents import MaintenanceAgent
+from .cleaning import DEADLINES_KEY, first_deadline
+from .models import Equipment, LastCleaning
 from src.core.notifications import send_telegram_alert
+from src.core.events import event_bus
+from src.core.jobs import interval_slot, run_recorded
+
+# --- Vencimientos sanitarios por fecha límite ---
+# En vez de escanear todos los equipos cada hora, cada equipo con una limpieza exitosa
+# tiene un job DateTrigger (`sanitation_expiry:<equipo>`) en su `expires_at`. APScheduler
+# los guarda ordenados por próxima ejecución y duerme hasta la más cercana: la alerta sale
+# en el momento del vencimiento y entre vencimientos no se hace trabajo.
+# Los jobs se reconstruyen desde LastCleaning al arrancar y se reprograman al confirmarse
+# cada CleaningLog nuevo (o un cambio de max_sterile_hours). Al dispararse, el job verifica
+# que esa limpieza siga siendo la última: una limpieza exitosa posterior lo vuelve
+# obsoleto, una fallida no (el equipo sigue vencido). Un equipo crítico que nunca se
+# limpió tiene su job en created_at + max_sterile_hours.
+# Con varios workers solo el líder (core/jobs.py) corre el scheduler; los vencimientos
+# registrados en otro worker le llegan con schedule_all_expiries cada SYNC_SECONDS.
+
+SYNC_SECONDS = 60
+
+scheduler = BackgroundScheduler()
+
+def _job_id(equipment_id: str) -> str:
+    return f"sanitation_expiry:{equipment_id}"
 
 def run_sanitization_check():
     """
-    Esta función se ejecutará automáticamente en segundo plano.
+    Escaneo completo de equipos críticos. Corre una vez al arrancar (equipos nunca
+    limpiados o vencidos mientras el servidor estaba apagado).
     """
-    print("⏰ [Cron] Iniciando escaneo sanitario programado...")
-    
-    # Instanciamos el agente (aquí deberías inyectar tu conexión real a DB)
-    # db = get_db_connection()
-    agent = MaintenanceAgent(db_connection=None) # Mock por ahora
-    
-    alerts = agent.check_critical_sanitization_status()
-    
+    print("⏰ [Cron] Iniciando escaneo sanitario...")
+
+    with Session(engine) as session:
+        alerts = MaintenanceAgent(session).check_critical_sanitization_status()
+
     if alerts:
         print(f"⚠️ SE DETECTARON {len(alerts)} PROBLEMAS: ENVIANDO A TELEGRAM...")
         # Unimos todas las alertas en un solo mensaje para no saturar tu chat
         mensaje_final = "\n".join([f"• {a}" for a in alerts])
-        
+        event_bus.publish_many("saneamiento", [{"alerta": a} for a in alerts])
+
         # ¡AQUÍ ESTÁ LA MAGIA!
         send_telegram_alert(mensaje_final)
     else:
         print("✅ [Cron] Todos los equipos están dentro de parámetros sanitarios.")
 
+def notify_expiry(equipment_id: str, log_id: Optional[str], expires_at: datetime):
+    """Job de vencimiento de un equipo: una sola ejecución por (equipo, vencimiento)."""
+    run_recorded(_job_id(equipment_id), expires_at, _notify_expiry, equipment_id, log_id, expires_at)
+
+def _notify_expiry(equipment_id: str, log_id: Optional[str], expires_at: datetime):
+    """
+    Alerta si el equipo sigue sin una limpieza exitosa posterior a `log_id` (None: el
+    vencimiento desde el alta de un equipo que nunca se limpió).
+    """
+    with Session(engine) as session:
+        row = session.exec(
+            select(Equipment, LastCleaning)
+            .outerjoin(LastCleaning, LastCleaning.equipment_id == Equipment.id)
+            .where(Equipment.id == equipment_id)
+        ).first()
+    if row is None:
+        return
+    equipment, last = row
+    if not equipment.requires_sanitization:
+        return
+    if last is None:
+        if first_deadline(equipment) > datetime.now():
+            return # max_sterile_hours cambió: el job reprogramado alertará
+        alerta = f"URGENTE: {equipment.name} nunca ha registrado limpieza ({equipment.max_sterile_hours}h desde su alta)."
+    elif not last.successful:
+        # Una limpieza fallida no reemplaza el vencimiento de la exitosa anterior
+        alerta = (
+            f"ALERTA SANITARIA: {equipment.name} venció su ventana de esterilidad y la última "
+            f"limpieza ({last.timestamp:%d/%m %H:%M}) falló."
+        )
+    elif last.log_id != log_id or last.expires_at > datetime.now():
+        return # Limpieza exitosa posterior o vencimiento corrido
+    else:
+        alerta = (
+            f"ALERTA SANITARIA: {equipment.name} venció su ventana de esterilidad "
+            f"({equipment.max_sterile_hours}h desde la limpieza del {last.timestamp:%d/%m %H:%M})."
+        )
+    event_bus.publish("saneamiento", {"alerta": alerta, "equipment_id": equipment_id, "expires_at": expires_at})
+    send_telegram_alert(alerta)
+
+def schedule_expiry(equipment_id: str, log_id: Optional[str], expires_at: datetime):
+    """Programa (o reemplaza) el job de vencimiento del equipo."""
+    if not scheduler.running:
+        return
+    scheduler.add_job(
+        notify_expiry,
+        trigger=DateTrigger(run_date=expires_at),
+        args=[equipment_id, log_id, expires_at],
+        id=_job_id(equipment_id),
+        name=f"Vencimiento sanitario de {equipment_id}",
+        replace_existing=True,
+        misfire_grace_time=None, # Si el proceso estuvo ocupado, se alerta tarde pero se alerta
+    )
+
+def schedule_all_expiries() -> int:
+    """
+    Reconstruye los jobs de vencimientos futuros desde LastCleaning, y desde el alta para
+    los equipos sin limpiezas (los ya vencidos los cubre el escaneo). Los jobs que ya
+    apuntan a la misma limpieza no se tocan.
+    """
+    now = datetime.now()
+    with Session(engine) as session:
+        pendientes = session.exec(
+            select(LastCleaning.equipment_id, LastCleaning.log_id, LastCleaning.expires_at)
+            .join(Equipment, Equipment.id == LastCleaning.equipment_id)
+            .where(Equipment.requires_sanitization == True, LastCleaning.successful == True)
+            .where(LastCleaning.expires_at > now)
+        ).all()
+        sin_limpieza = session.exec(
+            select(Equipment)
+            .outerjoin(LastCleaning, LastCleaning.equipment_id == Equipment.id)
+            .where(Equipment.requires_sanitization == True, LastCleaning.equipment_id == None)
+            .where(Equipment.created_at != None)
+        ).all()
+    pendientes = list(pendientes) + [
+        (eq.id, None, first_deadline(eq)) for eq in sin_limpieza if first_deadline(eq) > now
+    ]
+    programados = 0
+    for equipment_id, log_id, expires_at in pendientes:
+        job = scheduler.get_job(_job_id(equipment_id))
+        if job is None or list(job.args) != [equipment_id, log_id, expires_at]:
+            schedule_expiry(equipment_id, log_id, expires_at)
+            programados += 1
+    return programados
+
+def run_startup_check():
+    # Una vez por hora como máximo: reinicios o cambios de líder seguidos no repiten alertas
+    run_recorded("sanitization_check", interval_slot(3600), run_sanitization_check)
+
+@event.listens_for(Session, "after_commit")
+def _schedule_committed(session):
+    for deadline in session.info.pop(DEADLINES_KEY, []):
+        schedule_expiry(*deadline)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_deadlines(session):
+    session.info.pop(DEADLINES_KEY, None)
+
 def start_scheduler():
-    scheduler = BackgroundScheduler()
-    
-    # Configurar: Ejecutar cada 1 hora
+    """Arranca el scheduler en pausa: corre recién cuando este proceso es elegido líder."""
+    scheduler.start(paused=True)
+    scheduler.add_job(
+        schedule_all_expiries,
+        trigger=IntervalTrigger(seconds=SYNC_SECONDS),
+        id='sanitation_expiry_sync',
+        name='Tomar vencimientos sanitarios registrados por otros workers',
+        replace_existing=True
+    )
+    return scheduler
+
+def on_leader_elected():
+    schedule_all_expiries()
+    # Escaneo inicial (inmediato) para lo que venció o nunca se limpió mientras no había líder
     scheduler.add_job(
-        run_sanitization_check,
-        trigger=IntervalTrigger(hours=1), # O minutes=1 para probar rápido
+        run_startup_check,
         id='sanitization_check',
         name='Revisar caducidad de limpieza en equipos críticos',
         replace_existing=True
     )
-    
-    scheduler.start()
-    return scheduler
\ No newline at end of file
+    scheduler.resume()
+
+def on_leader_demoted():
+    scheduler.pause()
@@ -0,0 +1,80 @@
+import sys
+import os
+import time
+import uuid
+import random
+import argparse
+from datetime import date
+
+# Add src to python path to allow imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+from sqlmodel import SQLModel
+
+from ovine_manager.models import Animal, Raza, Sexo, Origen, EstadoProductivo
+from ovine_manager.rfid_index import RfidIndex
+from greenhouse.models import FVHCosecha # Needed for EventoAlimentacion FK resolution
+
+# Micro-benchmark de resolución de tags RFID: SELECT por tag contra la tabla animal
+# (índice único sobre rfid_tag) vs el índice en memoria, individual y en lote.
+
+def _percentiles(samples_ns):
+    samples = sorted(samples_ns)
+    pick = lambda p: samples[min(len(samples) - 1, int(len(samples) * p))] / 1000
+    return f"p50={pick(0.50):8.2f}µs  p99={pick(0.99):8.2f}µs"
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--animals", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=20_000)
+    parser.add_argument("--batch", type=int, default=500)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite:///:memory:")
+    SQLModel.metadata.create_all(engine)
+    rows = [
+        {
+            "id": uuid.uuid4(), "rfid_tag": f"RFID-{i:07d}", "caravana_visual": f"UY-{i:07d}",
+            "raza": Raza.FRIESIAN, "fecha_nacimiento": date(2022, 1, 1), "sexo": Sexo.HEMBRA,
+            "origen": Origen.PROPIO, "estado_productivo": EstadoProductivo.LACTANCIA,
+        }
+        for i in range(args.animals)
+    ]
+    with engine.begin() as conn:
+        conn.execute(insert(Animal.__table__), rows)
+
+    index = RfidIndex()
+    with Session(engine) as session:
+        started = time.perf_counter()
+        index.load(session)
+        print(f"Index load ({len(index):,} animals): {(time.perf_counter() - started) * 1000:.1f} ms")
+
+        tags = [f"RFID-{random.randrange(args.animals):07d}" for _ in range(args.lookups)]
+
+        statement = index.select_entries()
+        samples = []
+        for tag in tags:
+            t0 = time.perf_counter_ns()
+            session.execute(statement.where(Animal.rfid_tag == tag)).one()
+            samples.append(time.perf_counter_ns() - t0)
+        print(f"SQLite SELECT per tag      : {_percentiles(samples)}")
+
+        samples = []
+        for tag in tags:
+            t0 = time.perf_counter_ns()
+            index.get(tag)
+            samples.append(time.perf_counter_ns() - t0)
+        print(f"In-memory get per tag      : {_percentiles(samples)}")
+
+        batches = [tags[i:i + args.batch] for i in range(0, len(tags), args.batch)]
+        samples = []
+        for batch in batches:
+            t0 = time.perf_counter_ns()
+            index.lookup(batch)
+            samples.append(time.perf_counter_ns() - t0)
+        print(f"In-memory lookup x{args.batch:<6}: {_percentiles(samples)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import os
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, func, insert, select
+
+from src.core.jobs import interval_slot, run_recorded
+
+from .models import AlertaCrecimiento, Animal, PesadaAnimal
+
+# Métricas de crecimiento calculadas para todo el rebaño de una vez (pandas/NumPy),
+# a partir del historial de PesadaAnimal:
+# - GDP (ganancia diaria de peso, g/día) entre la primera y la última pesada de la ventana.
+# - Desvío de la curva de crecimiento: peso actual contra la mediana del rebaño para
+#   la misma raza, sexo y edad en meses (la curva de referencia sale de los propios datos).
+
+WINDOW_DAYS = 90
+GDP_MIN_G = 50.0          # Corderos/recría por debajo de esto necesitan revisión
+EDAD_RECRIA_MESES = 12    # Hasta esta edad se espera ganancia de peso sostenida
+DESVIO_MIN_PCT = -15.0    # Más de 15% por debajo de la curva de referencia
+REFRESH_SECONDS = int(os.getenv("GROWTH_REFRESH_SECONDS", "60"))  # Cada cuánto el líder revisa si hay pesadas nuevas
+
+METRIC_COLUMNS = [
+    "animal_id", "caravana_visual", "raza", "sexo", "estado_productivo", "edad_meses",
+    "peso_actual", "pesadas", "gdp_g_dia", "peso_referencia", "desvio_curva_pct", "alerta", "motivo",
+]
+
+def load_growth_frames(connectable, window_days: int = WINDOW_DAYS, today: Optional[date] = None):
+    """Lee animales y pesadas de la ventana. `connectable` puede ser un Engine o una Connection."""
+    today = today or date.today()
+    cutoff = datetime.combine(today - timedelta(days=window_days), datetime.min.time())
+    animals = pd.read_sql(
+        select(Animal.id.label("animal_id"), Animal.caravana_visual, Animal.raza, Animal.sexo,
+               Animal.estado_productivo, Animal.fecha_nacimiento, Animal.peso_actual),
+        connectable,
+    )
+    history = pd.read_sql(
+        select(PesadaAnimal.animal_id, PesadaAnimal.fecha, PesadaAnimal.peso_kg).where(PesadaAnimal.fecha >= cutoff),
+        connectable,
+    )
+    return animals, history
+
+def growth_metrics(animals: pd.DataFrame, history: pd.DataFrame, today: Optional[date] = None) -> pd.DataFrame:
+    """Calcula GDP, desvío de curva y alertas para todos los animales. Sin bucles por animal."""
+    today = pd.Timestamp(today or date.today())
+    if animals.empty:
+        return pd.DataFrame(columns=METRIC_COLUMNS)
+
+    df = animals.copy()
+    for column in ("raza", "sexo", "estado_productivo"):
+        df[column] = df[column].map(lambda e: getattr(e, "value", e))
+    nacimiento = pd.to_datetime(df["fecha_nacimiento"])
+    df["edad_meses"] = ((today - nacimiento).dt.days / 30.44).round(1)
+
+    # GDP: (última - primera) / días, por animal
+    if history.empty:
+        df["pesadas"] = 0
+        df["gdp_g_dia"] = np.nan
+    else:
+        h = history.assign(fecha=pd.to_datetime(history["fecha"])).sort_values(["animal_id", "fecha"])
+        g = h.groupby("animal_id", sort=False)
+        stats = pd.DataFrame({
+            "pesadas": g.size(),
+            "dias": (g["fecha"].last() - g["fecha"].first()).dt.total_seconds() / 86400,
+            "delta_kg": g["peso_kg"].last() - g["peso_kg"].first(),
+        })
+        stats["gdp_g_dia"] = np.where(stats["dias"] >= 1, stats["delta_kg"] / stats["dias"].clip(lower=1) * 1000, np.nan)
+        df = df.merge(stats[["pesadas", "gdp_g_dia"]], left_on="animal_id", right_index=True, how="left")
+        df["pesadas"] = df["pesadas"].fillna(0).astype(int)
+
+    # Curva de referencia: mediana del rebaño por raza, sexo y mes de edad
+    df["_mes"] = df["edad_meses"].fillna(0).astype(int)
+    df["peso_referencia"] = df.groupby(["raza", "sexo", "_mes"])["peso_actual"].transform("median")
+    df["desvio_curva_pct"] = ((df["peso_actual"] - df["peso_referencia"]) / df["peso_referencia"] * 100).round(1)
+    df["gdp_g_dia"] = df["gdp_g_dia"].round(1)
+
+    perdiendo = df["gdp_g_dia"] < 0
+    recria_lenta = (df["edad_meses"] <= EDAD_RECRIA_MESES) & (df["gdp_g_dia"] < GDP_MIN_G)
+    bajo_curva = df["desvio_curva_pct"] < DESVIO_MIN_PCT
+    df["alerta"] = perdiendo | recria_lenta | bajo_curva
+    df["motivo"] = np.select(
+        [perdiendo, recria_lenta, bajo_curva],
+        ["Pérdida de peso", f"GDP < {GDP_MIN_G:.0f} g/día en recría", f"Más de {abs(DESVIO_MIN_PCT):.0f}% bajo la curva"],
+        default="",
+    )
+    return df[METRIC_COLUMNS]
+
+def flock_growth(connectable, window_days: int = WINDOW_DAYS, today: Optional[date] = None) -> pd.DataFrame:
+    animals, history = load_growth_frames(connectable, window_days, today)
+    return growth_metrics(animals, history, today)
+
+def refresh_growth_alerts(engine, window_days: int = WINDOW_DAYS):
+    """
+    Recalcula las métricas y reemplaza la tabla AlertaCrecimiento en una transacción.
+    La lista de atención se lee con una consulta acotada en vez de recalcular todo el
+    rebaño en cada refresco. En la app la llama refresh_if_stale, no cada pesaje.
+    """
+    df = flock_growth(engine, window_days)
+    alerts = df[df["alerta"]]
+    rows = [
+        {"animal_id": r.animal_id, "gdp_g_dia": _none(r.gdp_g_dia), "desvio_curva_pct": _none(r.desvio_curva_pct),
+         "motivo": r.motivo, "calculado_en": datetime.utcnow()}
+        for r in alerts.itertuples(index=False)
+    ]
+    with engine.begin() as conn:
+        conn.execute(delete(AlertaCrecimiento))
+        if rows:
+            conn.execute(insert(AlertaCrecimiento), rows)
+    return len(rows)
+
+# Último max(PesadaAnimal.id) recalculado por este proceso. Es la "marca de sucio": las
+# pesadas llegan por animal o en tandas chicas desde cualquier worker, y recalcular todo
+# el rebaño por cada request serían miles de DELETE + INSERT en un día de pesaje. El job
+# del líder compara la marca con la tabla y recalcula una sola vez por REFRESH_SECONDS.
+_refreshed_upto: Optional[int] = None
+
+def refresh_if_stale(engine, window_days: int = WINDOW_DAYS) -> Optional[int]:
+    """Job del líder: recalcula las alertas solo si entraron pesadas desde el último recálculo."""
+    with engine.connect() as conn:
+        upto = conn.execute(select(func.max(PesadaAnimal.id))).scalar() or 0
+    if upto == _refreshed_upto:
+        return None
+
+    def refresh():
+        global _refreshed_upto
+        count = refresh_growth_alerts(engine, window_days)
+        _refreshed_upto = upto
+        return count
+
+    # Solo se registra en JobRun cuando hay algo que recalcular
+    return run_recorded("growth_alerts", interval_slot(REFRESH_SECONDS), refresh)
+
+def _none(value):
+    return None if pd.isna(value) else float(value)
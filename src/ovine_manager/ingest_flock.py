@@ -1,8 +1,11 @@
 import sys
 import os
+import uuid
+import argparse
 import pandas as pd
 from datetime import datetime
-from sqlalchemy import create_engine, select
+from sqlalchemy import insert, select, func, literal_column
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
 from sqlmodel import SQLModel 
 from pydantic import ValidationError
@@ -12,12 +15,16 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from ovine_manager.models import Animal, Raza, Sexo, EstadoProductivo, Origen
 from ovine_manager.schemas import AnimalCreate
-from shared.database import sqlite_url, connect_args # Reusing existing config
-
-# Custom engine for this script, reusing shared config
-engine = create_engine(sqlite_url, connect_args=connect_args)
+from ovine_manager.kpis import rebuild_flock_counters # Also registers the ORM counter listener
+from greenhouse import models as greenhouse_models # EventoAlimentacion -> FVHCosecha (FK) para create_all
+from core.models import Evento # Aviso de recarga del índice RFID a los workers de la API
+from shared.database import engine # Shared write engine (WAL + pragmas)
 
 LOG_FILE = "import_errors.log"
+BATCH_SIZE = 500 # Filas por transacción en el modo bulk
+
+# Variantes aceptadas en el CSV -> valor del Enum Sexo
+SEXO_MAP = {"MACHO": Sexo.MACHO.value, "M": Sexo.MACHO.value, "HEMBRA": Sexo.HEMBRA.value, "F": Sexo.HEMBRA.value}
 
 def normalize_sexo(val):
     if not val: return None
@@ -36,6 +43,13 @@ def normalize_estado(val):
     # Map common variations if needed, or rely on Pydantic
     return str(val).strip()
 
+def publish_index_reload(session: Session):
+    """
+    Estas escrituras no pasan por los eventos de la API: cada worker recarga su índice
+    RFID al leer este evento (ver src/ovine_manager/rfid_sync.py). No confirma.
+    """
+    session.execute(insert(Evento.__table__).values(topic="rfid_index", ts=datetime.utcnow(), data={"recargar": True}))
+
 def ingest_flock(csv_path: str):
     print(f"Starting ingestion from {csv_path}...")
     
@@ -142,12 +156,246 @@ def ingest_flock(csv_path: str):
                     error_count += 1
                     session.rollback()
 
+            if success_count:
+                publish_index_reload(session)
+                session.commit()
+
     print(f"\nIngestion Complete.")
     print(f"Success: {success_count}")
     print(f"Errors: {error_count}")
     print(f"See {LOG_FILE} for details.")
 
+# --- Modo Bulk ---
+# Mismo contrato que ingest_flock (idempotencia por rfid_tag y luego caravana_visual,
+# errores por fila en import_errors.log) pero pensado para padrones de decenas de miles:
+# - Normalización vectorizada sobre columnas de pandas.
+# - Un único SELECT inicial para construir el índice de claves existentes.
+# - Escritura con INSERT ... ON CONFLICT(id) DO UPDATE en lotes de `batch_size` filas.
+
+def _unparsed(raw: pd.Series, parsed: pd.Series) -> pd.Series:
+    """Valores no vacíos que no se pudieron convertir (errors="coerce" los deja en NaN/NaT)."""
+    raw = raw.astype("string").str.strip()
+    return raw.notna() & (raw != "") & parsed.isna()
+
+def normalize_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Equivalente vectorizado de normalize_sexo/normalize_raza/normalize_estado.
+    Una fecha o un peso ilegibles no se importan como vacíos: la columna `_error` lleva el
+    mensaje y validate_frame reporta la fila, igual que el error de ingest_flock.
+    """
+    out = pd.DataFrame(index=df.index)
+    out["caravana_visual"] = df["caravana_visual"].astype("string").str.strip()
+    rfid = df["rfid_tag"].astype("string").str.strip()
+    out["rfid_tag"] = rfid.mask(rfid == "")
+    out["raza"] = df["raza"].astype("string").str.strip()
+    sexo = df["sexo"].astype("string").str.strip().str.upper()
+    out["sexo"] = sexo.map(SEXO_MAP).fillna(sexo) # Valores desconocidos quedan para que Pydantic falle
+    fecha = pd.to_datetime(df["fecha_nacimiento"], errors="coerce")
+    out["fecha_nacimiento"] = fecha.dt.date
+    peso = pd.to_numeric(df["peso_kg"], errors="coerce")
+    out["peso_actual"] = peso
+    out["estado_productivo"] = df["estado"].astype("string").str.strip()
+    out["origen"] = Origen.PROPIO.value # Defaulting for now
+    # Mismo orden que ingest_flock: la fecha se convierte antes que el peso
+    out["_error"] = None
+    peso_malo = _unparsed(df["peso_kg"], peso)
+    out.loc[peso_malo, "_error"] = "could not convert string to float: " + df.loc[peso_malo, "peso_kg"].map(repr)
+    fecha_mala = _unparsed(df["fecha_nacimiento"], fecha)
+    out.loc[fecha_mala, "_error"] = "could not parse fecha_nacimiento: " + df.loc[fecha_mala, "fecha_nacimiento"].map(repr)
+    # NaN/NaT/<NA> -> None para que la validación los trate como campos faltantes
+    return out.astype(object).where(out.notna(), None)
+
+def validate_frame(df: pd.DataFrame):
+    """
+    Valida cada fila normalizada con AnimalCreate.
+    Retorna (filas_validas, errores) donde filas_validas es una lista de (row_num, dict)
+    lista para escribir y errores son las líneas para import_errors.log.
+    """
+    valid_rows = []
+    errors = []
+    for index, data in zip(df.index, df.to_dict("records")):
+        row_num = index + 2 # Header is row 1
+        error = data.pop("_error")
+        if error:
+            errors.append(f"Row {row_num}: Processing Error - {error}")
+            continue
+        try:
+            animal_schema = AnimalCreate(**data)
+            estado = EstadoProductivo(data["estado_productivo"]) if data["estado_productivo"] else EstadoProductivo.CRECIMIENTO
+        except ValidationError as ve:
+            errors.append(f"Row {row_num}: Validation Error - {ve}")
+            continue
+        except ValueError as e:
+            errors.append(f"Row {row_num}: Processing Error - {e}")
+            continue
+
+        valid_rows.append((row_num, {
+            "caravana_visual": animal_schema.caravana_visual,
+            "rfid_tag": animal_schema.rfid_tag,
+            "raza": animal_schema.raza,
+            "sexo": animal_schema.sexo,
+            "fecha_nacimiento": animal_schema.fecha_nacimiento,
+            "origen": animal_schema.origen,
+            "peso_actual": data["peso_actual"],
+            "estado_productivo": estado,
+        }))
+    return valid_rows, errors
+
+def process_chunk(df: pd.DataFrame):
+    """Normaliza y valida un bloque del CSV. Es la unidad de trabajo del pipeline paralelo."""
+    return validate_frame(normalize_frame(df))
+
+class AnimalKeyIndex:
+    """
+    Índice en memoria rfid_tag / caravana_visual -> id de los animales existentes.
+    Se carga con un único SELECT y se mantiene al día con las filas del propio archivo,
+    de modo que un animal repetido en el CSV se resuelve contra el mismo id.
+    """
+    def __init__(self, session: Session):
+        self.by_rfid = {}
+        self.by_caravana = {}
+        rows = session.execute(select(Animal.id, Animal.rfid_tag, Animal.caravana_visual).order_by(literal_column("animal.rowid")))
+        for animal_id, rfid_tag, caravana in rows:
+            if rfid_tag:
+                self.by_rfid[rfid_tag] = animal_id
+            self.by_caravana.setdefault(caravana, animal_id) # Igual que el SELECT original: gana la primera
+
+    def resolve(self, row: dict):
+        """Retorna (id, es_nuevo) aplicando el mismo orden de búsqueda que ingest_flock."""
+        animal_id = None
+        if row["rfid_tag"]:
+            animal_id = self.by_rfid.get(row["rfid_tag"])
+        if animal_id is None:
+            animal_id = self.by_caravana.get(row["caravana_visual"])
+
+        is_new = animal_id is None
+        if is_new:
+            animal_id = uuid.uuid4()
+            self.by_caravana[row["caravana_visual"]] = animal_id
+        if row["rfid_tag"]:
+            self.by_rfid[row["rfid_tag"]] = animal_id
+        return animal_id, is_new
+
+def build_upsert_statement():
+    """INSERT ... ON CONFLICT(id) DO UPDATE con los mismos campos que actualiza ingest_flock."""
+    table = Animal.__table__
+    stmt = sqlite_insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.id],
+        set_={
+            "raza": stmt.excluded.raza,
+            "sexo": stmt.excluded.sexo,
+            "fecha_nacimiento": stmt.excluded.fecha_nacimiento,
+            "peso_actual": stmt.excluded.peso_actual,
+            "estado_productivo": stmt.excluded.estado_productivo,
+            # Solo se pisa el RFID si la fila trae uno
+            "rfid_tag": func.coalesce(stmt.excluded.rfid_tag, table.c.rfid_tag),
+        },
+    )
+
+class BulkAnimalWriter:
+    """Aplica filas validadas en lotes, con fallback fila a fila para aislar errores."""
+    def __init__(self, session: Session, log, batch_size: int = BATCH_SIZE):
+        self.session = session
+        self.log = log
+        self.batch_size = batch_size
+        self.keys = AnimalKeyIndex(session)
+        self.stmt = build_upsert_statement()
+        self.created = 0
+        self.updated = 0
+        self.success_count = 0
+        self.error_count = 0
+        self._pending = []
+
+    def add(self, valid_rows):
+        for row_num, row in valid_rows:
+            animal_id, is_new = self.keys.resolve(row)
+            self._pending.append((row_num, is_new, {**row, "id": animal_id}))
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+
+    def log_errors(self, errors):
+        for error_msg in errors:
+            print(error_msg)
+            self.log.write(error_msg + "\n")
+        self.error_count += len(errors)
+
+    def flush(self):
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        try:
+            self.session.execute(self.stmt, [row for _, _, row in batch])
+            self.session.commit()
+            self._count(batch)
+        except Exception:
+            # Un conflicto (ej. RFID ya asignado a otro animal) invalida el lote completo:
+            # se reintenta fila a fila para reportar exactamente qué filas fallaron.
+            self.session.rollback()
+            for item in batch:
+                row_num, _, row = item
+                try:
+                    self.session.execute(self.stmt, [row])
+                    self.session.commit()
+                    self._count([item])
+                except Exception as e:
+                    self.session.rollback()
+                    self.log_errors([f"Row {row_num}: Processing Error - {e}"])
+        print(f"Batch committed: {self.success_count} rows applied so far ({self.created} new, {self.updated} updated)")
+
+    def _count(self, batch):
+        new = sum(1 for _, is_new, _ in batch if is_new)
+        self.created += new
+        self.updated += len(batch) - new
+        self.success_count += len(batch)
+
+def ingest_flock_bulk(csv_path: str, batch_size: int = BATCH_SIZE):
+    print(f"Starting bulk ingestion from {csv_path} (batch size {batch_size})...")
+
+    if not os.path.exists(csv_path):
+        print(f"Error: File {csv_path} not found.")
+        return
+
+    # Clear previous log
+    if os.path.exists(LOG_FILE):
+        os.remove(LOG_FILE)
+
+    # Ensure tables exist
+    SQLModel.metadata.create_all(engine)
+
+    try:
+        df = pd.read_csv(csv_path, dtype=str, keep_default_na=True)
+    except Exception as e:
+        print(f"Error reading CSV: {e}")
+        return
+
+    valid_rows, errors = process_chunk(df)
+
+    with open(LOG_FILE, "a", encoding="utf-8") as log:
+        with Session(engine) as session:
+            writer = BulkAnimalWriter(session, log, batch_size=batch_size)
+            writer.log_errors(errors)
+            writer.add(valid_rows)
+            writer.flush()
+            # Los upserts por Core no pasan por los eventos del ORM
+            rebuild_flock_counters(session)
+            publish_index_reload(session)
+            session.commit()
+
+    print(f"\nIngestion Complete.")
+    print(f"Success: {writer.success_count} ({writer.created} new, {writer.updated} updated)")
+    print(f"Errors: {writer.error_count}")
+    print(f"See {LOG_FILE} for details.")
+
 if __name__ == "__main__":
     current_dir = os.path.dirname(__file__)
-    csv_file = os.path.join(current_dir, "initial_flock.csv")
-    ingest_flock(csv_file)
+    parser = argparse.ArgumentParser(description="Importa el rebaño desde un CSV.")
+    parser.add_argument("csv_file", nargs="?", default=os.path.join(current_dir, "initial_flock.csv"))
+    parser.add_argument("--bulk", action="store_true", help="Upsert por lotes para padrones grandes")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    if args.bulk:
+        ingest_flock_bulk(args.csv_file, batch_size=args.batch_size)
+    else:
+        ingest_flock(args.csv_file)
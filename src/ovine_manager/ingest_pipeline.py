@@ -0,0 +1,135 @@
+import sys
+import os
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import pandas as pd
+from sqlalchemy.orm import Session
+from sqlmodel import SQLModel
+
+# Ensure src is in python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ovine_manager.ingest_flock import engine, LOG_FILE, BATCH_SIZE, BulkAnimalWriter, process_chunk, publish_index_reload
+from ovine_manager.kpis import rebuild_flock_counters
+
+# Pipeline de ingesta para padrones muy grandes (ej. exportación nacional de trazabilidad):
+#   lector (chunks del CSV) -> pool de procesos (normalización + AnimalCreate) -> escritor único (SQLite)
+# Los bloques se aplican en el mismo orden en que se leyeron, y como máximo `max_pending`
+# bloques están en vuelo a la vez, así que la memoria no depende del tamaño del archivo.
+
+CHUNK_SIZE = 5000 # Filas por bloque enviado a cada worker
+
+@dataclass
+class IngestProgress:
+    """Contadores de avance del pipeline."""
+    rows_read: int = 0
+    rows_applied: int = 0
+    rows_error: int = 0
+    chunks_done: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    @property
+    def rows_per_second(self) -> float:
+        done = self.rows_applied + self.rows_error
+        return done / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def error_rate(self) -> float:
+        done = self.rows_applied + self.rows_error
+        return self.rows_error / done if done else 0.0
+
+    def report(self) -> str:
+        return (
+            f"[{self.elapsed:6.1f}s] chunks={self.chunks_done} read={self.rows_read} "
+            f"applied={self.rows_applied} errors={self.rows_error} "
+            f"({self.rows_per_second:,.0f} rows/s, error rate {self.error_rate:.2%})"
+        )
+
+def ingest_flock_stream(
+    csv_path: str,
+    chunk_size: int = CHUNK_SIZE,
+    workers: Optional[int] = None,
+    batch_size: int = BATCH_SIZE,
+    on_progress: Optional[Callable[[IngestProgress], None]] = None,
+) -> Optional[IngestProgress]:
+    """
+    Importa el CSV en streaming. La normalización y validación corren en un pool de
+    procesos; la escritura la hace un único BulkAnimalWriter en el proceso principal.
+    `on_progress` se invoca después de aplicar cada bloque (por defecto imprime el reporte).
+    """
+    print(f"Starting streaming ingestion from {csv_path}...")
+
+    if not os.path.exists(csv_path):
+        print(f"Error: File {csv_path} not found.")
+        return None
+
+    # Clear previous log
+    if os.path.exists(LOG_FILE):
+        os.remove(LOG_FILE)
+
+    # Ensure tables exist
+    SQLModel.metadata.create_all(engine)
+
+    workers = workers or os.cpu_count() or 1
+    max_pending = workers * 2
+    on_progress = on_progress or (lambda p: print(p.report()))
+    progress = IngestProgress()
+
+    with open(LOG_FILE, "a", encoding="utf-8") as log, Session(engine) as session:
+        writer = BulkAnimalWriter(session, log, batch_size=batch_size)
+
+        def apply_next(pending: deque):
+            valid_rows, errors = pending.popleft().result()
+            writer.log_errors(errors)
+            writer.add(valid_rows)
+            progress.rows_applied = writer.success_count
+            progress.rows_error = writer.error_count
+            progress.chunks_done += 1
+            on_progress(progress)
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            try:
+                for chunk in pd.read_csv(csv_path, dtype=str, chunksize=chunk_size):
+                    progress.rows_read += len(chunk)
+                    pending.append(pool.submit(process_chunk, chunk))
+                    if len(pending) >= max_pending:
+                        apply_next(pending)
+            except Exception as e:
+                print(f"Error reading CSV: {e}")
+            while pending:
+                apply_next(pending)
+
+        writer.flush()
+        rebuild_flock_counters(session)
+        publish_index_reload(session)
+        session.commit()
+        progress.rows_applied = writer.success_count
+        progress.rows_error = writer.error_count
+
+    print(f"\nIngestion Complete.")
+    print(progress.report())
+    print(f"Success: {writer.success_count} ({writer.created} new, {writer.updated} updated)")
+    print(f"Errors: {writer.error_count}")
+    print(f"See {LOG_FILE} for details.")
+    return progress
+
+if __name__ == "__main__":
+    current_dir = os.path.dirname(__file__)
+    parser = argparse.ArgumentParser(description="Importación en streaming y en paralelo de padrones grandes.")
+    parser.add_argument("csv_file", nargs="?", default=os.path.join(current_dir, "initial_flock.csv"))
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=None, help="Procesos de validación (por defecto: núcleos disponibles)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    ingest_flock_stream(args.csv_file, chunk_size=args.chunk_size, workers=args.workers, batch_size=args.batch_size)
@@ -0,0 +1,132 @@
+from collections import Counter
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, event, func, insert, inspect, literal, select, union_all
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from .models import AlertaCrecimiento, Animal, ContadorRebanio, EstadoProductivo, Raza
+
+# KPIs del rebaño a costo constante: en vez de leer la tabla animal completa, los
+# totales y distribuciones salen de ContadorRebanio (una fila por raza x estado),
+# que se actualiza en el mismo flush de cada escritura de Animal por el ORM.
+# Las escrituras masivas por Core (ingest_flock --bulk, ingest_pipeline) llaman a
+# rebuild_flock_counters al terminar.
+
+ATTENTION_LIMIT = 100
+
+def _upsert_delta():
+    table = ContadorRebanio.__table__
+    stmt = sqlite_insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.raza, table.c.estado_productivo],
+        set_={"cantidad": table.c.cantidad + stmt.excluded.cantidad},
+    )
+
+_apply_delta = _upsert_delta()
+
+def _previous(obj, attr: str):
+    deleted = inspect(obj).attrs[attr].history.deleted
+    return deleted[0] if deleted else getattr(obj, attr)
+
+@event.listens_for(Session, "after_flush")
+def _update_flock_counters(session, flush_context):
+    deltas = Counter()
+    for obj in session.new:
+        if isinstance(obj, Animal):
+            deltas[(obj.raza, obj.estado_productivo)] += 1
+    for obj in session.deleted:
+        if isinstance(obj, Animal):
+            deltas[(_previous(obj, "raza"), _previous(obj, "estado_productivo"))] -= 1
+    for obj in session.dirty:
+        if isinstance(obj, Animal) and obj not in session.deleted:
+            before = (_previous(obj, "raza"), _previous(obj, "estado_productivo"))
+            after = (obj.raza, obj.estado_productivo)
+            if before != after:
+                deltas[before] -= 1
+                deltas[after] += 1
+
+    rows = [
+        {"raza": raza, "estado_productivo": estado or EstadoProductivo.CRECIMIENTO, "cantidad": n}
+        for (raza, estado), n in deltas.items() if n
+    ]
+    if rows:
+        session.connection().execute(_apply_delta, rows)
+
+def rebuild_flock_counters(session: Session):
+    """Recalcula los contadores desde la tabla animal (después de cargas masivas o para verificar)."""
+    session.execute(delete(ContadorRebanio))
+    session.execute(
+        insert(ContadorRebanio).from_select(
+            ["raza", "estado_productivo", "cantidad"],
+            select(Animal.raza, Animal.estado_productivo, func.count()).group_by(Animal.raza, Animal.estado_productivo),
+        )
+    )
+
+def ensure_flock_counters(session: Session):
+    """Al arrancar: reconstruye si la tabla de contadores no coincide con el total de animales."""
+    counted = session.scalar(select(func.coalesce(func.sum(ContadorRebanio.cantidad), 0)))
+    total = session.scalar(select(func.count()).select_from(Animal))
+    if counted != total:
+        rebuild_flock_counters(session)
+        session.commit()
+
+def _value(e):
+    return getattr(e, "value", e)
+
+def flock_kpis(session: Session, razas: Optional[List[Raza]] = None, estados: Optional[List[EstadoProductivo]] = None) -> Dict:
+    """KPIs a partir de los contadores (a lo sumo razas x estados filas)."""
+    statement = select(ContadorRebanio.raza, ContadorRebanio.estado_productivo, ContadorRebanio.cantidad).where(ContadorRebanio.cantidad > 0)
+    if razas:
+        statement = statement.where(ContadorRebanio.raza.in_(razas))
+    if estados:
+        statement = statement.where(ContadorRebanio.estado_productivo.in_(estados))
+
+    por_raza, por_estado = Counter(), Counter()
+    for raza, estado, cantidad in session.execute(statement):
+        por_raza[_value(raza)] += cantidad
+        por_estado[_value(estado)] += cantidad
+
+    return {
+        "total": sum(por_raza.values()),
+        "en_lactancia": por_estado.get(EstadoProductivo.LACTANCIA.value, 0),
+        "en_gestacion": por_estado.get(EstadoProductivo.GESTACION.value, 0),
+        "por_raza": dict(por_raza),
+        "por_estado": dict(por_estado),
+    }
+
+def attention_list(session: Session, razas: Optional[List[Raza]] = None, estados: Optional[List[EstadoProductivo]] = None, limit: int = ATTENTION_LIMIT) -> List[Dict]:
+    """
+    Animales con alerta de crecimiento o en Gestación, acotado a `limit` filas.
+    Dos ramas indexadas (AlertaCrecimiento -> PK de animal, e índice por estado) unidas con UNION ALL.
+    La edad en meses se calcula en SQL.
+    """
+    edad_meses = func.round((func.julianday("now") - func.julianday(Animal.fecha_nacimiento)) / 30.44, 1)
+    columns = [
+        Animal.id, Animal.caravana_visual, Animal.rfid_tag, Animal.raza, Animal.estado_productivo,
+        Animal.peso_actual, edad_meses.label("edad_meses"),
+    ]
+
+    def filtered(statement):
+        if razas:
+            statement = statement.where(Animal.raza.in_(razas))
+        if estados:
+            statement = statement.where(Animal.estado_productivo.in_(estados))
+        return statement
+
+    crecimiento = filtered(
+        select(*columns, AlertaCrecimiento.gdp_g_dia, AlertaCrecimiento.desvio_curva_pct, AlertaCrecimiento.motivo)
+        .join(AlertaCrecimiento, AlertaCrecimiento.animal_id == Animal.id)
+    ).limit(limit)
+    gestacion = filtered(
+        select(*columns, literal(None).label("gdp_g_dia"), literal(None).label("desvio_curva_pct"), literal("Gestación").label("motivo"))
+        .outerjoin(AlertaCrecimiento, AlertaCrecimiento.animal_id == Animal.id)
+        .where(Animal.estado_productivo == EstadoProductivo.GESTACION, AlertaCrecimiento.animal_id.is_(None))
+    ).limit(limit)
+
+    ramas = union_all(crecimiento.subquery().select(), gestacion.subquery().select()).subquery()
+    rows = session.execute(select(ramas).limit(limit)).mappings().all()
+    return [
+        {**row, "raza": _value(row["raza"]), "estado_productivo": _value(row["estado_productivo"])}
+        for row in rows
+    ]
@@ -0,0 +1,76 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .models import OrdenieAnimal, PeriodoProduccion, ProduccionLecheAnimal, ProduccionLecheLote
+
+# Registro de leche por animal y acumulados pre-calculados.
+# Cada lote de lecturas se inserta con ON CONFLICT DO NOTHING ... RETURNING, y solo las
+# filas realmente nuevas se suman a los acumulados diarios/semanales por animal y por
+# lote (upsert `litros = litros + excluded.litros`). Las consultas de producción y la
+# proyección de flock_dashboard.py leen esos acumulados, nunca las lecturas crudas.
+
+SIN_LOTE = 0
+INSERT_CHUNK = 500 # Filas por INSERT multi-valor (4 parámetros por fila)
+
+def week_start(d: date) -> date:
+    return d - timedelta(days=d.weekday())
+
+def insert_readings_statements(rows: List[dict]):
+    """INSERT ... ON CONFLICT DO NOTHING RETURNING en bloques; devuelve solo las lecturas nuevas."""
+    table = OrdenieAnimal.__table__
+    for start in range(0, len(rows), INSERT_CHUNK):
+        yield (
+            sqlite_insert(table)
+            .values(rows[start:start + INSERT_CHUNK])
+            .on_conflict_do_nothing()
+            .returning(table.c.animal_id, table.c.fecha_hora, table.c.litros, table.c.lote_id)
+        )
+
+def rollup(inserted: Iterable[Tuple]) -> Tuple[List[dict], List[dict]]:
+    """Agrupa lecturas nuevas (animal_id, fecha_hora, litros, lote_id) en deltas por día y semana."""
+    por_animal: Dict[tuple, List[float]] = defaultdict(lambda: [0.0, 0])
+    por_lote: Dict[tuple, List[float]] = defaultdict(lambda: [0.0, 0])
+    for animal_id, fecha_hora, litros, lote_id in inserted:
+        dia = fecha_hora.date()
+        for periodo, inicio in ((PeriodoProduccion.DIA, dia), (PeriodoProduccion.SEMANA, week_start(dia))):
+            for acumulado in (por_animal[(animal_id, periodo, inicio)], por_lote[(lote_id or SIN_LOTE, periodo, inicio)]):
+                acumulado[0] += litros
+                acumulado[1] += 1
+
+    animal_rows = [
+        {"animal_id": k[0], "periodo": k[1], "inicio": k[2], "litros": v[0], "ordenies": v[1]}
+        for k, v in por_animal.items()
+    ]
+    lote_rows = [
+        {"lote_id": k[0], "periodo": k[1], "inicio": k[2], "litros": v[0], "ordenies": v[1]}
+        for k, v in por_lote.items()
+    ]
+    return animal_rows, lote_rows
+
+def _accumulate_statement(model):
+    table = model.__table__
+    stmt = sqlite_insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[c for c in table.primary_key.columns],
+        set_={"litros": table.c.litros + stmt.excluded.litros, "ordenies": table.c.ordenies + stmt.excluded.ordenies},
+    )
+
+accumulate_animal = _accumulate_statement(ProduccionLecheAnimal)
+accumulate_lote = _accumulate_statement(ProduccionLecheLote)
+
+def recent_daily_production(connectable, days: int = 7, today: Optional[date] = None) -> pd.DataFrame:
+    """Producción diaria del rebaño (todos los lotes) en los últimos `days` días, desde los acumulados."""
+    today = today or date.today()
+    table = ProduccionLecheLote.__table__
+    statement = (
+        select(table.c.inicio.label("dia"), func.sum(table.c.litros).label("litros"), func.sum(table.c.ordenies).label("ordenies"))
+        .where(table.c.periodo == PeriodoProduccion.DIA, table.c.inicio > today - timedelta(days=days))
+        .group_by(table.c.inicio)
+        .order_by(table.c.inicio)
+    )
+    return pd.read_sql(statement, connectable)
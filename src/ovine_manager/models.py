@@ -3,7 +3,7 @@ from typing import Optional, List
 from enum import Enum
 import uuid
 
-from sqlalchemy import ForeignKey, String, Date, Float, DateTime
+from sqlalchemy import ForeignKey, String, Date, Float, DateTime, Index
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from sqlmodel import SQLModel, Field, Relationship
 
@@ -44,6 +44,14 @@ class Animal(Base):
     Utiliza SQLAlchemy 2.0 imperative mapping style.
     """
     __tablename__ = "animal"
+    __table_args__ = (
+        # Índices compuestos (filtro, id) para listar con paginación por cursor:
+        # SQLite filtra y recorre en orden de id usando el mismo índice.
+        Index("ix_animal_raza_id", "raza", "id"),
+        Index("ix_animal_estado_id", "estado_productivo", "id"),
+        Index("ix_animal_sexo_id", "sexo", "id"),
+        Index("ix_animal_lote_id", "lote_actual_id", "id"),
+    )
 
     # Identificadores
     id: Mapped[uuid.UUID] = mapped_column(primary_key=True, default=uuid.uuid4)
@@ -63,8 +71,9 @@ class Animal(Base):
 
     # Relaciones
     # Self-referential relationships for genealogy
-    madre_id: Mapped[Optional[uuid.UUID]] = mapped_column(ForeignKey("animal.id"), nullable=True)
-    padre_id: Mapped[Optional[uuid.UUID]] = mapped_column(ForeignKey("animal.id"), nullable=True)
+    # Indexados para recorrer descendencia (hijos de X) sin escanear la tabla
+    madre_id: Mapped[Optional[uuid.UUID]] = mapped_column(ForeignKey("animal.id"), nullable=True, index=True)
+    padre_id: Mapped[Optional[uuid.UUID]] = mapped_column(ForeignKey("animal.id"), nullable=True, index=True)
 
     # Relationship to Lote (using the existing SQLModel LoteOvejas table name 'loteovejas')
     # Note: LoteOvejas uses SQLModel which defaults table name to class name lowercased or snake_cased?
@@ -119,6 +128,8 @@ class EventoAlimentacionBase(SQLModel):
     kilos_ofrecidos: float
 
 class EventoAlimentacion(EventoAlimentacionBase, table=True):
+    # El planificador de FVH lee el consumo reciente por lote
+    __table_args__ = (Index("ix_eventoalimentacion_lote_fecha", "lote_id", "fecha"),)
     id: Optional[int] = Field(default=None, primary_key=True)
     lote: Optional[LoteOvejas] = Relationship(back_populates="eventos_alimentacion")
 
@@ -133,3 +144,85 @@ class OrdenieDiario(SQLModel, table=True):
     litros_totales: float
     calidad_grasa: float
     calidad_proteina: float
+
+# --- Historial de Pesadas ---
+class PesadaAnimal(SQLModel, table=True):
+    """Una fila por lectura de balanza. Animal.peso_actual guarda solo la última."""
+    __table_args__ = (Index("ix_pesadaanimal_animal_fecha", "animal_id", "fecha"),)
+    id: Optional[int] = Field(default=None, primary_key=True)
+    animal_id: uuid.UUID = Field(foreign_key="animal.id")
+    fecha: datetime = Field(index=True)
+    peso_kg: float
+
+class AlertaCrecimiento(SQLModel, table=True):
+    """Animales con alerta de crecimiento, recalculados después de cada jornada de pesaje."""
+    animal_id: uuid.UUID = Field(foreign_key="animal.id", primary_key=True)
+    gdp_g_dia: Optional[float] = None
+    desvio_curva_pct: Optional[float] = None
+    motivo: str
+    calculado_en: datetime = Field(default_factory=datetime.utcnow)
+
+class PesadaCreate(SQLModel):
+    """Lectura individual: se identifica al animal por RFID o por id."""
+    rfid_tag: Optional[str] = None
+    animal_id: Optional[uuid.UUID] = None
+    peso_kg: float = Field(gt=0)
+    fecha: Optional[datetime] = None # Por defecto, la fecha de la sesión
+
+class SesionPesajeCreate(SQLModel):
+    """Jornada de pesaje completa enviada por la balanza."""
+    fecha: datetime = Field(default_factory=datetime.utcnow)
+    pesadas: List[PesadaCreate]
+
+# --- Ordeñe por Animal ---
+class OrdenieAnimal(SQLModel, table=True):
+    """
+    Lectura del medidor de la sala de ordeñe. Clave natural (animal, fecha_hora) en una
+    tabla WITHOUT ROWID: una lectura repetida por el medidor no duplica producción.
+    """
+    __table_args__ = {"sqlite_with_rowid": False}
+    animal_id: uuid.UUID = Field(foreign_key="animal.id", primary_key=True)
+    fecha_hora: datetime = Field(primary_key=True)
+    litros: float
+    lote_id: Optional[int] = Field(default=None, foreign_key="loteovejas.id") # Lote del animal al momento del ordeñe
+
+class PeriodoProduccion(str, Enum):
+    DIA = "DIA"
+    SEMANA = "SEMANA" # Semana que empieza el lunes
+
+class ProduccionLecheAnimal(SQLModel, table=True):
+    """Acumulado diario/semanal por animal, mantenido en cada ingesta de lecturas."""
+    __table_args__ = (Index("ix_produccionlecheanimal_periodo_inicio", "periodo", "inicio"),)
+    animal_id: uuid.UUID = Field(foreign_key="animal.id", primary_key=True)
+    periodo: PeriodoProduccion = Field(primary_key=True)
+    inicio: date = Field(primary_key=True)
+    litros: float = 0.0
+    ordenies: int = 0
+
+class ProduccionLecheLote(SQLModel, table=True):
+    """Acumulado diario/semanal por lote (lote_id = 0 para animales sin lote asignado)."""
+    lote_id: int = Field(primary_key=True)
+    periodo: PeriodoProduccion = Field(primary_key=True)
+    inicio: date = Field(primary_key=True)
+    litros: float = 0.0
+    ordenies: int = 0
+
+class LecturaOrdenieCreate(SQLModel):
+    rfid_tag: Optional[str] = None
+    animal_id: Optional[uuid.UUID] = None
+    fecha_hora: datetime
+    litros: float = Field(ge=0)
+
+class LoteLecturasOrdenieCreate(SQLModel):
+    """Lote de lecturas enviado por el controlador de la sala de ordeñe."""
+    lecturas: List[LecturaOrdenieCreate]
+
+# --- KPIs del Rebaño ---
+class ContadorRebanio(SQLModel, table=True):
+    """
+    Cantidad de animales por (raza, estado productivo), mantenida en cada escritura de
+    Animal. Todos los KPIs del tablero (totales, distribuciones) se derivan de estas filas.
+    """
+    raza: Raza = Field(primary_key=True)
+    estado_productivo: EstadoProductivo = Field(primary_key=True)
+    cantidad: int = 0
@@ -0,0 +1,360 @@
+import os
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import event, func, inspect, literal, literal_column, or_, select
+from sqlalchemy.orm import Session, aliased
+
+from src.shared.database import read_engine
+from src.ovine_manager.models import Animal, Sexo, EstadoProductivo
+
+# --- Motor de Pedigrí ---
+# 1. Ascendencia/descendencia de N generaciones con un único CTE recursivo
+#    (en vez de una query por ancestro navegando Animal.madre / Animal.padre).
+# 2. Parentesco aditivo sin armar la matriz A del rebaño (ver Pedigree):
+#       - Consanguinidad del animal i:        F_i = A[i, i] - 1   (Meuwissen & Luo)
+#       - Consanguinidad de la cría de s x d: F = A[s, d] / 2     (Colleau, solo candidatos)
+#    La genealogía (padres, F y D por animal) se cachea en el proceso y crece de forma
+#    incremental con las altas; solo se recalcula completa si cambia la genealogía de un
+#    animal existente.
+
+# ---------------------------------------------------------------------------
+# Consultas con CTE recursivo
+# ---------------------------------------------------------------------------
+
+def ancestry_statement(animal_id: UUID, generations: int):
+    """SELECT (Animal, generacion) de los ancestros hasta `generations` generaciones."""
+    arbol = (
+        select(Animal.id, Animal.madre_id, Animal.padre_id, literal(0).label("generacion"))
+        .where(Animal.id == animal_id)
+        .cte("ancestros", recursive=True)
+    )
+    progenitor = aliased(Animal)
+    arbol = arbol.union_all(
+        select(progenitor.id, progenitor.madre_id, progenitor.padre_id, arbol.c.generacion + 1)
+        .where(or_(progenitor.id == arbol.c.madre_id, progenitor.id == arbol.c.padre_id))
+        .where(arbol.c.generacion < generations)
+    )
+    return _resolve(arbol)
+
+def descendancy_statement(animal_id: UUID, generations: int):
+    """SELECT (Animal, generacion) de los descendientes hasta `generations` generaciones."""
+    arbol = (
+        select(Animal.id, literal(0).label("generacion"))
+        .where(Animal.id == animal_id)
+        .cte("descendientes", recursive=True)
+    )
+    hijo = aliased(Animal)
+    arbol = arbol.union_all(
+        select(hijo.id, arbol.c.generacion + 1)
+        .where(or_(hijo.madre_id == arbol.c.id, hijo.padre_id == arbol.c.id))
+        .where(arbol.c.generacion < generations)
+    )
+    return _resolve(arbol)
+
+def _resolve(arbol):
+    # Con consanguinidad un mismo ancestro aparece por varios caminos: nos quedamos con el más cercano
+    cercanos = (
+        select(arbol.c.id, func.min(arbol.c.generacion).label("generacion"))
+        .where(arbol.c.generacion > 0)
+        .group_by(arbol.c.id)
+        .subquery()
+    )
+    return (
+        select(Animal, cercanos.c.generacion)
+        .join(cercanos, Animal.id == cercanos.c.id)
+        .order_by(cercanos.c.generacion, Animal.caravana_visual)
+    )
+
+# ---------------------------------------------------------------------------
+# Parentesco aditivo sin matriz densa
+# ---------------------------------------------------------------------------
+
+PedigreeRecord = Tuple[UUID, Optional[UUID], Optional[UUID]] # (id, madre_id, padre_id)
+
+# Memoria de trabajo del método de Colleau: (ancestros de los candidatos) x (carneros por tanda) float64
+MAX_WORK_BYTES = int(os.getenv("PEDIGREE_MAX_WORK_MB", "64")) * 1024 * 1024
+
+def _topological_order(records: List[PedigreeRecord], known: Dict[UUID, int]) -> List[PedigreeRecord]:
+    """
+    Ordena para que los padres queden antes que sus crías. Los registros llegan
+    ordenados por fecha de nacimiento, así que normalmente alcanza con una pasada.
+    Ciclos o datos inconsistentes se agregan al final (el padre faltante cuenta como desconocido).
+    """
+    pending = {r[0] for r in records}
+    remaining = records
+    ordered = []
+    while remaining:
+        deferred = []
+        for record in remaining:
+            _, madre_id, padre_id = record
+            if (madre_id in pending and madre_id not in known) or (padre_id in pending and padre_id not in known):
+                deferred.append(record)
+                continue
+            ordered.append(record)
+            known[record[0]] = -1 # Marcador: ya ubicado en el orden
+        if len(deferred) == len(remaining):
+            ordered.extend(deferred)
+            break
+        remaining = deferred
+    return ordered
+
+class Pedigree:
+    """
+    Genealogía indexada por posición (padres antes que crías) con F y D de cada animal.
+    No guarda la matriz A (4 * n^2 bytes: ≈6 GB con 40.000 animales): la memoria es O(n).
+    A[filas, columnas] se obtiene por el método de Colleau (2002): A v = L D L' v, con
+    D_j = 1/2 - (F_padre + F_madre)/4 (F = -1 si el padre es desconocido). L' v y L w son
+    dos recorridos de la genealogía, vectorizados por generación y restringidos a los
+    ancestros de los animales pedidos; las columnas se procesan por tandas para no pasar
+    de MAX_WORK_BYTES. De ahí salen:
+    - F del animal i = A[padre, madre] / 2, por generación al extender la genealogía.
+    - F de la cría de cada carnero x oveja (asignación de carneros).
+    """
+    def __init__(self):
+        self.index: Dict[UUID, int] = {}
+        self.ids: List[UUID] = []
+        self.sire = np.zeros(0, dtype=np.int64) # -1 = desconocido
+        self.dam = np.zeros(0, dtype=np.int64)
+        self.depth = np.zeros(0, dtype=np.int64) # Generación: 0 sin padres conocidos
+        self.F = np.zeros(0)
+        self.D = np.zeros(0)
+        self.max_rowid = 0 # Última fila de Animal leída (para extender con altas de otros procesos)
+
+    @property
+    def n(self) -> int:
+        return len(self.ids)
+
+    def extend(self, records: List[PedigreeRecord]):
+        """Agrega animales nuevos. Sus padres deben estar ya en la genealogía o antes en `records`."""
+        placed = dict(self.index)
+        inicio = self.n
+        sire, dam, depth = [], [], []
+        for animal_id, madre_id, padre_id in _topological_order(records, placed):
+            d = self.index.get(madre_id, -1) if madre_id else -1
+            s = self.index.get(padre_id, -1) if padre_id else -1
+            depth.append(1 + max(self._depth(s, inicio, depth), self._depth(d, inicio, depth)))
+            sire.append(s)
+            dam.append(d)
+            self.index[animal_id] = self.n
+            self.ids.append(animal_id)
+        if not sire:
+            return
+        self.sire = np.concatenate([self.sire, sire])
+        self.dam = np.concatenate([self.dam, dam])
+        self.depth = np.concatenate([self.depth, depth])
+        self.F = np.concatenate([self.F, np.zeros(len(sire))])
+        self.D = np.concatenate([self.D, np.zeros(len(sire))])
+
+        # Por generación: F de una cría solo depende de F y D de sus ancestros (generaciones previas)
+        nuevos = np.arange(inicio, self.n)
+        for nivel in np.unique(self.depth[nuevos]):
+            grupo = nuevos[self.depth[nuevos] == nivel]
+            s, d = self.sire[grupo], self.dam[grupo]
+            F = np.zeros(len(grupo))
+            ambos = (s >= 0) & (d >= 0)
+            mismo = ambos & (s == d)
+            F[mismo] = 0.5 * (1.0 + self.F[s[mismo]])
+            pares = np.flatnonzero(ambos & ~mismo)
+            if pares.size:
+                padres, col = np.unique(s[pares], return_inverse=True)
+                for primero, bloque in self._relationships(padres, d[pares]):
+                    en = np.flatnonzero((col >= primero) & (col < primero + bloque.shape[1]))
+                    F[pares[en]] = 0.5 * bloque[en, col[en] - primero]
+            self.F[grupo] = F
+            self.D[grupo] = 0.5 - 0.25 * (self._f_or_unknown(s) + self._f_or_unknown(d))
+
+    def _depth(self, i: int, inicio: int, nuevos: List[int]) -> int:
+        if i < 0:
+            return -1
+        return int(self.depth[i]) if i < inicio else nuevos[i - inicio]
+
+    def _f_or_unknown(self, idx: np.ndarray) -> np.ndarray:
+        return np.where(idx >= 0, self.F[np.maximum(idx, 0)], -1.0)
+
+    def inbreeding(self) -> np.ndarray:
+        return self.F
+
+    def _ancestors(self, seeds: np.ndarray) -> np.ndarray:
+        """Posiciones de `seeds` y todos sus ancestros, en orden (padres antes que crías)."""
+        marca = np.zeros(self.n, dtype=bool)
+        frontera = np.unique(seeds)
+        marca[frontera] = True
+        while frontera.size:
+            padres = np.concatenate([self.sire[frontera], self.dam[frontera]])
+            padres = np.unique(padres[padres >= 0])
+            frontera = padres[~marca[padres]]
+            marca[frontera] = True
+        return np.flatnonzero(marca)
+
+    def _relationships(self, cols: np.ndarray, rows: np.ndarray) -> Iterator[Tuple[int, np.ndarray]]:
+        """Genera (primera columna, A[rows, tanda de cols]) con a lo sumo MAX_WORK_BYTES de trabajo."""
+        sub = self._ancestors(np.concatenate([cols, rows]))
+        m = len(sub)
+        local = np.full(self.n, -1, dtype=np.int64)
+        local[sub] = np.arange(m)
+        padre = np.where(self.sire[sub] >= 0, local[np.maximum(self.sire[sub], 0)], -1)
+        madre = np.where(self.dam[sub] >= 0, local[np.maximum(self.dam[sub], 0)], -1)
+        profundidad = self.depth[sub]
+        D = self.D[sub][:, None]
+        # Por generación, los nodos con cada padre conocido y la posición de ese padre
+        capas = []
+        for g in range(1, int(profundidad.max()) + 1):
+            capa = np.flatnonzero(profundidad == g)
+            for p in (padre, madre):
+                nodos = capa[p[capa] >= 0]
+                capas.append((nodos, p[nodos]))
+        filas = local[rows]
+        tanda = max(1, MAX_WORK_BYTES // (8 * m))
+        for primero in range(0, len(cols), tanda):
+            c = local[cols[primero:primero + tanda]]
+            V = np.zeros((m, len(c)))
+            V[c, np.arange(len(c))] = 1.0
+            # u = L' v: cada animal aporta la mitad a sus padres (de las crías hacia los ancestros)
+            for nodos, padres in reversed(capas):
+                np.add.at(V, padres, 0.5 * V[nodos]) # Varias crías pueden sumar al mismo padre
+            V *= D
+            # x = L (D u): cada animal recibe la mitad de sus padres (de los ancestros hacia las crías)
+            for nodos, padres in capas:
+                V[nodos] += 0.5 * V[padres]
+            yield primero, V[filas]
+
+    def best_mates(self, sire_ids: List[UUID], dam_ids: List[UUID]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Para cada oveja, el carnero (posición en `sire_ids`) que minimiza el F de la cría y ese F.
+        La memoria queda acotada por MAX_WORK_BYTES, no por el tamaño del rebaño.
+        """
+        sires = np.fromiter((self.index[i] for i in sire_ids), dtype=np.int64, count=len(sire_ids))
+        dams = np.fromiter((self.index[i] for i in dam_ids), dtype=np.int64, count=len(dam_ids))
+        best = np.zeros(len(dams), dtype=np.int64)
+        best_f = np.full(len(dams), np.inf)
+        for primero, bloque in self._relationships(sires, dams):
+            f_cria = 0.5 * bloque # ovejas x carneros de la tanda
+            mejor = np.argmin(f_cria, axis=1)
+            mejor_f = f_cria[np.arange(len(dams)), mejor]
+            mejora = mejor_f < best_f
+            best[mejora] = primero + mejor[mejora]
+            best_f[mejora] = mejor_f[mejora]
+        return best, best_f
+
+class PedigreeCache:
+    """
+    Cache de proceso de la genealogía. Las altas (de este u otros procesos, ej. ingest_flock)
+    se agregan de forma incremental leyendo las filas de Animal con rowid posterior a la
+    última leída. Un cambio de genealogía o una baja (eventos del mapper de Animal) o un
+    conteo que no cierra fuerzan el recálculo completo.
+    """
+    def __init__(self):
+        self.pedigree = Pedigree()
+        self._lock = threading.Lock()
+        self._stale = True
+
+    def invalidate(self):
+        self._stale = True
+
+    def current(self) -> Pedigree:
+        """Retorna la genealogía al día con la base. Hace I/O y cálculo: llamar fuera del event loop."""
+        with self._lock:
+            with Session(read_engine) as session:
+                self._sync(session)
+            return self.pedigree
+
+    def _sync(self, session: Session):
+        total = session.scalar(select(func.count()).select_from(Animal))
+        if not self._stale and total == self.pedigree.n:
+            return
+        if not self._stale and total > self.pedigree.n:
+            rows = self._load(session, literal_column("rowid") > self.pedigree.max_rowid)
+            if self.pedigree.n + len(rows) == total:
+                self._extend(self.pedigree, rows)
+                return
+        self._rebuild(session)
+
+    def _rebuild(self, session: Session):
+        pedigree = Pedigree()
+        self._extend(pedigree, self._load(session))
+        self.pedigree = pedigree
+        self._stale = False
+
+    @staticmethod
+    def _extend(pedigree: Pedigree, rows: List[tuple]):
+        if rows:
+            pedigree.extend([tuple(row[1:]) for row in rows])
+            pedigree.max_rowid = max(pedigree.max_rowid, max(row[0] for row in rows))
+
+    @staticmethod
+    def _load(session: Session, *criteria) -> List[tuple]:
+        """(rowid, id, madre_id, padre_id) ordenados por nacimiento."""
+        statement = (
+            select(literal_column("rowid"), Animal.id, Animal.madre_id, Animal.padre_id)
+            .select_from(Animal)
+            .order_by(Animal.fecha_nacimiento)
+        )
+        if criteria:
+            statement = statement.where(*criteria)
+        return list(session.execute(statement))
+
+pedigree_cache = PedigreeCache()
+
+@event.listens_for(Animal, "after_update")
+def _pedigree_on_update(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.madre_id.history.has_changes() or state.attrs.padre_id.history.has_changes():
+        pedigree_cache.invalidate()
+
+@event.listens_for(Animal, "after_delete")
+def _pedigree_on_delete(mapper, connection, target):
+    pedigree_cache.invalidate()
+
+# ---------------------------------------------------------------------------
+# Servicios
+# ---------------------------------------------------------------------------
+
+def inbreeding_coefficients(min_f: float = 0.0) -> List[dict]:
+    """F de todos los animales con F >= min_f, de mayor a menor."""
+    pedigree = pedigree_cache.current()
+    f = pedigree.inbreeding()
+    selected = np.flatnonzero(f >= min_f)
+    selected = selected[np.argsort(-f[selected], kind="stable")]
+    ids = [pedigree.ids[i] for i in selected]
+
+    with Session(read_engine) as session:
+        caravanas = dict(session.execute(select(Animal.id, Animal.caravana_visual).where(Animal.id.in_(ids))).all()) if ids else {}
+    return [
+        {"animal_id": animal_id, "caravana_visual": caravanas.get(animal_id, ""), "consanguinidad": round(float(f[i]), 6)}
+        for animal_id, i in zip(ids, selected)
+    ]
+
+def assign_rams(carneros: Optional[List[UUID]], ovejas: Optional[List[UUID]], max_consanguinidad: float) -> List[dict]:
+    """
+    Para cada oveja elige el carnero que minimiza la consanguinidad de la cría
+    (A[carneros, ovejas] por tandas de carneros, ver Pedigree.best_mates).
+    """
+    pedigree = pedigree_cache.current()
+    with Session(read_engine) as session:
+        if carneros is None:
+            carneros = list(session.scalars(select(Animal.id).where(Animal.sexo == Sexo.MACHO)))
+        if ovejas is None:
+            ovejas = list(session.scalars(
+                select(Animal.id).where(Animal.sexo == Sexo.HEMBRA, Animal.estado_productivo == EstadoProductivo.SERVICIO)
+            ))
+
+    carneros = [i for i in carneros if i in pedigree.index]
+    ovejas = [i for i in ovejas if i in pedigree.index]
+    if not carneros:
+        return [{"oveja_id": oveja, "carnero_id": None, "consanguinidad_cria": None, "apta": False} for oveja in ovejas]
+    if not ovejas:
+        return []
+
+    best, best_f = pedigree.best_mates(carneros, ovejas)
+    return [
+        {
+            "oveja_id": oveja,
+            "carnero_id": carneros[int(b)],
+            "consanguinidad_cria": round(float(f), 6),
+            "apta": bool(f <= max_consanguinidad),
+        }
+        for oveja, b, f in zip(ovejas, best, best_f)
+    ]
@@ -0,0 +1,124 @@
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from .models import Animal, EstadoProductivo
+
+# Índice de proceso RFID -> datos de manejo del animal, para lectores de sala de ordeñe
+# y balanza que emiten ráfagas de cientos de tags por minuto. Se carga al arrancar y se
+# mantiene coherente con las escrituras hechas por el ORM en este proceso (eventos de
+# Session): los cambios detectados en el flush se aplican recién en el commit y se
+# descartan en rollback. Los tags que no están en el índice se buscan en la base
+# (read-through), pero eso solo completa tags faltantes: un cambio de estado, lote o tag
+# hecho por otro proceso no llega por acá. En la API eso lo cubre rfid_sync.py, que
+# invalida los tags cambiados en los demás workers a través de la tabla Evento.
+
+class RfidEntry(NamedTuple):
+    animal_id: UUID
+    caravana_visual: str
+    estado_productivo: EstadoProductivo
+    lote_actual_id: Optional[int]
+
+_PENDING_KEY = "rfid_index_pending"
+LOOKUP_CHUNK = 500 # Tags por IN (...) al resolver faltantes
+
+class RfidIndex:
+    def __init__(self):
+        self._entries: Dict[str, RfidEntry] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def select_entries():
+        return select(Animal.rfid_tag, Animal.id, Animal.caravana_visual, Animal.estado_productivo, Animal.lote_actual_id)
+
+    def load(self, session: Session):
+        """Carga completa desde la tabla animal (al arrancar la API)."""
+        rows = session.execute(self.select_entries().where(Animal.rfid_tag.is_not(None)))
+        entries = {tag: RfidEntry(*rest) for tag, *rest in rows}
+        with self._lock:
+            self._entries = entries
+
+    def get(self, tag: str) -> Optional[RfidEntry]:
+        return self._entries.get(tag)
+
+    def lookup(self, tags: Iterable[str]) -> Tuple[Dict[str, RfidEntry], List[str]]:
+        """Resuelve en memoria. Retorna (encontrados, faltantes) sin tocar la base."""
+        entries = self._entries
+        found, missing = {}, []
+        for tag in tags:
+            entry = entries.get(tag)
+            if entry is None:
+                missing.append(tag)
+            else:
+                found[tag] = entry
+        return found, missing
+
+    def missing_statements(self, missing: List[str]):
+        """SELECTs para buscar en la base los tags faltantes, en bloques de LOOKUP_CHUNK."""
+        for start in range(0, len(missing), LOOKUP_CHUNK):
+            yield self.select_entries().where(Animal.rfid_tag.in_(missing[start:start + LOOKUP_CHUNK]))
+
+    def add_rows(self, rows) -> Dict[str, RfidEntry]:
+        """Incorpora filas (rfid_tag, id, caravana, estado, lote) leídas de la base."""
+        added = {tag: RfidEntry(*rest) for tag, *rest in rows}
+        with self._lock:
+            self._entries.update(added)
+        return added
+
+    def resolve(self, session: Session, tags: Iterable[str]) -> Tuple[Dict[str, RfidEntry], List[str]]:
+        """lookup() + read-through síncrono de los faltantes."""
+        found, missing = self.lookup(tags)
+        for statement in self.missing_statements(missing):
+            found.update(self.add_rows(session.execute(statement)))
+        return found, [tag for tag in missing if tag not in found]
+
+    def invalidate(self, tags: Iterable[str]):
+        """Olvida tags cambiados en otro proceso: la próxima lectura los busca en la base."""
+        with self._lock:
+            for tag in tags:
+                self._entries.pop(tag, None)
+
+    def apply(self, upserts: Dict[str, RfidEntry], removals: Iterable[str]):
+        with self._lock:
+            for tag in removals:
+                self._entries.pop(tag, None)
+            self._entries.update(upserts)
+
+rfid_index = RfidIndex()
+
+# --- Coherencia con el ORM ---
+
+@event.listens_for(Session, "after_flush")
+def _rfid_collect_changes(session, flush_context):
+    upserts, removals = session.info.setdefault(_PENDING_KEY, ({}, set()))
+    for obj in session.deleted:
+        if isinstance(obj, Animal) and obj.rfid_tag:
+            removals.add(obj.rfid_tag)
+            upserts.pop(obj.rfid_tag, None)
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, Animal):
+            continue
+        previous = inspect(obj).attrs.rfid_tag.history.deleted
+        for old_tag in previous or ():
+            if old_tag and old_tag != obj.rfid_tag:
+                removals.add(old_tag)
+                upserts.pop(old_tag, None)
+        if obj.rfid_tag:
+            upserts[obj.rfid_tag] = RfidEntry(obj.id, obj.caravana_visual, obj.estado_productivo, obj.lote_actual_id)
+            removals.discard(obj.rfid_tag)
+
+@event.listens_for(Session, "after_commit")
+def _rfid_apply_changes(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        rfid_index.apply(*pending)
+
+@event.listens_for(Session, "after_rollback")
+def _rfid_discard_changes(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,56 @@
+import asyncio
+
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+
+from src.shared.database import read_engine
+from src.core.events import event_bus, event_rows
+from src.core.jobs import HOLDER_ID
+from src.core.models import Evento
+from .rfid_index import _PENDING_KEY, rfid_index
+
+# --- Coherencia del índice RFID entre workers ---
+# Cada worker de uvicorn tiene su propio rfid_index. Los tags que cambian en un commit
+# (alta, baja, cambio de tag, estado o lote) se registran como un evento interno
+# "rfid_index" en la misma transacción; los demás workers lo leen de la tabla Evento
+# (event_bus, cada POLL_SECONDS como máximo) y sacan esos tags de su índice, así la
+# próxima lectura los vuelve a buscar en la base (read-through).
+# Los scripts de importación escriben sin pasar por acá y publican {"recargar": true}
+# al terminar (ver publish_index_reload en ingest_flock.py): cada worker recarga todo.
+
+TOPIC = "rfid_index"
+_PUBLISHED_KEY = "rfid_index_published"
+
+@event.listens_for(Session, "after_flush")
+def _rfid_publish_changes(session, flush_context):
+    # Corre después de _rfid_collect_changes (rfid_index se registra antes)
+    upserts, removals = session.info.get(_PENDING_KEY, ({}, set()))
+    published = session.info.setdefault(_PUBLISHED_KEY, set())
+    tags = (set(upserts) | removals) - published
+    if tags:
+        session.connection().execute(insert(Evento.__table__), event_rows(TOPIC, [{"tags": sorted(tags), "origen": HOLDER_ID}]))
+        published.update(tags)
+
+@event.listens_for(Session, "after_commit")
+def _rfid_notify(session):
+    if session.info.pop(_PUBLISHED_KEY, None):
+        event_bus.notify()
+
+@event.listens_for(Session, "after_rollback")
+def _rfid_discard(session):
+    session.info.pop(_PUBLISHED_KEY, None)
+
+def _reload():
+    with Session(read_engine) as session:
+        rfid_index.load(session)
+
+def _invalidate(evento: dict):
+    data = evento["data"]
+    if data.get("origen") == HOLDER_ID:
+        return # Este worker ya aplicó el cambio al confirmar
+    if data.get("recargar"):
+        asyncio.get_running_loop().run_in_executor(None, _reload)
+    else:
+        rfid_index.invalidate(data["tags"])
+
+event_bus.listen(TOPIC, _invalidate)
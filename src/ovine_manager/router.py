@@ -1,29 +1,276 @@
-from fastapi import APIRouter, Depends
-from sqlmodel import Session, select
-from typing import List
+from fastapi import APIRouter, Depends, Query, Response, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import insert, update, bindparam, or_
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import List, Optional
+from datetime import date
+from uuid import UUID
 
-from src.shared.database import get_session
-from src.ovine_manager.models import LoteOvejas, LoteOvejasCreate, EventoAlimentacion, EventoAlimentacionCreate
+from src.shared.database import get_async_session, get_async_read_session, read_engine
+from src.shared.pagination import keyset, legacy_limit, page, MAX_PAGE_SIZE
+from src.shared.dates import naive_utc
+from src.ovine_manager.models import Animal, Raza, Sexo, EstadoProductivo, LoteOvejas, LoteOvejasCreate, EventoAlimentacion, EventoAlimentacionCreate, PesadaAnimal, SesionPesajeCreate, LoteLecturasOrdenieCreate, PeriodoProduccion, ProduccionLecheAnimal, ProduccionLecheLote
+from src.ovine_manager.schemas import AnimalCreate, AnimalRead, AnimalPedigreeRead, ConsanguinidadRead, AsignacionCarneroRequest, AsignacionCarnero, RfidLookupRequest, RfidLookupResponse, SesionPesajeResultado, CrecimientoRead, LecturasOrdenieResultado, ProduccionLecheRead, KpisRebanioRead
+from src.ovine_manager import pedigree, growth, milk, kpis
+from src.ovine_manager.rfid_index import rfid_index
 
 router = APIRouter(prefix="/ovine-manager", tags=["OvineManager"])
 
 @router.post("/batches/", response_model=LoteOvejas)
-def create_batch(batch_data: LoteOvejasCreate, session: Session = Depends(get_session)):
+async def create_batch(batch_data: LoteOvejasCreate, session: AsyncSession = Depends(get_async_session)):
     batch = LoteOvejas.model_validate(batch_data)
     session.add(batch)
-    session.commit()
-    session.refresh(batch)
+    await session.commit()
+    await session.refresh(batch)
     return batch
 
 @router.get("/batches/", response_model=List[LoteOvejas])
-def read_batches(skip: int = 0, limit: int = 100, session: Session = Depends(get_session)):
-    batches = session.exec(select(LoteOvejas).offset(skip).limit(limit)).all()
-    return batches
+async def read_batches(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, description=f"Máximo {MAX_PAGE_SIZE} por página"),
+    skip: int = Query(0, ge=0, deprecated=True, description="Deprecado: usar cursor"),
+    session: AsyncSession = Depends(get_async_read_session),
+):
+    limit = legacy_limit(limit, skip, response)
+    batches = (await session.exec(keyset(select(LoteOvejas), LoteOvejas.id, cursor, limit, skip=skip))).all()
+    return page(batches, response, limit)
 
 @router.post("/feeding-events/", response_model=EventoAlimentacion)
-def create_feeding_event(event_data: EventoAlimentacionCreate, session: Session = Depends(get_session)):
+async def create_feeding_event(event_data: EventoAlimentacionCreate, session: AsyncSession = Depends(get_async_session)):
     event = EventoAlimentacion.model_validate(event_data)
     session.add(event)
-    session.commit()
-    session.refresh(event)
+    await session.commit()
+    await session.refresh(event)
     return event
+
+# --- Animales ---
+
+@router.post("/animals/", response_model=AnimalRead)
+async def create_animal(animal_data: AnimalCreate, session: AsyncSession = Depends(get_async_session)):
+    animal = Animal(**animal_data.model_dump())
+    session.add(animal)
+    try:
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        raise HTTPException(status_code=409, detail=f"RFID tag {animal_data.rfid_tag} already assigned")
+    await session.refresh(animal)
+    return animal
+
+@router.get("/animals/", response_model=List[AnimalRead])
+async def read_animals(
+    response: Response,
+    raza: Optional[Raza] = None,
+    estado_productivo: Optional[EstadoProductivo] = None,
+    sexo: Optional[Sexo] = None,
+    lote_actual_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    session: AsyncSession = Depends(get_async_read_session),
+):
+    statement = select(Animal)
+    if raza is not None:
+        statement = statement.where(Animal.raza == raza)
+    if estado_productivo is not None:
+        statement = statement.where(Animal.estado_productivo == estado_productivo)
+    if sexo is not None:
+        statement = statement.where(Animal.sexo == sexo)
+    if lote_actual_id is not None:
+        statement = statement.where(Animal.lote_actual_id == lote_actual_id)
+
+    animals = (await session.exec(keyset(statement, Animal.id, cursor, limit, parse=UUID))).all()
+    return page(animals, response, limit)
+
+@router.post("/animals/rfid-lookup", response_model=RfidLookupResponse)
+async def lookup_rfid_tags(request: RfidLookupRequest, session: AsyncSession = Depends(get_async_read_session)):
+    # Camino rápido en memoria; solo los tags desconocidos van a la base
+    tags = list(dict.fromkeys(request.tags))
+    found = await _resolve_rfid(session, tags)
+    return RfidLookupResponse(
+        encontrados=[{"rfid_tag": tag, **found[tag]._asdict()} for tag in tags if tag in found],
+        no_encontrados=[tag for tag in tags if tag not in found],
+    )
+
+async def _resolve_rfid(session: AsyncSession, tags) -> dict:
+    """RFID -> RfidEntry usando el índice en memoria y la base solo para los faltantes."""
+    found, missing = rfid_index.lookup(tags)
+    for statement in rfid_index.missing_statements(missing):
+        found.update(rfid_index.add_rows((await session.execute(statement)).all()))
+    return found
+
+@router.get("/animals/{animal_id}", response_model=AnimalRead)
+async def read_animal(animal_id: UUID, session: AsyncSession = Depends(get_async_read_session)):
+    animal = await session.get(Animal, animal_id)
+    if not animal:
+        raise HTTPException(status_code=404, detail="Animal not found")
+    return animal
+
+# --- Pedigrí ---
+
+async def _pedigree(session: AsyncSession, statement) -> List[AnimalPedigreeRead]:
+    rows = (await session.execute(statement)).all()
+    return [
+        AnimalPedigreeRead(**AnimalRead.model_validate(animal).model_dump(), generacion=generacion)
+        for animal, generacion in rows
+    ]
+
+@router.get("/animals/{animal_id}/ancestors", response_model=List[AnimalPedigreeRead])
+async def read_ancestors(animal_id: UUID, generations: int = Query(3, ge=1, le=20), session: AsyncSession = Depends(get_async_read_session)):
+    return await _pedigree(session, pedigree.ancestry_statement(animal_id, generations))
+
+@router.get("/animals/{animal_id}/descendants", response_model=List[AnimalPedigreeRead])
+async def read_descendants(animal_id: UUID, generations: int = Query(3, ge=1, le=20), session: AsyncSession = Depends(get_async_read_session)):
+    return await _pedigree(session, pedigree.descendancy_statement(animal_id, generations))
+
+@router.get("/pedigree/inbreeding", response_model=List[ConsanguinidadRead])
+async def read_inbreeding(min_f: float = Query(0.0, ge=0.0)):
+    # El cálculo de la matriz es CPU: se hace en el threadpool para no frenar el event loop
+    return await run_in_threadpool(pedigree.inbreeding_coefficients, min_f)
+
+@router.post("/pedigree/ram-assignment", response_model=List[AsignacionCarnero])
+async def plan_ram_assignment(request: AsignacionCarneroRequest):
+    return await run_in_threadpool(pedigree.assign_rams, request.carneros, request.ovejas, request.max_consanguinidad)
+
+# --- Pesajes ---
+
+# Solo pisa peso_actual si la lectura es más nueva que la última registrada
+_update_last_weight = (
+    update(Animal.__table__)
+    .where(Animal.__table__.c.id == bindparam("b_id"))
+    .where(or_(Animal.__table__.c.fecha_ultima_pesada.is_(None), Animal.__table__.c.fecha_ultima_pesada <= bindparam("b_fecha")))
+    .values(peso_actual=bindparam("b_peso"), fecha_ultima_pesada=bindparam("b_fecha"))
+)
+
+@router.post("/weigh-ins/", response_model=SesionPesajeResultado)
+async def create_weigh_in(sesion: SesionPesajeCreate, session: AsyncSession = Depends(get_async_session)):
+    tags = list({p.rfid_tag for p in sesion.pesadas if p.animal_id is None and p.rfid_tag})
+    by_tag = await _resolve_rfid(session, tags)
+
+    ids = list({p.animal_id for p in sesion.pesadas if p.animal_id is not None})
+    known_ids = set()
+    for start in range(0, len(ids), 500):
+        known_ids.update((await session.exec(select(Animal.id).where(Animal.id.in_(ids[start:start + 500])))).all())
+
+    history, latest, no_encontradas = [], {}, []
+    for pesada in sesion.pesadas:
+        if pesada.animal_id is not None:
+            animal_id = pesada.animal_id if pesada.animal_id in known_ids else None
+        else:
+            entry = by_tag.get(pesada.rfid_tag)
+            animal_id = entry.animal_id if entry else None
+        if animal_id is None:
+            no_encontradas.append(str(pesada.animal_id or pesada.rfid_tag))
+            continue
+
+        fecha = naive_utc(pesada.fecha or sesion.fecha) # La balanza puede mandar fechas con o sin zona
+        history.append({"animal_id": animal_id, "fecha": fecha, "peso_kg": pesada.peso_kg})
+        if animal_id not in latest or fecha >= latest[animal_id]["b_fecha"]:
+            latest[animal_id] = {"b_id": animal_id, "b_fecha": fecha, "b_peso": pesada.peso_kg}
+
+    # Historial + último peso en una sola transacción
+    if history:
+        await session.execute(insert(PesadaAnimal), history)
+        await session.execute(_update_last_weight, list(latest.values()))
+        await session.commit()
+        # Las alertas de crecimiento dependen de todo el rebaño: las recalcula el job del
+        # líder (growth.refresh_if_stale), una vez por intervalo y no por cada request
+
+    return SesionPesajeResultado(registradas=len(history), animales_actualizados=len(latest), no_encontradas=no_encontradas)
+
+@router.get("/growth/", response_model=List[CrecimientoRead])
+async def read_growth(solo_alertas: bool = False, window_days: int = Query(growth.WINDOW_DAYS, ge=7, le=730)):
+    df = await run_in_threadpool(growth.flock_growth, read_engine, window_days)
+    if solo_alertas:
+        df = df[df["alerta"]]
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+# --- Ordeñe por animal ---
+
+@router.post("/milkings/batch", response_model=LecturasOrdenieResultado)
+async def create_milking_batch(batch: LoteLecturasOrdenieCreate, session: AsyncSession = Depends(get_async_session)):
+    tags = list({l.rfid_tag for l in batch.lecturas if l.animal_id is None and l.rfid_tag})
+    by_tag = await _resolve_rfid(session, tags)
+
+    # Lote actual de los animales identificados por id (los de RFID ya lo traen del índice)
+    ids = list({l.animal_id for l in batch.lecturas if l.animal_id is not None})
+    lote_by_id = {}
+    for start in range(0, len(ids), 500):
+        rows = await session.exec(select(Animal.id, Animal.lote_actual_id).where(Animal.id.in_(ids[start:start + 500])))
+        lote_by_id.update(rows.all())
+
+    rows, no_encontradas = [], []
+    for lectura in batch.lecturas:
+        if lectura.animal_id is not None:
+            animal_id = lectura.animal_id if lectura.animal_id in lote_by_id else None
+            lote_id = lote_by_id.get(lectura.animal_id)
+        else:
+            entry = by_tag.get(lectura.rfid_tag)
+            animal_id, lote_id = (entry.animal_id, entry.lote_actual_id) if entry else (None, None)
+        if animal_id is None:
+            no_encontradas.append(str(lectura.animal_id or lectura.rfid_tag))
+            continue
+        rows.append({"animal_id": animal_id, "fecha_hora": lectura.fecha_hora, "litros": lectura.litros, "lote_id": lote_id})
+
+    # Lecturas crudas + acumulados en la misma transacción; solo suman las filas nuevas
+    inserted = []
+    for statement in milk.insert_readings_statements(rows):
+        inserted.extend((await session.execute(statement)).all())
+    if inserted:
+        animal_rows, lote_rows = milk.rollup(inserted)
+        await session.execute(milk.accumulate_animal, animal_rows)
+        await session.execute(milk.accumulate_lote, lote_rows)
+    await session.commit()
+
+    return LecturasOrdenieResultado(
+        recibidas=len(batch.lecturas),
+        registradas=len(inserted),
+        duplicadas=len(rows) - len(inserted),
+        no_encontradas=no_encontradas,
+    )
+
+@router.get("/milk-production/", response_model=List[ProduccionLecheRead])
+async def read_milk_production(
+    nivel: str = Query("lote", pattern="^(animal|lote)$"),
+    periodo: PeriodoProduccion = PeriodoProduccion.DIA,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    animal_id: Optional[UUID] = None,
+    lote_id: Optional[int] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    session: AsyncSession = Depends(get_async_read_session),
+):
+    model = ProduccionLecheAnimal if nivel == "animal" else ProduccionLecheLote
+    statement = select(model).where(model.periodo == periodo)
+    if desde:
+        statement = statement.where(model.inicio >= desde)
+    if hasta:
+        statement = statement.where(model.inicio <= hasta)
+    if nivel == "animal" and animal_id is not None:
+        statement = statement.where(model.animal_id == animal_id)
+    if nivel == "lote" and lote_id is not None:
+        statement = statement.where(model.lote_id == lote_id)
+
+    rows = (await session.exec(statement.order_by(model.inicio.desc()).limit(limit))).all()
+    return [ProduccionLecheRead(**row.model_dump()) for row in rows]
+
+# --- KPIs ---
+
+@router.get("/kpis/", response_model=KpisRebanioRead)
+async def read_flock_kpis(
+    raza: Optional[List[Raza]] = Query(None),
+    estado_productivo: Optional[List[EstadoProductivo]] = Query(None),
+    limit: int = Query(kpis.ATTENTION_LIMIT, ge=1, le=MAX_PAGE_SIZE),
+    session: AsyncSession = Depends(get_async_read_session),
+):
+    resumen = await session.run_sync(kpis.flock_kpis, raza, estado_productivo)
+    atencion = await session.run_sync(kpis.attention_list, raza, estado_productivo, limit)
+    return {**resumen, "atencion": atencion}
+
+@router.post("/kpis/rebuild")
+async def rebuild_flock_kpis(session: AsyncSession = Depends(get_async_session)):
+    await session.run_sync(kpis.rebuild_flock_counters)
+    await session.commit()
+    return {"status": "ok"}
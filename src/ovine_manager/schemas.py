@@ -1,5 +1,5 @@
 from datetime import date, datetime
-from typing import Optional
+from typing import Optional, List, Dict
 from uuid import UUID
 
 from pydantic import BaseModel, Field, ConfigDict
@@ -31,3 +31,100 @@ class AnimalRead(AnimalBase):
     edad_meses: float = Field(..., description="Edad calculada en meses")
 
     model_config = ConfigDict(from_attributes=True)
+
+class AnimalPedigreeRead(AnimalRead):
+    """Animal dentro de una consulta de ascendencia/descendencia."""
+    generacion: int = Field(..., description="Distancia en generaciones al animal consultado")
+
+class ConsanguinidadRead(BaseModel):
+    """Coeficiente de consanguinidad (F de Wright) de un animal."""
+    animal_id: UUID
+    caravana_visual: str
+    consanguinidad: float
+
+class AsignacionCarneroRequest(BaseModel):
+    """Pedido de asignación de carneros. Sin listas explícitas se usan machos y hembras en Servicio."""
+    carneros: Optional[List[UUID]] = None
+    ovejas: Optional[List[UUID]] = None
+    max_consanguinidad: float = Field(default=0.0625, description="F máximo aceptable de la cría (0.0625 = primos hermanos)")
+
+class AsignacionCarnero(BaseModel):
+    oveja_id: UUID
+    carnero_id: Optional[UUID] = None
+    consanguinidad_cria: Optional[float] = None
+    apta: bool
+
+class RfidLookupRequest(BaseModel):
+    """Lote de lecturas de un lector RFID (sala de ordeñe, balanza, manga)."""
+    tags: List[str] = Field(..., max_length=5000)
+
+class RfidLookupEntry(BaseModel):
+    rfid_tag: str
+    animal_id: UUID
+    caravana_visual: str
+    estado_productivo: EstadoProductivo
+    lote_actual_id: Optional[int] = None
+
+class RfidLookupResponse(BaseModel):
+    encontrados: List[RfidLookupEntry]
+    no_encontrados: List[str]
+
+class SesionPesajeResultado(BaseModel):
+    """Resultado de una jornada de pesaje."""
+    registradas: int
+    animales_actualizados: int
+    no_encontradas: List[str] = Field(default_factory=list, description="RFID/ids sin animal asociado")
+
+class CrecimientoRead(BaseModel):
+    """Métricas de crecimiento de un animal (ventana móvil de pesadas)."""
+    animal_id: UUID
+    caravana_visual: str
+    raza: Raza
+    sexo: Sexo
+    estado_productivo: EstadoProductivo
+    edad_meses: float
+    peso_actual: Optional[float] = None
+    pesadas: int
+    gdp_g_dia: Optional[float] = Field(default=None, description="Ganancia diaria de peso (g/día)")
+    peso_referencia: Optional[float] = None
+    desvio_curva_pct: Optional[float] = None
+    alerta: bool
+    motivo: str
+
+class LecturasOrdenieResultado(BaseModel):
+    """Resultado de la ingesta de un lote de lecturas de ordeñe."""
+    recibidas: int
+    registradas: int
+    duplicadas: int
+    no_encontradas: List[str] = Field(default_factory=list)
+
+class ProduccionLecheRead(BaseModel):
+    """Fila de producción pre-agregada (por animal o por lote)."""
+    animal_id: Optional[UUID] = None
+    lote_id: Optional[int] = None
+    periodo: str
+    inicio: date
+    litros: float
+    ordenies: int
+
+class AtencionRead(BaseModel):
+    """Animal en la lista de atención requerida."""
+    id: UUID
+    caravana_visual: str
+    rfid_tag: Optional[str] = None
+    raza: str
+    estado_productivo: str
+    peso_actual: Optional[float] = None
+    edad_meses: Optional[float] = None
+    gdp_g_dia: Optional[float] = None
+    desvio_curva_pct: Optional[float] = None
+    motivo: str
+
+class KpisRebanioRead(BaseModel):
+    """KPIs del tablero del rebaño, calculados desde los contadores."""
+    total: int
+    en_lactancia: int
+    en_gestacion: int
+    por_raza: Dict[str, int]
+    por_estado: Dict[str, int]
+    atencion: List[AtencionRead]
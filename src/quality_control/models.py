@@ -1,6 +1,7 @@
 from typing import Optional
 from datetime import datetime
 from enum import Enum
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field
 
 # Enumeración para tipos de acción en saneamiento
@@ -10,9 +11,10 @@ class AccionSaneamiento(str, Enum):
 
 class RegistroSaneamiento(SQLModel, table=True):
     """Registro de Procedimientos Operativos Estandarizados de Saneamiento (SSOP)"""
+    __table_args__ = (Index("ix_registrosaneamiento_area_fecha", "area_equipo", "fecha_hora"),)
     id: Optional[int] = Field(default=None, primary_key=True)
     area_equipo: str = Field(index=True)  # Ej: "Tina Quesera 01", "Paredes Cámara"
-    fecha_hora: datetime = Field(default_factory=datetime.now)
+    fecha_hora: datetime = Field(default_factory=datetime.now, index=True)
     tipo: AccionSaneamiento
     agente_quimico: str                   # Ej: "Soda Cáustica", "Ácido Peracético"
     concentracion: Optional[str] = None    # Ej: "2%", "200ppm"
@@ -22,7 +24,7 @@ class RegistroSaneamiento(SQLModel, table=True):
 class ControlAgua(SQLModel, table=True):
     """Monitoreo de potabilidad del agua"""
     id: Optional[int] = Field(default=None, primary_key=True)
-    fecha: datetime = Field(default_factory=datetime.now)
+    fecha: datetime = Field(default_factory=datetime.now, index=True)
     cloro_residual_ppm: float             # Rango típico: 0.2 - 2.0 ppm
     ph: float                             # Acidez del agua
     apto_consumo: bool                    # Resultado microbiológico
@@ -32,7 +34,7 @@ class ControlAgua(SQLModel, table=True):
 class ControlPlagas(SQLModel, table=True):
     """Registro de inspección y cebado de trampas"""
     id: Optional[int] = Field(default=None, primary_key=True)
-    fecha_inspeccion: datetime = Field(default_factory=datetime.now)
+    fecha_inspeccion: datetime = Field(default_factory=datetime.now, index=True)
     trampas_inspeccionadas: int
     trampas_con_actividad: int
     hallazgos: Optional[str] = None
@@ -1,26 +1,126 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
-from typing import List
-from..database import get_session
-from.models import RegistroSaneamiento, ControlAgua, ControlPlagas
+import csv
+import io
+import json
+from datetime import datetime
+from enum import Enum
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select as sa_select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import List, Optional
+
+from src.shared.database import async_read_engine, get_async_session, get_async_read_session
+from src.shared.pagination import keyset, page, MAX_PAGE_SIZE
+from .models import RegistroSaneamiento, ControlAgua, ControlPlagas
 
 router = APIRouter(prefix="/quality", tags=["QualityControl"])
 
+# Exportación para auditorías (MGAP): las filas salen de un cursor del servidor en
+# particiones de EXPORT_PARTITION y se escriben a la respuesta a medida que llegan, así la
+# memoria no depende de cuántos años de historial se exporten.
+EXPORT_PARTITION = 1_000
+
+# registro -> (modelo, columna de fecha)
+EXPORTABLES = {
+    "saneamiento": (RegistroSaneamiento, RegistroSaneamiento.fecha_hora),
+    "control-agua": (ControlAgua, ControlAgua.fecha),
+    "control-plagas": (ControlPlagas, ControlPlagas.fecha_inspeccion),
+}
+
 @router.post("/saneamiento/", response_model=RegistroSaneamiento)
-def crear_registro_saneamiento(registro: RegistroSaneamiento, session: Session = Depends(get_session)):
+async def crear_registro_saneamiento(registro: RegistroSaneamiento, session: AsyncSession = Depends(get_async_session)):
     session.add(registro)
-    session.commit()
-    session.refresh(registro)
+    await session.commit()
+    await session.refresh(registro)
     return registro
 
-@router.get("/saneamiento/", response_model=List)
-def listar_saneamientos(session: Session = Depends(get_session)):
-    return session.exec(select(RegistroSaneamiento)).all()
+@router.get("/saneamiento/", response_model=List[RegistroSaneamiento])
+async def listar_saneamientos(
+    response: Response,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    area_equipo: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    session: AsyncSession = Depends(get_async_read_session),
+):
+    statement = _filtrar(select(RegistroSaneamiento), RegistroSaneamiento.fecha_hora, desde, hasta)
+    if area_equipo:
+        statement = statement.where(RegistroSaneamiento.area_equipo == area_equipo)
+    registros = (await session.exec(keyset(statement, RegistroSaneamiento.id, cursor, limit))).all()
+    return page(registros, response, limit)
 
 @router.post("/control-agua/", response_model=ControlAgua)
-def registrar_control_agua(control: ControlAgua, session: Session = Depends(get_session)):
+async def registrar_control_agua(control: ControlAgua, session: AsyncSession = Depends(get_async_session)):
     # Validación normativa: El cloro debe estar idealmente entre 0.3 y 1.5 ppm
     session.add(control)
-    session.commit()
-    session.refresh(control)
-    return control
\ No newline at end of file
+    await session.commit()
+    await session.refresh(control)
+    return control
+
+def _filtrar(statement, columna, desde: Optional[datetime], hasta: Optional[datetime]):
+    if desde:
+        statement = statement.where(columna >= desde)
+    if hasta:
+        statement = statement.where(columna < hasta)
+    return statement
+
+def _valor(v):
+    if isinstance(v, Enum):
+        return v.value
+    if isinstance(v, datetime):
+        return v.isoformat()
+    return v
+
+async def _stream_rows(statement, columnas: List[str], formato: str):
+    async with async_read_engine.connect() as conn:
+        result = await conn.stream(statement.execution_options(yield_per=EXPORT_PARTITION))
+        if formato == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columnas)
+            async for filas in result.partitions():
+                writer.writerows([_valor(v) for v in fila] for fila in filas)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            yield buffer.getvalue() # Encabezado de una exportación vacía
+        else:
+            async for filas in result.partitions():
+                yield "".join(
+                    json.dumps({c: _valor(v) for c, v in zip(columnas, fila)}, ensure_ascii=False) + "\n"
+                    for fila in filas
+                )
+
+@router.get("/export/{registro}")
+async def exportar_registros(
+    registro: str,
+    formato: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    area_equipo: Optional[str] = Query(None, description="Solo para saneamiento"),
+):
+    """Exporta un registro SSOP completo o por rango de fechas, en NDJSON o CSV, sin cargarlo en memoria."""
+    if registro not in EXPORTABLES:
+        raise HTTPException(status_code=404, detail=f"Unknown record type. Use one of: {sorted(EXPORTABLES)}")
+    if desde and hasta and desde >= hasta:
+        raise HTTPException(status_code=422, detail="desde must be before hasta")
+    modelo, fecha = EXPORTABLES[registro]
+    if area_equipo and modelo is not RegistroSaneamiento:
+        raise HTTPException(status_code=422, detail="area_equipo only applies to saneamiento")
+
+    tabla = modelo.__table__
+    columnas = [c.name for c in tabla.columns]
+    statement = _filtrar(sa_select(tabla), fecha, desde, hasta)
+    if area_equipo:
+        statement = statement.where(tabla.c.area_equipo == area_equipo)
+    # Orden cronológico servido por el índice de la fecha
+    statement = statement.order_by(fecha, tabla.c.id)
+
+    rango = "_".join(d.strftime("%Y%m%d") for d in (desde, hasta) if d) or "completo"
+    return StreamingResponse(
+        _stream_rows(statement, columnas, formato),
+        media_type="text/csv; charset=utf-8" if formato == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{registro}_{rango}.{formato}"'},
+    )
@@ -0,0 +1,98 @@
+import sys
+import os
+import time
+import tempfile
+import threading
+import argparse
+
+# Ensure src is in python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from shared.database import create_sqlite_engine, connect_args
+
+# Benchmark de lectura/escritura concurrente sobre un archivo SQLite temporal.
+# Compara el engine por defecto (journal DELETE, sin pragmas) contra el perfil de
+# producción de shared.database (WAL + pragmas, pools separados de lectura y escritura).
+
+def _prepare(url: str, rows: int):
+    setup = create_engine(url, connect_args=connect_args)
+    with setup.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS lectura (id INTEGER PRIMARY KEY, sensor TEXT, valor REAL)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_lectura_sensor ON lectura (sensor)"))
+        conn.execute(
+            text("INSERT INTO lectura (sensor, valor) VALUES (:sensor, :valor)"),
+            [{"sensor": f"S{i % 50}", "valor": float(i)} for i in range(rows)],
+        )
+    setup.dispose()
+
+def _run(write_engine, read_engine, readers: int, writers: int, seconds: float) -> dict:
+    stats = {"reads": 0, "writes": 0, "locked": 0}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def count(key):
+        with lock:
+            stats[key] += 1
+
+    def reader(n):
+        while not stop.is_set():
+            try:
+                with read_engine.connect() as conn:
+                    conn.execute(text("SELECT count(*), avg(valor) FROM lectura WHERE sensor = :s"), {"s": f"S{n % 50}"}).one()
+                count("reads")
+            except OperationalError:
+                count("locked")
+
+    def writer(n):
+        i = 0
+        while not stop.is_set():
+            try:
+                with write_engine.begin() as conn:
+                    conn.execute(text("INSERT INTO lectura (sensor, valor) VALUES (:s, :v)"), {"s": f"S{n % 50}", "v": float(i)})
+                count("writes")
+            except OperationalError:
+                count("locked")
+            i += 1
+
+    threads = [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+    threads += [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    return {k: v / seconds if k != "locked" else v for k, v in stats.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput concurrente SQLite: engine por defecto vs perfil WAL.")
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--rows", type=int, default=50_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for label in ("default", "production"):
+            url = f"sqlite:///{os.path.join(tmp, label + '.db')}"
+            _prepare(url, args.rows)
+            if label == "default":
+                write_engine = read_engine = create_engine(url, connect_args=connect_args)
+            else:
+                write_engine = create_sqlite_engine(url)
+                read_engine = create_sqlite_engine(url, read_only=True, pool_size=args.readers)
+
+            result = _run(write_engine, read_engine, args.readers, args.writers, args.seconds)
+            print(
+                f"{label:>10}: {result['reads']:10,.0f} reads/s  {result['writes']:8,.0f} writes/s  "
+                f"{int(result['locked'])} 'database is locked' errors"
+            )
+            write_engine.dispose()
+            read_engine.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,132 @@
+import os
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-sqlite_file_name = "ovinetech.db"
+sqlite_file_name = os.getenv("OVINETECH_DB", "ovinetech.db")
 sqlite_url = f"sqlite:///{sqlite_file_name}"
+async_sqlite_url = f"sqlite+aiosqlite:///{sqlite_file_name}"
 
 connect_args = {"check_same_thread": False}
-engine = create_engine(sqlite_url, connect_args=connect_args)
+
+# --- Perfil de producción SQLite ---
+# Se aplican en cada conexión nueva. Con WAL los lectores no bloquean al escritor
+# (y viceversa); busy_timeout hace que un segundo escritor espere en vez de fallar
+# inmediatamente con "database is locked".
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),      # Seguro con WAL, mucho menos fsync que FULL
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),     # Negativo = KiB (64 MB por conexión)
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "temp_store": "MEMORY",
+}
+
+WRITE_POOL_SIZE = int(os.getenv("DB_WRITE_POOL_SIZE", "5"))
+READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "10"))
+
+def _pragma_listener(settings: dict, read_only: bool, begin_immediate: bool = False):
+    def _apply_pragmas(dbapi_connection, connection_record):
+        if begin_immediate:
+            dbapi_connection.isolation_level = None # El BEGIN lo emite _begin_immediate, no pysqlite
+        cursor = dbapi_connection.cursor()
+        for name, value in settings.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+    return _apply_pragmas
+
+def _begin_immediate(conn):
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+def _pool_args(url: str, pool_size: int, kwargs: dict) -> dict:
+    if ":memory:" not in url and not url.endswith("://"):
+        kwargs.setdefault("pool_size", pool_size)
+        kwargs.setdefault("max_overflow", pool_size * 2)
+    return kwargs
+
+def create_sqlite_engine(url: str = sqlite_url, *, read_only: bool = False, pool_size: int = WRITE_POOL_SIZE,
+                         pragmas: dict = None, begin_immediate: bool = False, **kwargs):
+    """
+    Crea un engine SQLite con los pragmas de producción aplicados al conectar.
+    `read_only=True` marca cada conexión con `query_only` para el pool de lectura.
+    `pragmas` permite sobreescribir valores puntuales de SQLITE_PRAGMAS.
+    `begin_immediate=True` abre cada transacción con BEGIN IMMEDIATE: toma el lock de
+    escritura al empezar, así una transacción que lee y después escribe espera con
+    busy_timeout a otro proceso en vez de fallar con SQLITE_BUSY al querer escribir.
+    """
+    new_engine = create_engine(url, connect_args=connect_args, **_pool_args(url, pool_size, kwargs))
+    event.listen(new_engine, "connect", _pragma_listener({**SQLITE_PRAGMAS, **(pragmas or {})}, read_only, begin_immediate))
+    if begin_immediate:
+        event.listen(new_engine, "begin", _begin_immediate)
+    return new_engine
+
+def create_async_sqlite_engine(url: str = async_sqlite_url, *, read_only: bool = False, pool_size: int = WRITE_POOL_SIZE, pragmas: dict = None, **kwargs):
+    """Variante aiosqlite de create_sqlite_engine, con el mismo perfil de pragmas."""
+    new_engine = create_async_engine(url, connect_args=connect_args, **_pool_args(url, pool_size, kwargs))
+    event.listen(new_engine.sync_engine, "connect", _pragma_listener({**SQLITE_PRAGMAS, **(pragmas or {})}, read_only))
+    return new_engine
+
+# Engine de escritura (API, scheduler, scripts de ingesta) y pool de solo lectura (dashboards, reportes)
+engine = create_sqlite_engine(pool_size=WRITE_POOL_SIZE)
+read_engine = create_sqlite_engine(read_only=True, pool_size=READ_POOL_SIZE)
+
+# Engines async para los routers: la espera de I/O no ocupa hilos del threadpool de FastAPI
+async_engine = create_async_sqlite_engine(pool_size=WRITE_POOL_SIZE)
+async_read_engine = create_async_sqlite_engine(read_only=True, pool_size=READ_POOL_SIZE)
 
 def get_session():
     with Session(engine) as session:
         yield session
 
+def get_read_session():
+    with Session(read_engine) as session:
+        yield session
+
+async def get_async_session():
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
+async def get_async_read_session():
+    async with AsyncSession(async_read_engine, expire_on_commit=False) as session:
+        yield session
+
+async def dispose_async_engines():
+    await async_engine.dispose()
+    await async_read_engine.dispose()
+
+# --- Columnas agregadas a tablas existentes ---
+# create_all crea tablas nuevas pero nunca altera las existentes: una base creada con una
+# versión anterior de los modelos no tiene estas columnas. Se agregan con ALTER TABLE antes
+# de crear los índices (que pueden usarlas). Una columna NOT NULL necesita DEFAULT en SQLite.
+# tabla -> {columna: definición}
+ADDED_COLUMNS = {
+    "transaccion": {"hash_contenido": "VARCHAR"},
+    # 0 = sin calcular: ensure_seed_stats lo completa para las cosechas existentes
+    "fvhcosecha": {"ratio_conversion": "FLOAT NOT NULL DEFAULT 0"},
+    # NULL = alta anterior: el escaneo al arrancar cubre esos equipos si nunca se limpiaron
+    "equipment": {"created_at": "DATETIME"},
+}
+
+def add_missing_columns(bind=engine, added_columns: dict = ADDED_COLUMNS):
+    """Compara PRAGMA table_info con ADDED_COLUMNS y agrega las columnas faltantes."""
+    with bind.begin() as conn:
+        for table, columns in added_columns.items():
+            existentes = {row[1] for row in conn.execute(text(f"PRAGMA table_info({table})"))}
+            if not existentes:
+                continue # Tabla inexistente: nada que migrar
+            for column, ddl in columns.items():
+                if column not in existentes:
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+                    print(f"🛠️ [DB] Columna agregada: {table}.{column}")
+
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
+    add_missing_columns()
+    # create_all no toca tablas existentes: los índices agregados después se crean acá
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
@@ -0,0 +1,13 @@
+from datetime import datetime, timezone
+
+# Las fechas se guardan sin zona horaria (SQLite DateTime descarta tzinfo). Los equipos
+# pueden mandar fechas con o sin zona: se normalizan antes de comparar o guardar, así
+# una fecha "...Z" no se lee después como hora local ni falla al compararse con una naive.
+
+def naive_utc(fecha: datetime) -> datetime:
+    """Fecha en UTC sin zona. Una fecha naive se asume ya en UTC."""
+    return fecha.astimezone(timezone.utc).replace(tzinfo=None) if fecha.tzinfo else fecha
+
+def naive_local(fecha: datetime) -> datetime:
+    """Fecha en la hora local del servidor sin zona (para módulos que comparan contra datetime.now())."""
+    return fecha.astimezone().replace(tzinfo=None) if fecha.tzinfo else fecha
@@ -0,0 +1,53 @@
+import base64
+from typing import Callable, List, Optional, Sequence
+
+from fastapi import HTTPException, Response
+
+# Paginación por cursor (keyset): en vez de OFFSET, cada página continúa desde la
+# última clave devuelta (`WHERE clave > :cursor ORDER BY clave LIMIT n`), que con
+# índice sobre la clave cuesta lo mismo en la página 1 que en la 10.000.
+# El cursor de la página siguiente viaja en el header X-Next-Cursor; los endpoints
+# siguen devolviendo una lista simple para no romper a los clientes existentes.
+# Los endpoints que antes aceptaban `skip` lo siguen aceptando (deprecado) cuando no se
+# manda cursor, y recortan un `limit` mayor a MAX_PAGE_SIZE en vez de rechazarlo: el
+# header X-Next-Cursor indica que hay más filas.
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+MAX_PAGE_SIZE = 500
+
+def encode_cursor(value) -> str:
+    return base64.urlsafe_b64encode(str(value).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, parse: Callable = int):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return parse(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def keyset(statement, key_column, cursor: Optional[str], limit: int, parse: Callable = int, skip: int = 0):
+    """
+    Aplica el filtro de cursor y el orden por clave. Pide una fila extra para saber si hay más páginas.
+    `skip` (OFFSET, deprecado) solo se usa sin cursor, para clientes anteriores a la paginación por cursor.
+    """
+    if cursor and skip:
+        raise HTTPException(status_code=400, detail="Use either cursor or skip (deprecated), not both")
+    if cursor:
+        statement = statement.where(key_column > decode_cursor(cursor, parse))
+    elif skip:
+        statement = statement.offset(skip)
+    return statement.order_by(key_column).limit(limit + 1)
+
+def legacy_limit(limit: int, skip: int, response: Response) -> int:
+    """Para endpoints que antes paginaban con skip/limit: recorta el límite y marca el uso de skip."""
+    if skip:
+        response.headers["Deprecation"] = "true"
+    return min(limit, MAX_PAGE_SIZE)
+
+def page(rows: Sequence, response: Response, limit: int, key: str = "id") -> List:
+    """Recorta la fila extra pedida por keyset() y publica el cursor siguiente si corresponde."""
+    rows = list(rows)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(getattr(rows[-1], key))
+    return rows
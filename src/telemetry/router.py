@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+
+from src.telemetry import storage
+from src.telemetry.schemas import IngestaResultado, LoteLecturasSensor, SensorRead, SerieAgregada, SerieCruda
+
+router = APIRouter(prefix="/telemetry", tags=["Telemetry"])
+
+def _range(desde: Optional[datetime], hasta: Optional[datetime], default: timedelta):
+    hasta = hasta or datetime.now(timezone.utc)
+    desde = desde or hasta - default
+    if storage.to_ms(desde) >= storage.to_ms(hasta):
+        raise HTTPException(status_code=422, detail="desde must be before hasta")
+    return desde, hasta
+
+@router.post("/ingest", response_model=IngestaResultado)
+async def ingest_readings(batch: LoteLecturasSensor):
+    ahora = storage.to_ms(datetime.now(timezone.utc))
+    lecturas = [
+        (l.sensor, l.unidad, storage.to_ms(l.ts) if l.ts else ahora, l.valor)
+        for l in batch.lecturas
+    ]
+    # Compresión de bloques y agregados: en el threadpool para no frenar el event loop
+    return await run_in_threadpool(storage.ingest, lecturas)
+
+@router.get("/sensors", response_model=List[SensorRead])
+async def read_sensors():
+    return await run_in_threadpool(storage.list_sensors)
+
+@router.get("/latest", response_model=List[SensorRead])
+async def read_latest(sensor: Optional[List[str]] = Query(None)):
+    return await run_in_threadpool(storage.latest, sensor)
+
+@router.get("/{sensor}/raw", response_model=SerieCruda)
+async def read_raw(sensor: str, desde: Optional[datetime] = None, hasta: Optional[datetime] = None):
+    desde, hasta = _range(desde, hasta, timedelta(hours=1))
+    serie = await run_in_threadpool(storage.raw_range, sensor, desde, hasta)
+    if serie is None:
+        raise HTTPException(status_code=404, detail="Sensor not found")
+    return serie
+
+@router.get("/{sensor}/aggregate", response_model=SerieAgregada)
+async def read_aggregate(
+    sensor: str,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    resolucion: Optional[str] = Query(None, pattern="^(1m|1h|1d)$"),
+):
+    desde, hasta = _range(desde, hasta, timedelta(days=1))
+    serie = await run_in_threadpool(storage.aggregate_range, sensor, desde, hasta, resolucion)
+    if serie is None:
+        raise HTTPException(status_code=404, detail="Sensor not found")
+    return serie
@@ -0,0 +1,47 @@
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+class LecturaSensor(BaseModel):
+    """Lectura de un sensor. Sin `ts` se toma la hora de llegada al servidor."""
+    sensor: str = Field(..., min_length=1, description="Nombre del sensor, ej. 'invernadero.humedad'")
+    valor: float
+    ts: Optional[datetime] = None
+    unidad: Optional[str] = Field(default=None, description="Solo se usa al registrar un sensor nuevo")
+
+class LoteLecturasSensor(BaseModel):
+    """Lote de lecturas enviado por el gateway IoT."""
+    lecturas: List[LecturaSensor] = Field(..., min_length=1, max_length=20_000)
+
+class IngestaResultado(BaseModel):
+    recibidas: int
+    registradas: int = Field(..., description="Lecturas nuevas (las repetidas se ignoran)")
+    bloques_sellados: int
+
+class SensorRead(BaseModel):
+    sensor: str
+    unidad: Optional[str] = None
+    ts: Optional[datetime] = None
+    valor: Optional[float] = None
+
+class PuntoCrudo(BaseModel):
+    ts: datetime
+    valor: float
+
+class SerieCruda(BaseModel):
+    sensor: str
+    truncado: bool
+    puntos: List[PuntoCrudo]
+
+class PuntoAgregado(BaseModel):
+    ts: datetime
+    n: int
+    media: float
+    minimo: float
+    maximo: float
+
+class SerieAgregada(BaseModel):
+    sensor: str
+    resolucion: str
+    puntos: List[PuntoAgregado]
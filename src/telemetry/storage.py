@@ -0,0 +1,394 @@
+import os
+import threading
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import (
+    Column, Float, ForeignKey, Index, Integer, LargeBinary, MetaData, String, Table,
+    and_, delete, func, insert, select,
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from src.shared.database import create_sqlite_engine, READ_POOL_SIZE
+
+# --- Series de tiempo embebidas (telemetría de invernadero y cámaras de maduración) ---
+# Archivo SQLite propio (no compite por el lock de escritura con la base del ERP):
+# - lectura_reciente: "cabeza" por sensor, filas (sensor, ts) recién llegadas.
+# - bloque: al juntar CHUNK_POINTS lecturas (o CHUNK_SECONDS de datos) la cabeza de un
+#   sensor se sella en un bloque columnar comprimido: tiempos como deltas int64 y
+#   valores float32, cada columna con zlib. Los bloques son de solo-agregado.
+# - agregado: niveles 1m / 1h / 1d (n, suma, mín, máx) que se actualizan con upsert en
+#   la misma transacción de cada ingesta; las consultas de rango largas leen de acá.
+# - ultima_lectura: último valor por sensor para el tablero.
+# Los tiempos se guardan como epoch en milisegundos (UTC).
+# Ingesta, sellado y retención leen la cabeza y después escriben: el engine de escritura
+# abre sus transacciones con BEGIN IMMEDIATE, así dos workers de uvicorn no sellan la
+# misma cabeza a la vez (el segundo espera el lock en vez de fallar con SQLITE_BUSY).
+
+telemetry_file_name = os.getenv("OVINETECH_TELEMETRY_DB", "telemetry.db")
+telemetry_url = f"sqlite:///{telemetry_file_name}"
+
+CHUNK_POINTS = 720                  # 1 hora a una lectura cada 5 s
+CHUNK_SECONDS = 6 * 3600            # Una cabeza más vieja que esto se sella aunque tenga pocas lecturas
+MAX_RAW_POINTS = 50_000             # Tope de puntos crudos por consulta
+MAX_AGGREGATE_POINTS = 5_000        # Buckets objetivo al elegir resolución automática
+# Espera del lock de escritura entre workers: con BEGIN IMMEDIATE se espera la transacción
+# completa del otro (no solo su commit), así que el default de la base del ERP queda corto
+BUSY_TIMEOUT_MS = int(os.getenv("TELEMETRY_BUSY_TIMEOUT_MS", "30000"))
+
+TIERS = {"1m": 60, "1h": 3600, "1d": 86400}
+
+# Retención en días por nivel (None = sin límite)
+RETENTION_DAYS = {
+    "raw": int(os.getenv("TELEMETRY_RAW_DAYS", "30")),
+    "1m": int(os.getenv("TELEMETRY_1M_DAYS", "90")),
+    "1h": int(os.getenv("TELEMETRY_1H_DAYS", str(5 * 365))),
+    "1d": None,
+}
+
+metadata = MetaData()
+
+sensor = Table(
+    "sensor", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("nombre", String, nullable=False, unique=True), # Ej: "invernadero.humedad", "camara1.temperatura"
+    Column("unidad", String),
+)
+
+lectura_reciente = Table(
+    "lectura_reciente", metadata,
+    Column("sensor_id", Integer, ForeignKey("sensor.id"), primary_key=True),
+    Column("ts", Integer, primary_key=True),
+    Column("valor", Float, nullable=False),
+    sqlite_with_rowid=False,
+)
+
+bloque = Table(
+    "bloque", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("sensor_id", Integer, ForeignKey("sensor.id"), nullable=False),
+    Column("inicio", Integer, nullable=False),
+    Column("fin", Integer, nullable=False),
+    Column("n", Integer, nullable=False),
+    Column("minimo", Float, nullable=False),
+    Column("maximo", Float, nullable=False),
+    Column("tiempos", LargeBinary, nullable=False),
+    Column("valores", LargeBinary, nullable=False),
+    Index("ix_bloque_sensor_fin", "sensor_id", "fin"),
+)
+
+agregado = Table(
+    "agregado", metadata,
+    Column("resolucion", Integer, primary_key=True), # Segundos por bucket (60, 3600, 86400)
+    Column("sensor_id", Integer, ForeignKey("sensor.id"), primary_key=True),
+    Column("inicio", Integer, primary_key=True),
+    Column("n", Integer, nullable=False),
+    Column("suma", Float, nullable=False),
+    Column("minimo", Float, nullable=False),
+    Column("maximo", Float, nullable=False),
+    sqlite_with_rowid=False,
+)
+
+ultima_lectura = Table(
+    "ultima_lectura", metadata,
+    Column("sensor_id", Integer, ForeignKey("sensor.id"), primary_key=True),
+    Column("ts", Integer, nullable=False),
+    Column("valor", Float, nullable=False),
+)
+
+telemetry_engine = create_sqlite_engine(telemetry_url, begin_immediate=True, pragmas={"busy_timeout": BUSY_TIMEOUT_MS})
+telemetry_read_engine = create_sqlite_engine(telemetry_url, read_only=True, pool_size=READ_POOL_SIZE)
+
+def create_telemetry_tables():
+    metadata.create_all(telemetry_engine)
+
+# ---------------------------------------------------------------------------
+# Codificación de bloques
+# ---------------------------------------------------------------------------
+
+def to_ms(ts: datetime) -> int:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return int(ts.timestamp() * 1000)
+
+def from_ms(ms: int) -> datetime:
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc)
+
+def encode_chunk(ts: np.ndarray, valores: np.ndarray) -> Tuple[bytes, bytes]:
+    """Tiempos ordenados como deltas desde ts[0] (casi constantes, comprimen muy bien) y valores float32."""
+    deltas = np.diff(ts.astype(np.int64), prepend=ts[0])
+    return zlib.compress(deltas.tobytes()), zlib.compress(valores.astype(np.float32).tobytes())
+
+def decode_chunk(inicio: int, tiempos: bytes, valores: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    ts = np.cumsum(np.frombuffer(zlib.decompress(tiempos), dtype=np.int64)) + inicio
+    return ts, np.frombuffer(zlib.decompress(valores), dtype=np.float32).astype(np.float64)
+
+# ---------------------------------------------------------------------------
+# Ingesta
+# ---------------------------------------------------------------------------
+
+_write_lock = threading.Lock() # Entre hilos del proceso; entre procesos serializa BEGIN IMMEDIATE
+_sensor_ids: Dict[str, int] = {}
+
+def _resolve_sensors(conn, nombres: Dict[str, Optional[str]]) -> Dict[str, int]:
+    """Registra sensores nuevos (nombre -> unidad) y retorna sus ids. El cache se actualiza después del commit."""
+    ids = {n: _sensor_ids[n] for n in nombres if n in _sensor_ids}
+    faltantes = [n for n in nombres if n not in ids]
+    if faltantes:
+        conn.execute(
+            sqlite_insert(sensor).on_conflict_do_nothing(index_elements=[sensor.c.nombre]),
+            [{"nombre": n, "unidad": nombres[n]} for n in faltantes],
+        )
+        ids.update(conn.execute(select(sensor.c.nombre, sensor.c.id).where(sensor.c.nombre.in_(faltantes))).all())
+    return ids
+
+def _upsert_aggregate():
+    stmt = sqlite_insert(agregado)
+    return stmt.on_conflict_do_update(
+        index_elements=[agregado.c.resolucion, agregado.c.sensor_id, agregado.c.inicio],
+        set_={
+            "n": agregado.c.n + stmt.excluded.n,
+            "suma": agregado.c.suma + stmt.excluded.suma,
+            "minimo": func.min(agregado.c.minimo, stmt.excluded.minimo),
+            "maximo": func.max(agregado.c.maximo, stmt.excluded.maximo),
+        },
+    )
+
+def _upsert_latest():
+    stmt = sqlite_insert(ultima_lectura)
+    return stmt.on_conflict_do_update(
+        index_elements=[ultima_lectura.c.sensor_id],
+        set_={"ts": stmt.excluded.ts, "valor": stmt.excluded.valor},
+        where=stmt.excluded.ts >= ultima_lectura.c.ts,
+    )
+
+_apply_aggregate = _upsert_aggregate()
+_apply_latest = _upsert_latest()
+INSERT_CHUNK = 300 # Filas por INSERT multi-valor en la cabeza (3 parámetros por fila)
+
+def downsample(df: pd.DataFrame) -> List[dict]:
+    """Agrupa lecturas nuevas (sensor_id, ts, valor) en deltas por nivel y bucket."""
+    rows = []
+    for resolucion in TIERS.values():
+        paso = resolucion * 1000
+        g = df.assign(inicio=df["ts"] // paso * paso).groupby(["sensor_id", "inicio"])["valor"]
+        stats = g.agg(n="count", suma="sum", minimo="min", maximo="max").reset_index()
+        stats["resolucion"] = resolucion
+        rows.extend(stats.to_dict("records"))
+    return rows
+
+def ingest(lecturas: Iterable[Tuple[str, Optional[str], int, float]], engine=None) -> Dict[str, int]:
+    """
+    Ingesta un lote de (sensor, unidad, ts_ms, valor) en una transacción. Las lecturas
+    repetidas (mismo sensor y ts, en la cabeza o en un bloque ya sellado) se ignoran, así
+    reintentos del gateway no duplican agregados.
+    """
+    engine = engine or telemetry_engine
+    lecturas = list(lecturas)
+    if not lecturas:
+        return {"recibidas": 0, "registradas": 0, "bloques_sellados": 0}
+
+    with _write_lock, engine.begin() as conn:
+        ids = _resolve_sensors(conn, {nombre: unidad for nombre, unidad, _, _ in lecturas})
+        rows = _drop_sealed([{"sensor_id": ids[nombre], "ts": ts, "valor": valor} for nombre, _, ts, valor in lecturas], conn)
+
+        nuevas = []
+        for start in range(0, len(rows), INSERT_CHUNK):
+            nuevas.extend(conn.execute(
+                sqlite_insert(lectura_reciente)
+                .values(rows[start:start + INSERT_CHUNK])
+                .on_conflict_do_nothing()
+                .returning(lectura_reciente.c.sensor_id, lectura_reciente.c.ts, lectura_reciente.c.valor)
+            ).all())
+
+        sellados = 0
+        if nuevas:
+            df = pd.DataFrame(nuevas, columns=["sensor_id", "ts", "valor"])
+            conn.execute(_apply_aggregate, downsample(df))
+            ultimas = df.loc[df.groupby("sensor_id")["ts"].idxmax()]
+            conn.execute(_apply_latest, ultimas.to_dict("records"))
+            sellados = _seal_heads(conn, df["sensor_id"].unique().tolist())
+    _sensor_ids.update(ids)
+
+    return {"recibidas": len(lecturas), "registradas": len(nuevas), "bloques_sellados": sellados}
+
+def _drop_sealed(rows: List[dict], conn) -> List[dict]:
+    """Descarta lecturas cuyo (sensor, ts) ya está en un bloque sellado (reintentos tardíos)."""
+    ultimo_sellado = dict(conn.execute(
+        select(bloque.c.sensor_id, func.max(bloque.c.fin))
+        .where(bloque.c.sensor_id.in_({r["sensor_id"] for r in rows}))
+        .group_by(bloque.c.sensor_id)
+    ).all())
+    tardias = [r for r in rows if r["ts"] <= ultimo_sellado.get(r["sensor_id"], -1)]
+    if not tardias:
+        return rows
+
+    sellados = set()
+    for sensor_id in {r["sensor_id"] for r in tardias}:
+        ts = [r["ts"] for r in tardias if r["sensor_id"] == sensor_id]
+        for b_inicio, tiempos, valores in conn.execute(
+            select(bloque.c.inicio, bloque.c.tiempos, bloque.c.valores)
+            .where(bloque.c.sensor_id == sensor_id, bloque.c.fin >= min(ts), bloque.c.inicio <= max(ts))
+        ):
+            sellados.update((sensor_id, int(t)) for t in decode_chunk(b_inicio, tiempos, valores)[0])
+    return [r for r in rows if (r["sensor_id"], r["ts"]) not in sellados]
+
+def _seal_heads(conn, sensor_ids: List[int], stale_before: Optional[int] = None) -> int:
+    """Sella en bloques las cabezas que superan CHUNK_POINTS o CHUNK_SECONDS (o más viejas que stale_before)."""
+    estado = select(
+        lectura_reciente.c.sensor_id, func.count(), func.min(lectura_reciente.c.ts), func.max(lectura_reciente.c.ts)
+    ).group_by(lectura_reciente.c.sensor_id)
+    if sensor_ids is not None:
+        estado = estado.where(lectura_reciente.c.sensor_id.in_(sensor_ids))
+
+    sellados = 0
+    for sensor_id, n, primero, ultimo in conn.execute(estado).all():
+        llena = n >= CHUNK_POINTS or ultimo - primero >= CHUNK_SECONDS * 1000
+        vieja = stale_before is not None and ultimo < stale_before
+        if not (llena or vieja):
+            continue
+        puntos = conn.execute(
+            select(lectura_reciente.c.ts, lectura_reciente.c.valor)
+            .where(lectura_reciente.c.sensor_id == sensor_id)
+            .order_by(lectura_reciente.c.ts)
+        ).all()
+        ts = np.fromiter((p[0] for p in puntos), dtype=np.int64, count=len(puntos))
+        valores = np.fromiter((p[1] for p in puntos), dtype=np.float64, count=len(puntos))
+        tiempos, datos = encode_chunk(ts, valores)
+        conn.execute(insert(bloque).values(
+            sensor_id=sensor_id, inicio=int(ts[0]), fin=int(ts[-1]), n=len(ts),
+            minimo=float(valores.min()), maximo=float(valores.max()), tiempos=tiempos, valores=datos,
+        ))
+        conn.execute(delete(lectura_reciente).where(lectura_reciente.c.sensor_id == sensor_id, lectura_reciente.c.ts <= int(ts[-1])))
+        sellados += 1
+    return sellados
+
+# ---------------------------------------------------------------------------
+# Retención
+# ---------------------------------------------------------------------------
+
+def apply_retention(engine=None, now: Optional[datetime] = None) -> Dict[str, int]:
+    """Sella cabezas inactivas y borra bloques y agregados fuera de la retención de cada nivel."""
+    engine = engine or telemetry_engine
+    now_ms = to_ms(now or datetime.now(timezone.utc))
+    borrados = {}
+    with _write_lock, engine.begin() as conn:
+        borrados["sellados"] = _seal_heads(conn, None, stale_before=now_ms - CHUNK_SECONDS * 1000)
+        if RETENTION_DAYS["raw"] is not None:
+            corte = now_ms - RETENTION_DAYS["raw"] * 86_400_000
+            borrados["raw"] = conn.execute(delete(bloque).where(bloque.c.fin < corte)).rowcount
+            borrados["raw"] += conn.execute(delete(lectura_reciente).where(lectura_reciente.c.ts < corte)).rowcount
+        for nivel, resolucion in TIERS.items():
+            dias = RETENTION_DAYS[nivel]
+            if dias is None:
+                continue
+            corte = now_ms - dias * 86_400_000
+            borrados[nivel] = conn.execute(
+                delete(agregado).where(agregado.c.resolucion == resolucion, agregado.c.inicio < corte)
+            ).rowcount
+    return borrados
+
+# ---------------------------------------------------------------------------
+# Consultas
+# ---------------------------------------------------------------------------
+
+def sensor_id(conn, nombre: str) -> Optional[int]:
+    if nombre in _sensor_ids:
+        return _sensor_ids[nombre]
+    found = conn.scalar(select(sensor.c.id).where(sensor.c.nombre == nombre))
+    if found is not None:
+        _sensor_ids[nombre] = found
+    return found
+
+def list_sensors(engine=None) -> List[dict]:
+    engine = engine or telemetry_read_engine
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(sensor.c.nombre, sensor.c.unidad, ultima_lectura.c.ts, ultima_lectura.c.valor)
+            .join(ultima_lectura, ultima_lectura.c.sensor_id == sensor.c.id, isouter=True)
+            .order_by(sensor.c.nombre)
+        ).all()
+    return [
+        {"sensor": nombre, "unidad": unidad, "ts": from_ms(ts) if ts is not None else None, "valor": valor}
+        for nombre, unidad, ts, valor in rows
+    ]
+
+def latest(nombres: Optional[List[str]] = None, engine=None) -> List[dict]:
+    sensores = list_sensors(engine)
+    if nombres:
+        sensores = [s for s in sensores if s["sensor"] in nombres]
+    return [s for s in sensores if s["ts"] is not None]
+
+def raw_range(nombre: str, desde: datetime, hasta: datetime, engine=None) -> Optional[dict]:
+    """Lecturas crudas en [desde, hasta): bloques que se solapan con el rango + cabeza."""
+    engine = engine or telemetry_read_engine
+    inicio, fin = to_ms(desde), to_ms(hasta)
+    with engine.connect() as conn:
+        sid = sensor_id(conn, nombre)
+        if sid is None:
+            return None
+        bloques = conn.execute(
+            select(bloque.c.inicio, bloque.c.tiempos, bloque.c.valores)
+            .where(bloque.c.sensor_id == sid, bloque.c.fin >= inicio, bloque.c.inicio < fin)
+            .order_by(bloque.c.inicio)
+        ).all()
+        cabeza = conn.execute(
+            select(lectura_reciente.c.ts, lectura_reciente.c.valor)
+            .where(lectura_reciente.c.sensor_id == sid, lectura_reciente.c.ts >= inicio, lectura_reciente.c.ts < fin)
+        ).all()
+
+    partes_ts = [np.array([c[0] for c in cabeza], dtype=np.int64)]
+    partes_v = [np.array([c[1] for c in cabeza], dtype=np.float64)]
+    for b_inicio, tiempos, valores in bloques:
+        ts, v = decode_chunk(b_inicio, tiempos, valores)
+        partes_ts.append(ts)
+        partes_v.append(v)
+    ts = np.concatenate(partes_ts)
+    v = np.concatenate(partes_v)
+    mask = (ts >= inicio) & (ts < fin)
+    ts, v = ts[mask], v[mask]
+    orden = np.argsort(ts, kind="stable")
+    truncado = len(orden) > MAX_RAW_POINTS
+    orden = orden[:MAX_RAW_POINTS]
+    return {
+        "sensor": nombre,
+        "truncado": truncado,
+        "puntos": [{"ts": from_ms(int(t)), "valor": float(x)} for t, x in zip(ts[orden], v[orden])],
+    }
+
+def pick_resolution(desde: datetime, hasta: datetime) -> str:
+    """Nivel más fino que entrega a lo sumo MAX_AGGREGATE_POINTS buckets y sigue dentro de la retención."""
+    segundos = (hasta - desde).total_seconds()
+    antiguedad = datetime.now(timezone.utc) - (desde if desde.tzinfo else desde.replace(tzinfo=timezone.utc))
+    for nivel, resolucion in TIERS.items():
+        dias = RETENTION_DAYS[nivel]
+        if segundos / resolucion <= MAX_AGGREGATE_POINTS and (dias is None or antiguedad <= timedelta(days=dias)):
+            return nivel
+    return "1d"
+
+def aggregate_range(nombre: str, desde: datetime, hasta: datetime, resolucion: Optional[str] = None, engine=None) -> Optional[dict]:
+    """Serie agregada (n, media, mín, máx) por bucket del nivel pedido o elegido automáticamente."""
+    engine = engine or telemetry_read_engine
+    nivel = resolucion or pick_resolution(desde, hasta)
+    paso = TIERS[nivel]
+    inicio, fin = to_ms(desde) // (paso * 1000) * (paso * 1000), to_ms(hasta)
+    with engine.connect() as conn:
+        sid = sensor_id(conn, nombre)
+        if sid is None:
+            return None
+        rows = conn.execute(
+            select(agregado.c.inicio, agregado.c.n, agregado.c.suma, agregado.c.minimo, agregado.c.maximo)
+            .where(and_(agregado.c.resolucion == paso, agregado.c.sensor_id == sid, agregado.c.inicio >= inicio, agregado.c.inicio < fin))
+            .order_by(agregado.c.inicio)
+        ).all()
+    return {
+        "sensor": nombre,
+        "resolucion": nivel,
+        "puntos": [
+            {"ts": from_ms(ts), "n": n, "media": suma / n, "minimo": minimo, "maximo": maximo}
+            for ts, n, suma, minimo, maximo in rows
+        ],
+    }
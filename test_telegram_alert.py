@@ -1,5 +1,86 @@
 # test_telegram.py
-from src.core.notifications import send_telegram_alert
+# Prueba de la bandeja de salida contra un stub local de la API de Telegram (sin red ni token real):
+#   python test_telegram_alert.py
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-print("Probando envío...")
-send_telegram_alert("Prueba de integración. Si lees esto, OvineTech está conectado a tu bolsillo.")
\ No newline at end of file
+# La configuración se lee al importar los módulos: va antes de los imports de src
+_tmp = tempfile.mkdtemp()
+os.environ.setdefault("OVINETECH_DB", os.path.join(_tmp, "outbox.db"))
+os.environ.setdefault("TELEGRAM_TOKEN", "stub-token")
+os.environ.setdefault("NOTIFY_COALESCE_SECONDS", "0.2")
+
+recibidos = []
+
+class TelegramStub(BaseHTTPRequestHandler):
+    """Responde como sendMessage: el primer envío recibe un 429 y el chat "bloqueado" un 403."""
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if payload["chat_id"] == "bloqueado":
+            return self._reply(403, {"ok": False, "description": "Forbidden: bot was blocked by the user"})
+        if not recibidos:
+            recibidos.append(None)
+            return self._reply(429, {"ok": False, "parameters": {"retry_after": 1}})
+        recibidos.append((time.monotonic(), payload))
+        self._reply(200, {"ok": True, "result": {"message_id": len(recibidos)}})
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+server = ThreadingHTTPServer(("127.0.0.1", 0), TelegramStub)
+os.environ.setdefault("TELEGRAM_API_URL", f"http://127.0.0.1:{server.server_port}")
+
+from sqlmodel import Session, select
+
+from src.shared.database import create_db_and_tables, engine
+from src.core.models import EstadoNotificacion, Notificacion
+from src.core.notifications import dispatcher, send_telegram_alert
+
+async def main():
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    create_db_and_tables()
+    dispatcher.start()
+
+    print("Probando envío...")
+    for i in range(50):
+        send_telegram_alert(f"Sensor cámara {i % 3}: temperatura fuera de rango ({i})")
+    send_telegram_alert("Esta no llega", chat_id="bloqueado")
+
+    limite = time.monotonic() + 15
+    while time.monotonic() < limite:
+        await asyncio.sleep(0.2)
+        with Session(engine) as session:
+            if not session.exec(select(Notificacion).where(Notificacion.estado == EstadoNotificacion.PENDIENTE)).first():
+                break
+    await dispatcher.stop()
+    server.shutdown()
+
+    with Session(engine) as session:
+        filas = session.exec(select(Notificacion)).all()
+    enviadas = [f for f in filas if f.estado == EstadoNotificacion.ENVIADA]
+    fallidas = [f for f in filas if f.estado == EstadoNotificacion.FALLIDA]
+    envios = [r for r in recibidos if r]
+
+    print(f"Encoladas: {len(filas)}, enviadas: {len(enviadas)}, fallidas: {len(fallidas)}, requests HTTP OK: {len(envios)}")
+    assert len(enviadas) == 50, "Todas las alertas del chat válido deben enviarse (el 429 se reintenta)"
+    assert len(fallidas) == 1 and fallidas[0].chat_id == "bloqueado", "Un 403 no se reintenta"
+    assert len(envios) < 50, "La ráfaga debe agruparse en pocos mensajes"
+    assert all(len(p["text"]) <= 4096 for _, p in envios)
+    assert sum(p["text"].count("Sensor cámara") for _, p in envios) == 50
+    print("✅ Bandeja de salida OK")
+
+if __name__ == "__main__":
+    asyncio.run(main())